@@ -0,0 +1,166 @@
+"""
+Compare the old ORM path for writing matchups against the Core BulkWriter used by NewMatchup.
+
+    python benchmarks/bulk_insert.py --seasons 10 --teams 12 --players 25
+
+Both paths write the same synthetic league (Matchup, MatchupTeam and MatchupPlayer rows) into a fresh SQLite database
+that already has the league's teams, and report rows per second.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from fantasyApp import create_app, db  # noqa: E402
+from fantasyApp.models import Matchup, MatchupPlayer, MatchupTeam, Team  # noqa: E402
+from fantasyApp.sleeper_data.matchups import NewMatchup  # noqa: E402
+from fantasyApp.sleeper_data.writers import BulkWriter  # noqa: E402
+
+
+def synthetic_weeks(seasons: int, teams: int, players: int, weeks: int = 17):
+    """
+    Yield (season_id, week, matchups_data) in the shape the Sleeper matchups endpoint returns.
+    """
+    rng = random.Random(0)
+    for season in range(seasons):
+        season_id = 1000000 + season
+        for week in range(1, weeks + 1):
+            matchups_data = []
+            for roster_id in range(1, teams + 1):
+                roster = [str(100 + roster_id * players + p) for p in range(players)]
+                matchups_data.append(
+                    {
+                        "matchup_id": (roster_id + 1) // 2,
+                        "roster_id": roster_id,
+                        "players": roster,
+                        "starters": roster[:9],
+                        "players_points": {
+                            p: round(rng.uniform(0, 30), 2) for p in roster
+                        },
+                        "points": round(rng.uniform(60, 160), 2),
+                    }
+                )
+            yield season_id, week, matchups_data
+
+
+def seed_teams(seasons: int, teams: int) -> None:
+    """
+    Write the teams the matchups point at, both paths look them up by season and roster ID.
+    """
+    for season in range(seasons):
+        season_id = 1000000 + season
+        for roster_id in range(1, teams + 1):
+            db.session.add(
+                Team(
+                    sleeper_roster_id=roster_id,
+                    name=f"Team {roster_id}",
+                    year=2000 + season,
+                    is_commish=False,
+                    season=season_id,
+                    league=season_id,
+                )
+            )
+    db.session.commit()
+
+
+def orm_ingest(weeks) -> None:
+    """
+    The previous approach: one ORM object per row, added to the session.
+    """
+    team_ids = {
+        (season, roster_id): team_id
+        for team_id, season, roster_id in db.session.execute(
+            db.select(Team.id, Team.season, Team.sleeper_roster_id)
+        )
+    }
+    for season_id, week, matchups_data in weeks:
+        matchups = {}
+        objects = []
+        for matchup in matchups_data:
+            team = team_ids[(season_id, matchup["roster_id"])]
+            if matchup["matchup_id"] not in matchups:
+                matchups[matchup["matchup_id"]] = Matchup(
+                    season=season_id,
+                    week=week,
+                    number=matchup["matchup_id"],
+                    matchup_type="regular",
+                )
+                db.session.add(matchups[matchup["matchup_id"]])
+                # The matchup's ID is assigned by the database
+                db.session.flush()
+            matchup_id = matchups[matchup["matchup_id"]].id
+            objects.append(
+                MatchupTeam(
+                    matchup=matchup_id, team=team, total_points=matchup["points"]
+                )
+            )
+            for player in matchup["players"]:
+                objects.append(
+                    MatchupPlayer(
+                        matchup=matchup_id,
+                        player=player,
+                        starter=player in matchup["starters"],
+                        points=matchup["players_points"].get(player),
+                        team=team,
+                    )
+                )
+        db.session.add_all(objects)
+    db.session.commit()
+
+
+def bulk_ingest(weeks, batch_size: int) -> None:
+    """
+    The BulkWriter approach used by NewSeason and NewMatchup.
+    """
+    writer = BulkWriter(batch_size=batch_size)
+    for season_id, week, matchups_data in weeks:
+        seen = set()
+        for matchup in matchups_data:
+            new_matchup = NewMatchup(matchup, season_id, week, writer)
+            if matchup["matchup_id"] not in seen:
+                seen.add(matchup["matchup_id"])
+                new_matchup.add_matchup()
+    writer.flush()
+    db.session.commit()
+
+
+def run(label: str, ingest, args) -> None:
+    workdir = tempfile.mkdtemp(prefix="bulk_bench_")
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(workdir, "bench.db")
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        seed_teams(args.seasons, args.teams)
+        weeks = list(synthetic_weeks(args.seasons, args.teams, args.players))
+        start = time.perf_counter()
+        ingest(weeks)
+        elapsed = time.perf_counter() - start
+        rows = sum(
+            db.session.query(model).count()
+            for model in (Matchup, MatchupTeam, MatchupPlayer)
+        )
+    print(f"{label:6} {rows:8} rows in {elapsed:6.2f}s  {rows / elapsed:10.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark matchup row ingestion")
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--teams", type=int, default=12)
+    parser.add_argument("--players", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    run("orm", orm_ingest, args)
+    run("bulk", lambda weeks: bulk_ingest(weeks, args.batch_size), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark and profile league ingestion offline against recorded Sleeper fixtures.
+
+Record fixtures for a user once (this hits the real API):
+
+    python benchmarks/ingest_replay.py --user-id 123456789 --record
+
+Then replay them as often as you like with a realistic network delay:
+
+    python benchmarks/ingest_replay.py --user-id 123456789 --latency 0.08 --jitter 0.04
+    python benchmarks/ingest_replay.py --user-id 123456789 --latency 0.08 --server --profile
+
+Every run ingests into a fresh temporary SQLite database, so runs are deterministic and comparable.
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from fantasyApp import create_app  # noqa: E402
+from fantasyApp.sleeper_data.fake_server import serve_fixtures  # noqa: E402
+from fantasyApp.sleeper_data.leagues import check_for_new_leagues  # noqa: E402
+from fantasyApp.sleeper_data.utils import SleeperAPI  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark offline league ingestion")
+    parser.add_argument("--user-id", required=True, help="The sleeper user to ingest")
+    parser.add_argument(
+        "--fixtures", default=Config.SLEEPER_FIXTURE_DIR, help="The fixture directory"
+    )
+    parser.add_argument(
+        "--record", action="store_true", help="Record fixtures from the live API"
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Replay through the fake HTTP server instead of in process",
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per call")
+    parser.add_argument("--jitter", type=float, default=0, help="Random extra seconds")
+    parser.add_argument("--workers", type=int, default=Config.SLEEPER_MAX_WORKERS)
+    parser.add_argument(
+        "--profile", action="store_true", help="Print a cProfile report"
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ingest_bench_")
+    server = None
+    if args.server and not args.record:
+        server = serve_fixtures(args.fixtures, latency=args.latency, jitter=args.jitter)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(workdir, "bench.db")
+        SLEEPER_CACHE_ENABLED = False
+        SLEEPER_RATE_LIMIT_PATH = os.path.join(workdir, "ratelimit.state")
+        SLEEPER_MAX_WORKERS = args.workers
+        SLEEPER_FIXTURE_DIR = args.fixtures
+        SLEEPER_REPLAY_LATENCY = args.latency
+        SLEEPER_REPLAY_JITTER = args.jitter
+        if args.record:
+            SLEEPER_API_MODE = "record"
+        elif server:
+            SLEEPER_API_MODE = "live"
+            SLEEPER_BASE_URL = f"http://127.0.0.1:{server.server_port}/v1/"
+        else:
+            SLEEPER_API_MODE = "replay"
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        SleeperAPI.configure()
+        profiler = cProfile.Profile() if args.profile else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        check_for_new_leagues(args.user_id)
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+    print(
+        f"Ingested user {args.user_id} in {elapsed:.2f}s ({BenchmarkConfig.SLEEPER_API_MODE})"
+    )
+    for label, stats in sorted(SleeperAPI.latency_stats().items()):
+        print(
+            f"  {label:40} {stats['calls']:5} calls  {stats['avg_time'] * 1000:8.1f} ms avg"
+        )
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -24,8 +24,85 @@ class Config:
         broker_url=os.environ.get("CELERY_BROKER_URL"),
         result_backend=os.environ.get("CELERY_RESULT_BACKEND"),
         task_ignore_result=True,
+        imports=(
+            "fantasyApp.sleeper_data.sync",
+            "fantasyApp.sleeper_data.onboarding",
+            "fantasyApp.sleeper_data.players",
+            "fantasyApp.sleeper_data.transform",
+            "fantasyApp.analytics.playoff_odds",
+            "fantasyApp.analytics.lineups",
+        ),
+        # Restart a worker process once it grows past this many kilobytes, as a backstop to the ingestion ceiling
+        worker_max_memory_per_child=int(
+            os.environ.get("CELERY_MAX_MEMORY_PER_CHILD", 768 * 1024)
+        ),
+        # Keep in-progress seasons current, each run only fetches what changed since the last one
+        beat_schedule={
+            "sync-leagues": {"task": "sync_leagues", "schedule": 6 * 60 * 60},
+            # Sleeper asks that players/nfl is fetched at most once a day
+            "refresh-players": {"task": "refresh_players", "schedule": 24 * 60 * 60},
+        },
     )
 
+    # Sleeper API configuration
+    # Point this at the fake server (fantasyApp/sleeper_data/fake_server.py) to work offline
+    SLEEPER_BASE_URL = os.environ.get("SLEEPER_BASE_URL")
+    SLEEPER_POOL_SIZE = int(os.environ.get("SLEEPER_POOL_SIZE", 10))
+    SLEEPER_CONNECT_TIMEOUT = float(os.environ.get("SLEEPER_CONNECT_TIMEOUT", 3.05))
+    SLEEPER_READ_TIMEOUT = float(os.environ.get("SLEEPER_READ_TIMEOUT", 10))
+    SLEEPER_MAX_RETRIES = int(os.environ.get("SLEEPER_MAX_RETRIES", 4))
+    SLEEPER_BACKOFF_FACTOR = float(os.environ.get("SLEEPER_BACKOFF_FACTOR", 0.5))
+    SLEEPER_BACKOFF_MAX = float(os.environ.get("SLEEPER_BACKOFF_MAX", 30))
+    # How many Sleeper requests a single ingestion may have in flight at once
+    SLEEPER_MAX_WORKERS = int(os.environ.get("SLEEPER_MAX_WORKERS", 8))
+    # On-disk response cache, anything belonging to a complete season is kept forever
+    SLEEPER_CACHE_ENABLED = os.environ.get("SLEEPER_CACHE_ENABLED", "1") == "1"
+    SLEEPER_CACHE_PATH = os.environ.get("SLEEPER_CACHE_PATH") or os.path.join(
+        BASE_DIR, "sleeper_cache.db"
+    )
+    SLEEPER_CACHE_MAX_BYTES = int(
+        os.environ.get("SLEEPER_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    )
+    SLEEPER_CACHE_TTL = float(os.environ.get("SLEEPER_CACHE_TTL", 300))
+    SLEEPER_CACHE_PLAYERS_TTL = float(
+        os.environ.get("SLEEPER_CACHE_PLAYERS_TTL", 24 * 60 * 60)
+    )
+    # Token bucket shared by every worker on the node, Sleeper asks for under 1000 calls a minute
+    SLEEPER_RATE_LIMIT_PER_MINUTE = float(
+        os.environ.get("SLEEPER_RATE_LIMIT_PER_MINUTE", 900)
+    )
+    SLEEPER_RATE_LIMIT_BURST = float(os.environ.get("SLEEPER_RATE_LIMIT_BURST", 20))
+    SLEEPER_RATE_LIMIT_PATH = os.environ.get("SLEEPER_RATE_LIMIT_PATH") or os.path.join(
+        BASE_DIR, "sleeper_ratelimit.state"
+    )
+    # "live", "record" (save every response as a fixture) or "replay" (serve fixtures instead of the network)
+    SLEEPER_API_MODE = os.environ.get("SLEEPER_API_MODE", "live")
+    SLEEPER_FIXTURE_DIR = os.environ.get("SLEEPER_FIXTURE_DIR") or os.path.join(
+        BASE_DIR, "fixtures", "sleeper"
+    )
+    SLEEPER_REPLAY_LATENCY = float(os.environ.get("SLEEPER_REPLAY_LATENCY", 0))
+    SLEEPER_REPLAY_JITTER = float(os.environ.get("SLEEPER_REPLAY_JITTER", 0))
+
+    # Ingestion configuration
+    # How many new or changed players to write per chunk during the daily player refresh
+    PLAYER_CHUNK_SIZE = int(os.environ.get("PLAYER_CHUNK_SIZE", 1000))
+    # How many rows of a table the bulk writer accumulates before an executemany insert
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 5000))
+    # How many seasons of a league are fetched at once, each season fans out its own requests on top of this
+    INGEST_SEASON_WORKERS = int(os.environ.get("INGEST_SEASON_WORKERS", 4))
+    # How many pending rows an ingestion run holds, across all tables, before writing them between seasons
+    INGEST_FLUSH_ROWS = int(os.environ.get("INGEST_FLUSH_ROWS", 20000))
+    # An ingestion run writes everything and drops its caches whenever the process grows past this, 0 turns it off
+    INGEST_MEMORY_CEILING_MB = int(os.environ.get("INGEST_MEMORY_CEILING_MB", 512))
+    # Whether every payload fetched during ingestion is also kept, compressed, in the raw_payload staging table
+    INGEST_STAGING = os.environ.get("INGEST_STAGING", "1") == "1"
+
+    # Analytics configuration
+    # How much memory the process-wide cache of league snapshots, and the analytics built from them, may hold
+    ANALYTICS_CACHE_MB = int(os.environ.get("ANALYTICS_CACHE_MB", 256))
+    # How many seasons the playoff odds simulator plays out per season
+    PLAYOFF_ODDS_TRIALS = int(os.environ.get("PLAYOFF_ODDS_TRIALS", 20000))
+
     # Logging configuration
     log_directory = os.path.join(BASE_DIR, "logs")
     if not os.path.exists(log_directory):
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from flask import current_app
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.models import League
+
+
+class VersionedCache:
+    """
+    A process-wide, least recently used cache of analytics built from a league's history. Every entry is tagged with
+    the league's data_version it was built from, ingestion bumps the version whenever it writes new matchups, so an
+    entry is rebuilt the first time it is asked for after that and never served stale. Entries are sized by their
+    nbytes, and once the cache holds more than its memory budget the least recently used ones are evicted. Builds
+    happen outside the lock, two threads asking for the same stale entry at once may both build it and the last one
+    wins.
+    :ivar max_bytes: The memory budget in bytes, None reads ANALYTICS_CACHE_MB from the app config on every insert.
+    :ivar size: The bytes currently held.
+    :ivar hits: The number of lookups served from the cache.
+    :ivar misses: The number of lookups that had to build.
+    :ivar evictions: The number of entries evicted to stay under the budget.
+    """
+
+    def __init__(self, max_bytes: int = None) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (version, value, nbytes), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int, build: Callable[[], Any]) -> Any:
+        """
+        Get an entry, building it if it isn't cached or was built from an older version of the league.
+        :param key: The entry's key, e.g. ("head_to_head", league_id).
+        :param version: The league's current data_version.
+        :param build: Called with no arguments to build the entry.
+        :return: The entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = build()
+        self.put(key, version, value)
+        return value
+
+    def put(self, key: Hashable, version: int, value: Any) -> None:
+        """
+        Cache an entry, evicting the least recently used ones if it takes the cache over its budget. An entry bigger
+        than the whole budget isn't cached at all.
+        :param key: The entry's key.
+        :param version: The league's data_version the entry was built from.
+        :param value: The entry, its nbytes attribute is its size (0 if it has none).
+        """
+        nbytes = int(getattr(value, "nbytes", 0))
+        max_bytes = self.budget()
+        with self._lock:
+            self._discard(key)
+            if nbytes > max_bytes:
+                return
+            self._entries[key] = (version, value, nbytes)
+            self.size += nbytes
+            while self.size > max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def budget(self) -> int:
+        """
+        Get the memory budget.
+        :return: The most bytes the cache may hold.
+        """
+        if self.max_bytes is not None:
+            return self.max_bytes
+        return current_app.config.get("ANALYTICS_CACHE_MB", 256) * 1024 * 1024
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Drop an entry, or every entry.
+        :param key: The entry's key, None drops everything.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.size = 0
+            else:
+                self._discard(key)
+
+    def _discard(self, key: Hashable) -> None:
+        """
+        Drop an entry, the lock must be held.
+        :param key: The entry's key.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+cache = VersionedCache()
+
+
+def data_version(league_id: int, session=None) -> Optional[int]:
+    """
+    Get a league's data_version.
+    :param league_id: The ID of the league.
+    :param session: The session to query with, defaults to db.session.
+    :return: The version, or None if there is no such league.
+    """
+    session = session or db.session
+    return session.execute(
+        select(League.data_version).where(League.id == league_id)
+    ).scalar()
@@ -0,0 +1,191 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fantasyApp.analytics.cache import cache
+from fantasyApp.analytics.snapshot import LeagueSnapshot, league_snapshot
+
+
+class HeadToHead:
+    """
+    Every owner-vs-owner result in a league's history, as NumPy arrays indexed by owner. Cell [i, j] of each matrix
+    describes owner i's games against owner j, so the totals are computed once for the whole league and answering a
+    query is just indexing. Scores are also kept per owner and week, for anything that needs the weekly series.
+    :ivar owners: The user IDs of the league's owners, in index order.
+    :ivar index: A dictionary mapping each owner's user ID to their index.
+    :ivar weeks: The (year, week) of each column of scores, in order.
+    :ivar scores: Each owner's points per week, NaN where they didn't play.
+    :ivar games: The number of games between each pair of owners.
+    :ivar wins: Owner i's wins against owner j.
+    :ivar losses: Owner i's losses against owner j.
+    :ivar ties: The ties between owner i and owner j.
+    :ivar points_for: Owner i's total points against owner j.
+    :ivar points_against: Owner j's total points against owner i.
+    :ivar blowout: Owner i's biggest winning margin against owner j, NaN if they never beat them.
+    :ivar blowout_year: The year of that blowout, 0 if there isn't one.
+    :ivar blowout_week: The week of that blowout, 0 if there isn't one.
+    """
+
+    def __init__(
+        self,
+        owners: np.ndarray,
+        opponents: np.ndarray,
+        years: np.ndarray,
+        weeks: np.ndarray,
+        points: np.ndarray,
+        opponent_points: np.ndarray,
+    ) -> None:
+        """
+        Build the matrices from one side of every game. Each game is expected twice, once from each owner's side.
+        :param owners: The user ID of the owner on this side of each game.
+        :param opponents: The user ID of their opponent.
+        :param years: The year of each game.
+        :param weeks: The week of each game.
+        :param points: The owner's points.
+        :param opponent_points: The opponent's points.
+        """
+        self.owners, owner_index = np.unique(
+            np.concatenate([owners, opponents]), return_inverse=True
+        )
+        self.index = {int(owner): i for i, owner in enumerate(self.owners)}
+        n = len(self.owners)
+        rows, columns = owner_index[: len(owners)], owner_index[len(owners) :]
+        cells = rows * n + columns
+        margin = points - opponent_points
+
+        def total(values: np.ndarray) -> np.ndarray:
+            return np.bincount(cells, weights=values, minlength=n * n).reshape(n, n)
+
+        self.games = np.bincount(cells, minlength=n * n).reshape(n, n)
+        self.wins = total(margin > 0).astype(int)
+        self.losses = total(margin < 0).astype(int)
+        self.ties = self.games - self.wins - self.losses
+        self.points_for = total(points)
+        self.points_against = total(opponent_points)
+
+        # The last game of each cell, once sorted by cell then margin, is that cell's biggest margin
+        self.blowout = np.full(n * n, np.nan)
+        self.blowout_year = np.zeros(n * n, dtype=int)
+        self.blowout_week = np.zeros(n * n, dtype=int)
+        won = np.flatnonzero(margin > 0)
+        order = won[np.lexsort((margin[won], cells[won]))]
+        if len(order):
+            last = order[np.r_[cells[order][1:] != cells[order][:-1], True]]
+            self.blowout[cells[last]] = margin[last]
+            self.blowout_year[cells[last]] = years[last]
+            self.blowout_week[cells[last]] = weeks[last]
+        self.blowout = self.blowout.reshape(n, n)
+        self.blowout_year = self.blowout_year.reshape(n, n)
+        self.blowout_week = self.blowout_week.reshape(n, n)
+
+        # Every (year, week) gets a column, an owner only has a score in the weeks they played
+        keys = years.astype(np.int64) * 100 + weeks
+        columns_by_week, week_index = np.unique(keys, return_inverse=True)
+        self.weeks: List[Tuple[int, int]] = [
+            (int(key) // 100, int(key) % 100) for key in columns_by_week
+        ]
+        self.scores = np.full((n, len(columns_by_week)), np.nan)
+        self.scores[rows, week_index] = points
+
+    @property
+    def nbytes(self) -> int:
+        """
+        How much memory the matrices use.
+        :return: The total size of the arrays in bytes.
+        """
+        return sum(
+            value.nbytes
+            for value in vars(self).values()
+            if isinstance(value, np.ndarray)
+        )
+
+    @property
+    def average_margin(self) -> np.ndarray:
+        """
+        Owner i's average margin against owner j, NaN where they never played.
+        :return: The matrix of average margins.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (self.points_for - self.points_against) / self.games
+
+    def record(self, owner: int, opponent: int) -> Optional[Dict]:
+        """
+        Get one owner's head-to-head record against another.
+        :param owner: The owner's user ID.
+        :param opponent: The opponent's user ID.
+        :return: The games, wins, losses, ties, points for and against, average margin and biggest blowout, or None
+        if either of them never owned a team in the league.
+        """
+        i, j = self.index.get(owner), self.index.get(opponent)
+        if i is None or j is None:
+            return None
+        games = int(self.games[i, j])
+        points_for = float(self.points_for[i, j])
+        points_against = float(self.points_against[i, j])
+        blowout = self.blowout[i, j]
+        return {
+            "games": games,
+            "wins": int(self.wins[i, j]),
+            "losses": int(self.losses[i, j]),
+            "ties": int(self.ties[i, j]),
+            "points_for": points_for,
+            "points_against": points_against,
+            "average_margin": (
+                (points_for - points_against) / games if games else None
+            ),
+            "biggest_blowout": (
+                None
+                if np.isnan(blowout)
+                else {
+                    "margin": float(blowout),
+                    "year": int(self.blowout_year[i, j]),
+                    "week": int(self.blowout_week[i, j]),
+                }
+            ),
+        }
+
+
+def load_head_to_head(snapshot: LeagueSnapshot) -> HeadToHead:
+    """
+    Build a league's HeadToHead from its snapshot. Games against an orphaned team or that haven't been scored yet are
+    left out.
+    :param snapshot: The league's LeagueSnapshot.
+    :return: The league's HeadToHead.
+    """
+    owner = snapshot.game_owner()
+    opponent = snapshot.game_opponent
+    games = np.flatnonzero(
+        (opponent >= 0)
+        & (owner >= 0)
+        & (owner[opponent] >= 0)
+        & ~np.isnan(snapshot.game_points)
+        & ~np.isnan(snapshot.game_points[opponent])
+    )
+    # Sleeper scores to two decimals, rounding recovers the exact scores from the snapshot's float32s
+    points = np.round(snapshot.game_points.astype(float), 2)
+    return HeadToHead(
+        snapshot.owner_ids[owner[games]],
+        snapshot.owner_ids[owner[opponent[games]]],
+        snapshot.season_years[snapshot.game_season()[games]].astype(int),
+        snapshot.game_week[games].astype(int),
+        points[games],
+        points[opponent[games]],
+    )
+
+
+def head_to_head(league_id: int, session=None) -> Optional[HeadToHead]:
+    """
+    Get a league's HeadToHead, from the cache unless the league has ingested new matchups since it was built. It is
+    built from the league's snapshot, which is cached alongside it.
+    :param league_id: The ID of the league.
+    :param session: The session to query with, defaults to db.session.
+    :return: The league's HeadToHead, or None if there is no such league.
+    """
+    snapshot = league_snapshot(league_id, session)
+    if snapshot is None:
+        return None
+    return cache.get(
+        ("head_to_head", league_id),
+        snapshot.version,
+        lambda: load_head_to_head(snapshot),
+    )
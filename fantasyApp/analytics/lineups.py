@@ -0,0 +1,272 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.analytics.snapshot import (
+    LeagueSnapshot,
+    league_snapshot,
+    player_position,
+)
+from fantasyApp.models import (
+    League,
+    ManagerEfficiency,
+    Matchup,
+    MatchupPlayer,
+    Player,
+    Season,
+    Team,
+)
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+# The positions a lineup slot can hold, keyed on the Season column with the slot's count
+SLOTS = {
+    "qb": ("QB",),
+    "rb": ("RB",),
+    "wr": ("WR",),
+    "te": ("TE",),
+    "k": ("K",),
+    "dst": ("DEF",),
+    "dl": ("DL",),
+    "lb": ("LB",),
+    "db": ("DB",),
+    "w_r": ("WR", "RB"),
+    "w_t": ("WR", "TE"),
+    "w_r_t": ("WR", "RB", "TE"),
+    "q_w_r_t": ("QB", "WR", "RB", "TE"),
+    "idp_flex": ("DL", "LB", "DB"),
+}
+POSITIONS = ("QB", "RB", "WR", "TE", "K", "DEF", "DL", "LB", "DB")
+
+# Every set of positions as a bitmask, and which of those sets each position and slot touches
+_SUBSETS = np.arange(1 << len(POSITIONS))
+_POSITION_IN = (_SUBSETS[None, :] >> np.arange(len(POSITIONS))[:, None]) & 1
+_SLOT_MASKS = np.array(
+    [
+        sum(1 << POSITIONS.index(position) for position in positions)
+        for positions in SLOTS.values()
+    ]
+)
+_SLOT_TOUCHES = ((_SLOT_MASKS[:, None] & _SUBSETS[None, :]) != 0).astype(int)
+
+
+def optimal_lineups(
+    line_game: np.ndarray,
+    line_position: np.ndarray,
+    line_points: np.ndarray,
+    line_starter: np.ndarray,
+    game_slots: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Find the best legal lineup of every game at once. The sets of players that can fill distinct slots form a
+    transversal matroid, so taking each team's players from the highest scoring down and keeping each one that can
+    still be fitted in finds the best lineup exactly, whatever mix of flex slots the league uses. Whether a set of
+    players fits is Hall's condition: no set of positions may have more players than the slots that can take them.
+    :param line_game: The game of each player line, from 0 to the number of games.
+    :param line_position: The index into POSITIONS of each line's player's position, -1 for anything else.
+    :param line_points: The player's points in each line.
+    :param line_starter: Whether each line's player was started.
+    :param game_slots: The number of each of the SLOTS in each game's lineup, of shape (games, len(SLOTS)).
+    :return: The optimal, actual and bench points of each game.
+    """
+    games = len(game_slots)
+    points = np.nan_to_num(line_points.astype(float))
+    capacity = game_slots @ _SLOT_TOUCHES
+    # Each game's lines from the highest scoring down, laid out as (games, most lines in a game)
+    order = np.lexsort((-points, line_game))
+    sizes = np.bincount(line_game, minlength=games)
+    starts = np.cumsum(sizes) - sizes
+    ranked = np.full((games, sizes.max(initial=0)), -1)
+    ranked[line_game[order], np.arange(len(order)) - starts[line_game[order]]] = order
+
+    demand = np.zeros_like(capacity)
+    chosen = np.zeros(len(points), dtype=bool)
+    for column in ranked.T:
+        candidate = (column >= 0) & (line_position[column] >= 0)
+        tentative = demand + _POSITION_IN[line_position[column]]
+        fits = candidate & (tentative <= capacity).all(axis=1)
+        demand[fits] = tentative[fits]
+        chosen[column[fits]] = True
+
+    return {
+        "optimal": np.bincount(line_game, weights=points * chosen, minlength=games),
+        "actual": np.bincount(
+            line_game, weights=points * line_starter, minlength=games
+        ),
+        "bench": np.bincount(
+            line_game, weights=points * ~line_starter, minlength=games
+        ),
+    }
+
+
+def position_codes(positions: Iterable[Optional[str]]) -> np.ndarray:
+    """
+    Convert player positions to indices into POSITIONS.
+    :param positions: The positions, e.g. WR.
+    :return: The index of each position, -1 for a position no slot can hold.
+    """
+    codes = {position: i for i, position in enumerate(POSITIONS)}
+    return np.array([codes.get(position, -1) for position in positions], dtype=int)
+
+
+def season_slots(season_ids: Iterable[int], session=None) -> Dict[int, np.ndarray]:
+    """
+    Get the lineup slots of seasons.
+    :param season_ids: The IDs of the seasons.
+    :param session: The session to query with, defaults to db.session.
+    :return: A dictionary mapping each season ID to the number of each of the SLOTS.
+    """
+    session = session or db.session
+    rows = session.execute(
+        select(Season.id, *(getattr(Season, slot) for slot in SLOTS)).where(
+            Season.id.in_([int(season_id) for season_id in season_ids])
+        )
+    )
+    return {row[0]: np.array(row[1:], dtype=int) for row in rows}
+
+
+def efficiency_rows(
+    teams: np.ndarray,
+    weeks: np.ndarray,
+    seasons: np.ndarray,
+    league_id: int,
+    lineups: Dict[str, np.ndarray],
+) -> List[Dict]:
+    """
+    Build the ManagerEfficiency rows of scored games.
+    :param teams: The team ID of each game.
+    :param weeks: The week of each game.
+    :param seasons: The season ID of each game.
+    :param league_id: The ID of the league.
+    :param lineups: The optimal_lineups() of the games.
+    :return: The ManagerEfficiency column values of each game.
+    """
+    optimal, actual, bench = lineups["optimal"], lineups["actual"], lineups["bench"]
+    return [
+        {
+            "team": int(teams[i]),
+            "week": int(weeks[i]),
+            "actual_points": float(actual[i]),
+            "optimal_points": float(optimal[i]),
+            "bench_points": float(bench[i]),
+            "points_left": float(optimal[i] - actual[i]),
+            "efficiency": float(actual[i] / optimal[i]) if optimal[i] > 0 else None,
+            "season": int(seasons[i]),
+            "league": league_id,
+        }
+        for i in range(len(teams))
+    ]
+
+
+def lineup_rows(season_id: int, weeks: Iterable[int], session=None) -> List[Dict]:
+    """
+    Score the lineups of some of a season's weeks, e.g. the weeks an ingestion just wrote, with one query.
+    :param season_id: The ID of the season.
+    :param weeks: The weeks to score.
+    :param session: The session to query with, defaults to db.session.
+    :return: The ManagerEfficiency column values of each team in each week.
+    """
+    session = session or db.session
+    rows = session.execute(
+        select(
+            MatchupPlayer.matchup,
+            MatchupPlayer.team,
+            Matchup.week,
+            Team.league,
+            MatchupPlayer.player,
+            Player.position,
+            MatchupPlayer.points,
+            MatchupPlayer.starter,
+        )
+        .join(Team, Team.id == MatchupPlayer.team)
+        .join(Matchup, Matchup.id == MatchupPlayer.matchup)
+        .outerjoin(Player, Player.id == MatchupPlayer.player)
+        .where(Team.season == season_id, Matchup.week.in_(list(weeks)))
+    ).all()
+    slots = season_slots([season_id], session).get(season_id)
+    if not rows or slots is None:
+        return []
+    matchups, teams, line_weeks, leagues, players, positions, points, starters = zip(
+        *rows
+    )
+    # A game is a team's side of a matchup
+    keys, line_game = np.unique(
+        np.column_stack([np.array(matchups), np.array(teams)]),
+        axis=0,
+        return_inverse=True,
+    )
+    line_game = line_game.ravel()
+    game_weeks = np.zeros(len(keys), dtype=int)
+    game_weeks[line_game] = line_weeks
+    lineups = optimal_lineups(
+        line_game,
+        position_codes(map(player_position, players, positions)),
+        np.array(points, dtype=float),
+        np.array(starters, dtype=bool),
+        np.tile(slots, (len(keys), 1)),
+    )
+    return efficiency_rows(
+        keys[:, 1],
+        game_weeks,
+        np.full(len(keys), season_id),
+        leagues[0],
+        lineups,
+    )
+
+
+def snapshot_lineup_rows(snapshot: LeagueSnapshot, session=None) -> List[Dict]:
+    """
+    Score the lineups of a league's whole history in one pass over its snapshot.
+    :param snapshot: The league's LeagueSnapshot.
+    :param session: The session to query the seasons' slots with, defaults to db.session.
+    :return: The ManagerEfficiency column values of each team in each week.
+    """
+    slots = season_slots(snapshot.season_ids.tolist(), session)
+    game_season = snapshot.game_season()
+    lines = snapshot.line_game >= 0
+    lineups = optimal_lineups(
+        snapshot.line_game[lines],
+        position_codes(snapshot.positions)[snapshot.line_position[lines]],
+        snapshot.line_points[lines],
+        snapshot.line_starter[lines],
+        np.array(
+            [slots[season_id] for season_id in snapshot.season_ids.tolist()],
+            dtype=int,
+        ).reshape(-1, len(SLOTS))[game_season],
+    )
+    played = np.unique(snapshot.line_game[lines])
+    return efficiency_rows(
+        snapshot.team_ids[snapshot.game_team[played]],
+        snapshot.game_week[played],
+        snapshot.season_ids[game_season[played]],
+        snapshot.league_id,
+        {name: values[played] for name, values in lineups.items()},
+    )
+
+
+@shared_task(name="score_lineups")
+def score_lineups(league_ids: Optional[list[int]] = None) -> int:
+    """
+    Score every lineup in the history of leagues and store them in ManagerEfficiency, e.g. to backfill the table.
+    New weeks are scored as they are ingested, along with the other aggregates.
+    :param league_ids: The IDs of the leagues, defaults to every league.
+    :return: The number of team-weeks scored.
+    """
+    if league_ids is None:
+        league_ids = list(db.session.scalars(select(League.id)))
+    writer = BulkWriter()
+    scored = 0
+    for league_id in league_ids:
+        snapshot = league_snapshot(league_id)
+        if snapshot is None:
+            continue
+        for row in snapshot_lineup_rows(snapshot):
+            writer.add(ManagerEfficiency, row)
+            scored += 1
+        writer.flush()
+        db.session.commit()
+    current_app.logger.info(f"Scored {scored} lineups across {len(league_ids)} leagues")
+    return scored
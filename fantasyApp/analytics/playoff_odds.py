@@ -0,0 +1,273 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.analytics.snapshot import MATCHUP_TYPES, LeagueSnapshot, league_snapshot
+from fantasyApp.models import PlayoffOdds, Season
+from fantasyApp.sleeper_data.instrumentation import span
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+# Sleeper's defaults, for seasons that don't say
+DEFAULT_PLAYOFF_WEEK = 15
+DEFAULT_PLAYOFF_TEAMS = 6
+# How many weeks of the league average a team's own average is shrunk towards, so two hot weeks don't make a contender
+PRIOR_WEEKS = 3
+# Larger than any season's points for, so wins always outrank points in the standings key
+WIN_WEIGHT = 1e5
+# Larger than any season's wins, so division winners are always seeded ahead of the wildcards
+DIVISION_WEIGHT = 1e3 * WIN_WEIGHT
+REGULAR = MATCHUP_TYPES.index("regular")
+
+
+class SeasonModel:
+    """
+    Everything the simulator needs to know about a season, as plain arrays. A team's weekly score is modelled as a
+    normal distribution around its own average, shrunk towards the league average, with the league's pooled
+    week-to-week spread.
+    :ivar season_id: The ID of the season.
+    :ivar league_id: The ID of the league.
+    :ivar last_week: The last week that has been scored.
+    :ivar teams: The team IDs.
+    :ivar divisions: Each team's division, -1 if the league has none.
+    :ivar wins: Each team's wins so far, a tie counts as half a win.
+    :ivar points_for: Each team's points so far.
+    :ivar means: Each team's expected weekly score.
+    :ivar spread: The standard deviation of a weekly score.
+    :ivar remaining: The number of regular season weeks left to play. Only scored weeks are ingested, so their
+    matchups aren't known and are drawn at random.
+    :ivar playoff_teams: The number of teams that make the playoffs.
+    """
+
+    def __init__(self, snapshot: LeagueSnapshot, season_id: int) -> None:
+        """
+        Build the model of one of a league's seasons from its snapshot.
+        :param snapshot: The league's LeagueSnapshot.
+        :param season_id: The ID of the season.
+        """
+        self.season_id = season_id
+        self.league_id = snapshot.league_id
+        season = int(np.searchsorted(snapshot.season_ids, season_id))
+        playoff_week = int(snapshot.season_playoff_week[season]) or DEFAULT_PLAYOFF_WEEK
+        team_rows = np.flatnonzero(snapshot.team_season == season)
+        self.teams = snapshot.team_ids[team_rows]
+        self.divisions = snapshot.team_division[team_rows]
+        n = len(self.teams)
+        self.playoff_teams = min(
+            int(snapshot.season_playoff_teams[season]) or DEFAULT_PLAYOFF_TEAMS, n
+        )
+
+        games = np.flatnonzero(
+            (snapshot.game_season() == season)
+            & (snapshot.game_type == REGULAR)
+            & (snapshot.game_week < playoff_week)
+        )
+        team = np.searchsorted(team_rows, snapshot.game_team[games])
+        # Sleeper scores to two decimals, rounding recovers the exact scores from the snapshot's float32s
+        points = np.round(snapshot.game_points[games].astype(float), 2)
+        opponent = snapshot.game_opponent[games]
+        opponent_points = np.where(
+            opponent >= 0,
+            np.round(snapshot.game_points[opponent].astype(float), 2),
+            np.nan,
+        )
+        scored = ~np.isnan(points)
+
+        self.wins = np.bincount(
+            team,
+            weights=(points > opponent_points) + (points == opponent_points) / 2,
+            minlength=n,
+        )
+        self.points_for = np.bincount(team[scored], weights=points[scored], minlength=n)
+        played = np.bincount(team[scored], minlength=n)
+        league_mean = points[scored].mean() if scored.any() else 0.0
+        self.means = (self.points_for + PRIOR_WEEKS * league_mean) / (
+            played + PRIOR_WEEKS
+        )
+        residuals = points[scored] - self.means[team[scored]]
+        self.spread = float(residuals.std()) if len(residuals) > 1 else 1.0
+
+        self.last_week = int(snapshot.game_week[games][scored].max(initial=0))
+        self.remaining = max(playoff_week - 1 - self.last_week, 0)
+
+
+class OddsResult:
+    """
+    The outcome of a simulation.
+    :ivar model: The SeasonModel that was simulated.
+    :ivar teams: The team IDs.
+    :ivar trials: The number of seasons simulated.
+    :ivar playoffs: The probability of each team making the playoffs.
+    :ivar bye: The probability of each team getting a first round bye.
+    :ivar championship: The probability of each team winning the championship.
+    """
+
+    def __init__(self, model: SeasonModel, trials: int, counts: np.ndarray) -> None:
+        """
+        :param model: The SeasonModel that was simulated.
+        :param trials: The number of seasons simulated.
+        :param counts: The playoff, bye and championship counts of each team, of shape (3, teams).
+        """
+        self.model = model
+        self.teams = model.teams
+        self.trials = trials
+        self.playoffs, self.bye, self.championship = counts / max(trials, 1)
+
+    def rows(self) -> List[Dict]:
+        """
+        Build the PlayoffOdds rows, as of the last week that has been scored.
+        :return: The PlayoffOdds column values of each team.
+        """
+        return [
+            {
+                "team": int(team),
+                "week": self.model.last_week,
+                "playoffs": float(self.playoffs[i]),
+                "bye": float(self.bye[i]),
+                "championship": float(self.championship[i]),
+                "trials": self.trials,
+                "season": self.model.season_id,
+                "league": self.model.league_id,
+            }
+            for i, team in enumerate(self.teams)
+        ]
+
+
+def bracket_order(size: int) -> List[int]:
+    """
+    Get the seeds of a standard single elimination bracket in slot order, so adjacent slots play each other and the
+    top seeds can only meet in the final, e.g. [1, 8, 4, 5, 2, 7, 3, 6] for eight teams.
+    :param size: The bracket size, a power of two.
+    :return: The seed in each slot.
+    """
+    order = [1]
+    while len(order) < size:
+        width = len(order) * 2
+        order = [seed for top in order for seed in (top, width + 1 - top)]
+    return order
+
+
+def simulate_chunk(model: SeasonModel, trials: int, seed: int = None) -> np.ndarray:
+    """
+    Simulate the rest of a season, its standings and its playoff bracket some number of times, every trial at once.
+    :param model: The SeasonModel.
+    :param trials: The number of seasons to simulate.
+    :param seed: The random seed.
+    :return: The playoff, bye and championship counts of each team, of shape (3, teams).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(model.teams)
+    counts = np.zeros((3, n))
+    if not n:
+        return counts
+    rows = np.arange(trials)[:, None]
+    wins = np.tile(model.wins, (trials, 1))
+    points_for = np.tile(model.points_for, (trials, 1))
+
+    def play(home: np.ndarray, away: np.ndarray) -> None:
+        scores = rng.normal(model.means, model.spread, (trials, n))
+        home_scores = np.take_along_axis(scores, home, axis=1)
+        away_scores = np.take_along_axis(scores, away, axis=1)
+        wins[rows, home] += home_scores > away_scores
+        wins[rows, away] += away_scores > home_scores
+        points_for[rows, home] += home_scores
+        points_for[rows, away] += away_scores
+
+    for _ in range(model.remaining):
+        # A random pairing per trial, with an odd team out sitting the week out
+        shuffled = np.argsort(rng.random((trials, n)), axis=1)[:, : n - n % 2]
+        play(shuffled[:, 0::2], shuffled[:, 1::2])
+
+    # Standings, wins then points for, with every division winner seeded ahead of the wildcards
+    key = wins * WIN_WEIGHT + points_for
+    for division in np.unique(model.divisions[model.divisions >= 0]):
+        members = np.flatnonzero(model.divisions == division)
+        winners = members[np.argmax(key[:, members], axis=1)]
+        key[np.arange(trials), winners] += DIVISION_WEIGHT
+    seeds = np.argsort(-key, axis=1, kind="stable")[:, : model.playoff_teams]
+    counts[0] = np.bincount(seeds.ravel(), minlength=n)
+
+    size = 1 << max(model.playoff_teams - 1, 0).bit_length()
+    byes = size - model.playoff_teams
+    counts[1] = np.bincount(seeds[:, :byes].ravel(), minlength=n)
+
+    # The bracket, a slot whose seed didn't make the playoffs is a bye
+    order = np.array(bracket_order(size)) - 1
+    field = np.where(
+        order < model.playoff_teams,
+        seeds[:, order.clip(max=model.playoff_teams - 1)],
+        -1,
+    )
+    while field.shape[1] > 1:
+        scores = rng.normal(model.means, model.spread, (trials, n))
+        top, bottom = field[:, 0::2], field[:, 1::2]
+        top_scores = np.where(
+            top >= 0, np.take_along_axis(scores, top.clip(0), axis=1), -np.inf
+        )
+        bottom_scores = np.where(
+            bottom >= 0, np.take_along_axis(scores, bottom.clip(0), axis=1), -np.inf
+        )
+        field = np.where(top_scores >= bottom_scores, top, bottom)
+    counts[2] = np.bincount(field[:, 0], minlength=n)
+    return counts
+
+
+def simulate(model: SeasonModel, trials: int, seed: int = None) -> OddsResult:
+    """
+    Simulate a season's playoff odds.
+    :param model: The SeasonModel.
+    :param trials: The number of seasons to simulate.
+    :param seed: The random seed.
+    :return: The OddsResult.
+    """
+    return OddsResult(model, trials, simulate_chunk(model, trials, seed))
+
+
+def playoff_odds(
+    season_id: int, trials: int = None, session=None
+) -> Optional[OddsResult]:
+    """
+    Simulate a season's playoff odds from its league's snapshot.
+    :param season_id: The ID of the season.
+    :param trials: The number of seasons to simulate, defaults to PLAYOFF_ODDS_TRIALS.
+    :param session: The session to query with, defaults to db.session.
+    :return: The OddsResult, or None if there is no such season.
+    """
+    session = session or db.session
+    league_id = session.execute(
+        select(Season.league).where(Season.id == season_id)
+    ).scalar()
+    snapshot = league_snapshot(league_id, session) if league_id else None
+    if snapshot is None:
+        return None
+    return simulate(
+        SeasonModel(snapshot, season_id),
+        trials or current_app.config.get("PLAYOFF_ODDS_TRIALS", 20000),
+    )
+
+
+@shared_task(name="refresh_playoff_odds")
+def refresh_playoff_odds(season_ids: list[int]) -> None:
+    """
+    Simulate the playoff odds of seasons and store them as of the last week played, e.g. after the weekly sync.
+    :param season_ids: The IDs of the seasons.
+    """
+    writer = BulkWriter()
+    for season_id in season_ids:
+        start = time.perf_counter()
+        with span("playoff_odds"):
+            odds = playoff_odds(season_id)
+            if odds is None:
+                continue
+            for row in odds.rows():
+                writer.add(PlayoffOdds, row)
+            writer.flush()
+            db.session.commit()
+        current_app.logger.info(
+            f"Refreshed the playoff odds of season {season_id} as of week {odds.model.last_week} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,219 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.models import PowerRanking
+
+# How many of a team's most recent weeks its rolling points average over
+ROLLING_WEEKS = 3
+# How much each part of a team's record counts towards its composite power score
+COMPOSITE_WEIGHTS = {
+    "all_play": 0.4,
+    "points": 0.3,
+    "record": 0.2,
+    "schedule": 0.1,
+}
+
+
+class PowerRankings:
+    """
+    A season's power rankings after every week, computed for every team and week at once as NumPy arrays of shape
+    (teams, weeks). Each week's composite score blends the team's all-play win percentage, its rolling points, its
+    actual win percentage and the strength of its schedule, with the points and schedule scaled against the best
+    team that week, and the teams are ranked on it.
+    :ivar teams: The team IDs, in row order.
+    :ivar weeks: The weeks, in column order.
+    :ivar scores: Each team's points per week, NaN where it didn't play.
+    :ivar wins: Each team's wins through each week, likewise losses and ties.
+    :ivar all_play_wins: Each team's wins through each week had it played every other team every week, likewise
+    all_play_losses and all_play_ties.
+    :ivar points_for: Each team's total points through each week.
+    :ivar rolling_points: Each team's average points over its last ROLLING_WEEKS weeks.
+    :ivar strength_of_schedule: The average points per game, as of each week, of the opponents faced so far.
+    :ivar score: Each team's composite power score, between 0 and 1.
+    :ivar rank: Each team's power rank, 1 is the best.
+    """
+
+    def __init__(
+        self,
+        teams: np.ndarray,
+        weeks: np.ndarray,
+        points: np.ndarray,
+        opponents: np.ndarray,
+    ) -> None:
+        """
+        Compute the rankings from one side of every game in the season.
+        :param teams: The team ID on this side of each game.
+        :param weeks: The week of each game.
+        :param points: The team's points.
+        :param opponents: The opponent's team ID, 0 if the team had no opponent.
+        """
+        self.teams, team_index = np.unique(teams, return_inverse=True)
+        self.weeks, week_index = np.unique(weeks, return_inverse=True)
+        n, w = len(self.teams), len(self.weeks)
+
+        self.scores = np.full((n, w), np.nan)
+        self.scores[team_index, week_index] = points
+        played = ~np.isnan(self.scores)
+        opponent = np.full((n, w), -1)
+        has_opponent = np.isin(opponents, self.teams)
+        opponent[team_index[has_opponent], week_index[has_opponent]] = np.searchsorted(
+            self.teams, opponents[has_opponent]
+        )
+        faced = opponent >= 0
+
+        # Actual record
+        opponent_scores = np.where(
+            faced, self.scores[opponent.clip(0), np.arange(w)], np.nan
+        )
+        self.wins = np.cumsum(self.scores > opponent_scores, axis=1)
+        self.losses = np.cumsum(self.scores < opponent_scores, axis=1)
+        self.ties = np.cumsum(faced & (self.scores == opponent_scores), axis=1)
+
+        # All-play record, [i, j, week] compares team i with team j
+        margins = self.scores[:, None, :] - self.scores[None, :, :]
+        self.all_play_wins = np.cumsum((margins > 0).sum(axis=1), axis=1)
+        self.all_play_losses = np.cumsum((margins < 0).sum(axis=1), axis=1)
+        # Every team ties itself in the weeks it played
+        self.all_play_ties = np.cumsum((margins == 0).sum(axis=1) - played, axis=1)
+
+        # Points
+        scored = np.nan_to_num(self.scores)
+        self.points_for = np.cumsum(scored, axis=1)
+        games = np.cumsum(played, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = self.points_for / games
+            window_points = self.points_for - _shift(self.points_for, ROLLING_WEEKS)
+            window_games = games - _shift(games, ROLLING_WEEKS)
+            self.rolling_points = window_points / window_games
+
+            # [i, k, j] is the average, as of week j, of team i's opponent in week k, counted once k <= j
+            opponent_average = average[opponent.clip(0)]
+            counted = faced[:, :, None] & np.tri(w, dtype=bool).T[None, :, :]
+            self.strength_of_schedule = np.where(counted, opponent_average, 0).sum(
+                axis=1
+            ) / counted.sum(axis=1)
+
+            decided = self.wins + self.losses + self.ties
+            all_play_games = (
+                self.all_play_wins + self.all_play_losses + self.all_play_ties
+            )
+            components = {
+                "all_play": (self.all_play_wins + self.all_play_ties / 2)
+                / all_play_games,
+                "points": self.rolling_points
+                / np.fmax.reduce(self.rolling_points, axis=0),
+                "record": (self.wins + self.ties / 2) / decided,
+                "schedule": self.strength_of_schedule
+                / np.fmax.reduce(self.strength_of_schedule, axis=0),
+            }
+        self.score = sum(
+            COMPOSITE_WEIGHTS[name] * np.nan_to_num(component)
+            for name, component in components.items()
+        )
+        order = np.argsort(-self.score, axis=0, kind="stable")
+        self.rank = np.empty((n, w), dtype=int)
+        self.rank[order, np.arange(w)] = np.arange(1, n + 1)[:, None]
+
+    def rows(
+        self, season_id: int, league_id: int, first_week: int = None
+    ) -> List[Dict]:
+        """
+        Build the PowerRanking rows of the season.
+        :param season_id: The ID of the season.
+        :param league_id: The ID of the league.
+        :param first_week: The first week to build rows for, a week's rankings only depend on the weeks before it so
+        earlier weeks don't change when new ones are added. Defaults to every week.
+        :return: The PowerRanking column values of each team in each week.
+        """
+        rows = []
+        for j, week in enumerate(self.weeks):
+            if first_week is not None and week < first_week:
+                continue
+            for i, team in enumerate(self.teams):
+                rows.append(
+                    {
+                        "team": int(team),
+                        "week": int(week),
+                        "wins": int(self.wins[i, j]),
+                        "losses": int(self.losses[i, j]),
+                        "ties": int(self.ties[i, j]),
+                        "all_play_wins": int(self.all_play_wins[i, j]),
+                        "all_play_losses": int(self.all_play_losses[i, j]),
+                        "all_play_ties": int(self.all_play_ties[i, j]),
+                        "points_for": float(self.points_for[i, j]),
+                        "rolling_points": _optional(self.rolling_points[i, j]),
+                        "strength_of_schedule": _optional(
+                            self.strength_of_schedule[i, j]
+                        ),
+                        "score": float(self.score[i, j]),
+                        "rank": int(self.rank[i, j]),
+                        "season": season_id,
+                        "league": league_id,
+                    }
+                )
+        return rows
+
+
+def _shift(values: np.ndarray, weeks: int) -> np.ndarray:
+    """
+    Shift cumulative weekly totals right by some weeks, filling the start with zeros.
+    :param values: An array of shape (teams, weeks).
+    :param weeks: How many weeks to shift by.
+    :return: The shifted array, column j holds column j - weeks.
+    """
+    shifted = np.zeros_like(values)
+    if weeks < values.shape[1]:
+        shifted[:, weeks:] = values[:, :-weeks]
+    return shifted
+
+
+def _optional(value: float):
+    """
+    Convert a NumPy float to a column value.
+    :param value: The value.
+    :return: The value as a float, or None if it is NaN.
+    """
+    return None if np.isnan(value) else float(value)
+
+
+def season_power_rankings(games: Iterable) -> Optional[PowerRankings]:
+    """
+    Compute the power rankings of a season's regular season.
+    :param games: The season's games, one per team per matchup, e.g. from aggregates.season_games().
+    :return: The season's PowerRankings, or None if no regular season week has been scored yet.
+    """
+    games = [
+        game
+        for game in games
+        if game.matchup_type == "regular" and game.points is not None
+    ]
+    if not games:
+        return None
+    return PowerRankings(
+        np.array([game.team for game in games], dtype=np.int64),
+        np.array([game.week for game in games], dtype=int),
+        np.array([game.points for game in games], dtype=float),
+        np.array([game.opponent or 0 for game in games], dtype=np.int64),
+    )
+
+
+def weekly_series(season_id: int, session=None) -> Dict[int, List[Dict]]:
+    """
+    Get the stored power rankings of a season as one series per team, e.g. for a chart.
+    :param season_id: The ID of the season.
+    :param session: The session to query with, defaults to db.session.
+    :return: A dictionary mapping each team ID to its PowerRanking column values, in week order.
+    """
+    session = session or db.session
+    rows = session.execute(
+        select(*PowerRanking.__table__.columns)
+        .where(PowerRanking.season == season_id)
+        .order_by(PowerRanking.week)
+    )
+    series = {}
+    for row in rows:
+        series.setdefault(row.team, []).append(dict(row._mapping))
+    return series
@@ -0,0 +1,320 @@
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.analytics.cache import cache
+from fantasyApp.analytics.playoff_odds import REGULAR, WIN_WEIGHT
+from fantasyApp.analytics.snapshot import LeagueSnapshot, league_snapshot
+from fantasyApp.models import MatchupPlayer, PlayerWeekStats, Season, Team
+from fantasyApp.sleeper_data.stats import SCORING, STATS
+
+# The Season scoring weights each named profile changes, everything else keeps the league's own weights
+PROFILES = {
+    "standard": {"pts_rec": 0.0, "pts_bonus_rec_te": 0.0},
+    "half_ppr": {"pts_rec": 0.5, "pts_bonus_rec_te": 0.0},
+    "ppr": {"pts_rec": 1.0, "pts_bonus_rec_te": 0.0},
+    "te_premium": {"pts_rec": 1.0, "pts_bonus_rec_te": 0.5},
+}
+COLUMNS = tuple(SCORING)
+# Packs a (player, year, week) into one int64 key
+_YEAR_WEEK = 1_000_000
+
+
+class StatMatrix:
+    """
+    The NFL stat line behind every player line in a league's history, as a (lines, len(SCORING)) matrix in the
+    snapshot's line order, so the points of every line under any scoring weights are one matrix-vector product.
+    Whatever a line scored that the stats don't explain (kicking, defense, stats we don't keep) is kept as its
+    residual and added back unchanged. Lines without a stat line, e.g. from before stats were ingested, are all
+    residual and never change.
+    :ivar league_id: The ID of the league.
+    :ivar version: The league's data_version the matrix was built from.
+    :ivar stats: Each line's stats, in the order of SCORING.
+    :ivar residual: Each line's points that don't come from the stats under its own season's weights, NaN if the
+    line hasn't been scored.
+    :ivar covered: Whether each line has a stat line.
+    """
+
+    def __init__(
+        self,
+        snapshot: LeagueSnapshot,
+        stat_keys: np.ndarray,
+        stat_values: np.ndarray,
+        season_weights: np.ndarray,
+    ) -> None:
+        """
+        Line the stat lines up with the snapshot's player lines.
+        :param snapshot: The league's LeagueSnapshot.
+        :param stat_keys: The sorted (player, year, week) key of each stat line, see line_keys.
+        :param stat_values: The stat lines, of shape (len(stat_keys), len(STATS)).
+        :param season_weights: Each of the snapshot's seasons' scoring weights, in the order of SCORING.
+        """
+        self.league_id = snapshot.league_id
+        self.version = snapshot.version
+        lines = len(snapshot.line_game)
+        keys = line_keys(snapshot)
+        rows = np.zeros(lines, dtype=int)
+        self.covered = np.zeros(lines, dtype=bool)
+        if len(stat_keys):
+            rows = np.searchsorted(stat_keys, keys).clip(0, len(stat_keys) - 1)
+            self.covered = (keys >= 0) & (stat_keys[rows] == keys)
+
+        self.stats = np.zeros((lines, len(COLUMNS)), dtype=np.float32)
+        stored = [
+            COLUMNS.index(column) for column, stat in SCORING.items() if stat in STATS
+        ]
+        self.stats[np.ix_(self.covered, stored)] = stat_values[rows[self.covered]]
+        # Sleeper's tight end premium is a bonus on each reception by a tight end
+        tight_end = snapshot.positions[snapshot.line_position] == "TE"
+        self.stats[:, COLUMNS.index("pts_bonus_rec_te")] = (
+            self.stats[:, COLUMNS.index("pts_rec")] * tight_end
+        )
+
+        line_season = snapshot.game_season()[snapshot.line_game]
+        own = np.einsum("ij,ij->i", self.stats, season_weights[line_season])
+        self.residual = snapshot.line_points.astype(float) - np.where(
+            snapshot.line_game >= 0, own, 0
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        How much memory the matrix uses.
+        :return: The total size of the arrays in bytes.
+        """
+        return sum(
+            value.nbytes
+            for value in vars(self).values()
+            if isinstance(value, np.ndarray)
+        )
+
+    def points(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Score every line under other scoring weights.
+        :param weights: The points per unit of each stat, in the order of SCORING.
+        :return: Each line's points, rounded to two decimals like Sleeper's, NaN where it hasn't been scored.
+        """
+        return np.round(self.residual + self.stats @ weights, 2)
+
+
+def line_keys(snapshot: LeagueSnapshot) -> np.ndarray:
+    """
+    Get the (player, year, week) key each of a snapshot's lines finds its stat line with.
+    :param snapshot: The league's LeagueSnapshot.
+    :return: The key of each line, -1 for a line without a game or of a team defense, which has no stat lines.
+    """
+    game = snapshot.line_game
+    player = snapshot.player_numbers()[snapshot.line_player]
+    year = snapshot.season_years[snapshot.game_season()[game]].astype(np.int64)
+    week = snapshot.game_week[game].astype(np.int64)
+    keys = player * _YEAR_WEEK + year * 100 + week
+    return np.where((game >= 0) & (player >= 0), keys, -1)
+
+
+def season_weights(season_ids: List[int], session=None) -> Dict[int, np.ndarray]:
+    """
+    Get the scoring weights of seasons.
+    :param season_ids: The IDs of the seasons.
+    :param session: The session to query with, defaults to db.session.
+    :return: A dictionary mapping each season ID to its points per unit of each stat, in the order of SCORING.
+    """
+    session = session or db.session
+    rows = session.execute(
+        select(Season.id, *(getattr(Season, column) for column in COLUMNS)).where(
+            Season.id.in_([int(season_id) for season_id in season_ids])
+        )
+    )
+    return {row[0]: np.array(row[1:], dtype=float) for row in rows}
+
+
+def load_stat_matrix(snapshot: LeagueSnapshot, session=None) -> StatMatrix:
+    """
+    Build a league's StatMatrix, with one query for the stat lines of every player who has played in the league.
+    :param snapshot: The league's LeagueSnapshot.
+    :param session: The session to query with, defaults to db.session.
+    :return: The league's StatMatrix.
+    """
+    session = session or db.session
+    players = (
+        select(MatchupPlayer.player)
+        .join(Team, Team.id == MatchupPlayer.team)
+        .where(Team.league == snapshot.league_id)
+    )
+    rows = session.execute(
+        select(
+            PlayerWeekStats.player,
+            PlayerWeekStats.year,
+            PlayerWeekStats.week,
+            *(getattr(PlayerWeekStats, stat) for stat in STATS),
+        ).where(
+            PlayerWeekStats.year.in_(snapshot.season_years.tolist()),
+            PlayerWeekStats.player.in_(players),
+        )
+    ).all()
+    values = np.array(rows, dtype=float).reshape(-1, 3 + len(STATS))
+    keys = (
+        values[:, 0].astype(np.int64) * _YEAR_WEEK
+        + values[:, 1].astype(np.int64) * 100
+        + values[:, 2].astype(np.int64)
+    )
+    order = np.argsort(keys)
+    weights = season_weights(snapshot.season_ids.tolist(), session)
+    return StatMatrix(
+        snapshot,
+        keys[order],
+        values[order, 3:],
+        np.array(
+            [weights[season_id] for season_id in snapshot.season_ids.tolist()],
+            dtype=float,
+        ).reshape(-1, len(COLUMNS)),
+    )
+
+
+def stat_matrix(league_id: int, session=None) -> Optional[StatMatrix]:
+    """
+    Get a league's StatMatrix, from the cache unless the league has ingested new matchups since it was built.
+    :param league_id: The ID of the league.
+    :param session: The session to query with, defaults to db.session.
+    :return: The league's StatMatrix, or None if there is no such league.
+    """
+    snapshot = league_snapshot(league_id, session)
+    if snapshot is None:
+        return None
+    return cache.get(
+        ("stat_matrix", league_id),
+        snapshot.version,
+        lambda: load_stat_matrix(snapshot, session),
+    )
+
+
+def scoring_profile(
+    profile: Union[str, Dict[str, float]], base: np.ndarray
+) -> np.ndarray:
+    """
+    Build the scoring weights of a profile.
+    :param profile: One of the PROFILES, or a dictionary of the Season scoring weights to change, e.g.
+    {"pts_pass_td": 6}.
+    :param base: The weights the profile changes, in the order of SCORING.
+    :return: The profile's points per unit of each stat, in the order of SCORING.
+    :raises ValueError: If the profile isn't one of the PROFILES or changes a weight that isn't in SCORING.
+    """
+    changes = PROFILES.get(profile) if isinstance(profile, str) else profile
+    if changes is None:
+        raise ValueError(f"Unknown scoring profile {profile}")
+    weights = np.array(base, dtype=float)
+    for column, value in changes.items():
+        if column not in SCORING:
+            raise ValueError(f"Unknown scoring weight {column}")
+        weights[COLUMNS.index(column)] = value
+    return weights
+
+
+def _standings(snapshot: LeagueSnapshot, game_points: np.ndarray) -> Dict:
+    """
+    Work out every season's regular season standings from the games' points.
+    :param snapshot: The league's LeagueSnapshot.
+    :param game_points: The points of each game.
+    :return: Each team's wins, losses, ties, points for and rank in its season.
+    """
+    opponent = snapshot.game_opponent
+    played = np.flatnonzero(
+        (snapshot.game_type == REGULAR)
+        & (opponent >= 0)
+        & ~np.isnan(game_points)
+        & ~np.isnan(game_points[opponent])
+    )
+    teams = len(snapshot.team_ids)
+    team = snapshot.game_team[played]
+    margin = game_points[played] - game_points[opponent[played]]
+
+    def total(values: np.ndarray) -> np.ndarray:
+        return np.bincount(team, weights=values, minlength=teams)
+
+    wins = total(margin > 0).astype(int)
+    losses = total(margin < 0).astype(int)
+    ties = np.bincount(team, minlength=teams) - wins - losses
+    points_for = total(game_points[played])
+    # Ranked within each season on wins, a tie is half a win, then points for
+    key = (wins + ties / 2) * WIN_WEIGHT + points_for
+    order = np.lexsort((-key, snapshot.team_season))
+    starts = np.searchsorted(snapshot.team_season[order], snapshot.team_season[order])
+    rank = np.empty(teams, dtype=int)
+    rank[order] = np.arange(teams) - starts + 1
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "points_for": np.round(points_for, 2),
+        "rank": rank,
+    }
+
+
+def rescored_standings(
+    league_id: int,
+    profile: Union[str, Dict[str, float]],
+    base_season: int = None,
+    session=None,
+) -> Optional[Dict]:
+    """
+    Work out how every season of a league's history would have finished under other scoring settings. Every player
+    line is scored again in one matrix-vector product, each team's starters' change in points is added to its
+    score, and the regular season standings are worked out again from the new scores.
+    :param league_id: The ID of the league.
+    :param profile: One of the PROFILES, or a dictionary of the Season scoring weights to change.
+    :param base_season: The ID of the season whose weights the profile changes, defaults to the league's latest, so
+    every season is scored under the same settings.
+    :param session: The session to query with, defaults to db.session.
+    :return: The profile's weights, the share of scored starters with a stat line to score them with, and each
+    team's actual and new wins, losses, ties, points for and rank, or None if there is no such league.
+    :raises ValueError: If the profile isn't one of the PROFILES or changes a weight that isn't in SCORING.
+    """
+    snapshot = league_snapshot(league_id, session)
+    matrix = stat_matrix(league_id, session)
+    if snapshot is None or matrix is None or not len(snapshot.season_ids):
+        return None
+    if base_season is None:
+        base_season = int(snapshot.season_ids[np.argmax(snapshot.season_years)])
+    base = season_weights([base_season], session).get(base_season)
+    if base is None:
+        raise ValueError(f"Season {base_season} isn't in league {league_id}")
+    weights = scoring_profile(profile, base)
+
+    # Sleeper scores to two decimals, rounding recovers the exact scores from the snapshot's float32s
+    old_points = np.round(snapshot.line_points.astype(float), 2)
+    change = np.nan_to_num(matrix.points(weights) - old_points)
+    lines = np.flatnonzero((snapshot.line_game >= 0) & snapshot.line_starter)
+    game_points = np.round(snapshot.game_points.astype(float), 2)
+    new_points = game_points + np.bincount(
+        snapshot.line_game[lines],
+        weights=change[lines],
+        minlength=len(game_points),
+    )
+    actual = _standings(snapshot, game_points)
+    rescored = _standings(snapshot, new_points)
+
+    scored = lines[~np.isnan(snapshot.line_points[lines])]
+    team_owner = snapshot.team_owner
+    return {
+        "weights": {column: float(weights[i]) for i, column in enumerate(COLUMNS)},
+        "coverage": float(matrix.covered[scored].mean()) if len(scored) else 0.0,
+        "standings": [
+            {
+                "team": int(snapshot.team_ids[i]),
+                "season": int(snapshot.season_ids[snapshot.team_season[i]]),
+                "year": int(snapshot.season_years[snapshot.team_season[i]]),
+                "owner": (
+                    int(snapshot.owner_ids[team_owner[i]])
+                    if team_owner[i] >= 0
+                    else None
+                ),
+                **{name: values[i].item() for name, values in rescored.items()},
+                **{
+                    f"actual_{name}": values[i].item()
+                    for name, values in actual.items()
+                },
+            }
+            for i in range(len(snapshot.team_ids))
+        ],
+    }
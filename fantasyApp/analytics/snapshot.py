@@ -0,0 +1,281 @@
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.analytics.cache import cache, data_version
+from fantasyApp.models import Matchup, MatchupPlayer, MatchupTeam, Player, Season, Team
+from fantasyApp.sleeper_data.lookups import to_key
+
+# Matchup.matchup_type, in code order
+MATCHUP_TYPES = ("regular", "playoff", "consolation")
+# The position of a team defense, Sleeper IDs them by their team's abbreviation, e.g. KC, and they aren't players
+DEFENSE = "DEF"
+
+
+def player_position(player_id, position: Optional[str]) -> Optional[str]:
+    """
+    Get the position of a player in a lineup, team defenses included.
+    :param player_id: The sleeper ID of the player, or a team's abbreviation for its defense.
+    :param position: The player's position from the Player table, None if they aren't in it.
+    :return: The position, DEF for a team defense, None if it isn't known.
+    """
+    if position is None and player_id is not None and to_key(player_id) is None:
+        return DEFENSE
+    return position
+
+
+class LeagueSnapshot:
+    """
+    A league's whole history as compact columnar NumPy arrays, loaded in a handful of bulk queries so analytics can
+    work on arrays instead of querying per page. Our IDs don't fit in 32 bits, so each kind of ID is stored once, sorted,
+    in an int64 array and everything else refers to it by its int32 position in that array. Player IDs are kept as
+    strings instead, since a team defense's ID is its team's abbreviation, e.g. KC. Positions of -1 mean there is
+    nothing there, e.g. an orphaned team has no owner.
+    :ivar league_id: The ID of the league.
+    :ivar version: The league's data_version the snapshot was loaded from.
+    :ivar season_ids: The season IDs, sorted.
+    :ivar season_years: The year of each season.
+    :ivar season_playoff_week: The first playoff week of each season, 0 if unknown.
+    :ivar season_playoff_teams: The number of playoff teams of each season, 0 if unknown.
+    :ivar owner_ids: The user IDs of everyone who has owned a team, sorted.
+    :ivar division_ids: The division IDs, sorted.
+    :ivar team_ids: The team IDs, sorted.
+    :ivar team_season: The season of each team.
+    :ivar team_owner: The owner of each team.
+    :ivar team_division: The division of each team.
+    :ivar matchup_ids: The matchup IDs, sorted.
+    :ivar game_matchup: The matchup of each game, a game is one team's side of a matchup.
+    :ivar game_team: The team of each game.
+    :ivar game_week: The week of each game.
+    :ivar game_type: The index into MATCHUP_TYPES of each game's matchup type.
+    :ivar game_points: The team's points in each game, NaN if it hasn't been scored.
+    :ivar game_opponent: The game on the other side of each game's matchup.
+    :ivar player_ids: The player IDs as strings, sorted.
+    :ivar positions: The player positions, DEF for team defenses, each line's position is an index into it.
+    :ivar line_game: The game of each player line, a line is one player in one team's lineup in one matchup.
+    :ivar line_player: The player of each line.
+    :ivar line_position: The index into positions of each line's player's position.
+    :ivar line_starter: Whether each line's player started.
+    :ivar line_points: The player's points in each line, NaN if they haven't been scored.
+    """
+
+    def __init__(self, league_id: int, version: int = 0, session=None) -> None:
+        """
+        Load the snapshot.
+        :param league_id: The ID of the league.
+        :param version: The league's current data_version.
+        :param session: The session to query with, defaults to db.session.
+        """
+        session = session or db.session
+        self.league_id = league_id
+        self.version = version
+
+        seasons = _columns(
+            session.execute(
+                select(
+                    Season.id,
+                    Season.year,
+                    Season.playoffs_start_wk,
+                    Season.num_poff_teams,
+                )
+                .where(Season.league == league_id)
+                .order_by(Season.id)
+            ),
+            4,
+        )
+        self.season_ids = np.array(seasons[0], dtype=np.int64)
+        self.season_years = np.array(seasons[1], dtype=np.int16)
+        self.season_playoff_week = _with_default(seasons[2], np.int8)
+        self.season_playoff_teams = _with_default(seasons[3], np.int8)
+
+        teams = _columns(
+            session.execute(
+                select(Team.id, Team.season, Team.owner, Team.division)
+                .where(Team.league == league_id)
+                .order_by(Team.id)
+            ),
+            4,
+        )
+        self.team_ids = np.array(teams[0], dtype=np.int64)
+        self.owner_ids = _ids(teams[2])
+        self.division_ids = _ids(teams[3])
+        self.team_season = _positions(self.season_ids, teams[1])
+        self.team_owner = _positions(self.owner_ids, teams[2])
+        self.team_division = _positions(self.division_ids, teams[3])
+
+        games = _columns(
+            session.execute(
+                select(
+                    MatchupTeam.matchup,
+                    MatchupTeam.team,
+                    Matchup.week,
+                    Matchup.matchup_type,
+                    MatchupTeam.total_points,
+                )
+                .join(Team, Team.id == MatchupTeam.team)
+                .join(Matchup, Matchup.id == MatchupTeam.matchup)
+                .where(Team.league == league_id)
+                .order_by(MatchupTeam.matchup, MatchupTeam.team)
+            ),
+            5,
+        )
+        self.matchup_ids = _ids(games[0])
+        self.game_matchup = _positions(self.matchup_ids, games[0])
+        self.game_team = _positions(self.team_ids, games[1])
+        self.game_week = np.array(games[2], dtype=np.int16)
+        self.game_type = np.array(
+            [MATCHUP_TYPES.index(matchup_type) for matchup_type in games[3]],
+            dtype=np.int8,
+        )
+        self.game_points = np.array(games[4], dtype=np.float32)
+        # The games are sorted by matchup, so both sides of a matchup are next to each other
+        self.game_opponent = np.full(len(self.game_matchup), -1, dtype=np.int32)
+        paired = np.flatnonzero(self.game_matchup[1:] == self.game_matchup[:-1])
+        self.game_opponent[paired] = paired + 1
+        self.game_opponent[paired + 1] = paired
+
+        lines = _columns(
+            session.execute(
+                select(
+                    MatchupPlayer.matchup,
+                    MatchupPlayer.team,
+                    MatchupPlayer.player,
+                    Player.position,
+                    MatchupPlayer.starter,
+                    MatchupPlayer.points,
+                )
+                .join(Team, Team.id == MatchupPlayer.team)
+                .outerjoin(Player, Player.id == MatchupPlayer.player)
+                .where(Team.league == league_id)
+            ),
+            6,
+        )
+        # A line belongs to the game with its matchup and team, found on the games' (matchup, team) sort order
+        game_keys = (
+            self.game_matchup.astype(np.int64) * len(self.team_ids) + self.game_team
+        )
+        line_keys = _positions(self.matchup_ids, lines[0]).astype(np.int64) * len(
+            self.team_ids
+        ) + _positions(self.team_ids, lines[1])
+        self.line_game = _positions(game_keys, line_keys)
+        self.player_ids, line_player = np.unique(
+            np.array([str(player) for player in lines[2]], dtype=str),
+            return_inverse=True,
+        )
+        self.line_player = line_player.ravel().astype(np.int32)
+        self.positions, line_position = np.unique(
+            np.array(
+                [
+                    player_position(player, position) or ""
+                    for player, position in zip(lines[2], lines[3])
+                ],
+                dtype=str,
+            ),
+            return_inverse=True,
+        )
+        self.line_position = line_position.astype(np.int8)
+        self.line_starter = np.array(lines[4], dtype=bool)
+        self.line_points = np.array(lines[5], dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        How much memory the snapshot's arrays use.
+        :return: The total size of the arrays in bytes.
+        """
+        return sum(
+            value.nbytes
+            for value in vars(self).values()
+            if isinstance(value, np.ndarray)
+        )
+
+    def player_numbers(self) -> np.ndarray:
+        """
+        Get each player's ID as a number, e.g. to look up their stats with.
+        :return: The int64 ID of each of player_ids, -1 for a team defense.
+        """
+        return np.array(
+            [to_key(player) or -1 for player in self.player_ids.tolist()],
+            dtype=np.int64,
+        )
+
+    def game_owner(self) -> np.ndarray:
+        """
+        Get the owner of each game's team.
+        :return: The position in owner_ids of each game's owner, -1 for an orphaned team.
+        """
+        return self.team_owner[self.game_team]
+
+    def game_season(self) -> np.ndarray:
+        """
+        Get the season of each game.
+        :return: The position in season_ids of each game's season.
+        """
+        return self.team_season[self.game_team]
+
+
+def _columns(rows: Iterable, count: int) -> List[Sequence]:
+    """
+    Turn query rows into columns.
+    :param rows: The rows.
+    :param count: The number of columns, so an empty result still has them.
+    :return: A tuple of values per column.
+    """
+    return list(zip(*rows)) or [()] * count
+
+
+def _ids(values: Sequence[Optional[int]]) -> np.ndarray:
+    """
+    Get the distinct IDs in a column.
+    :param values: The column, None values are left out.
+    :return: The distinct IDs, sorted.
+    """
+    return np.unique(
+        np.array([value for value in values if value is not None], dtype=np.int64)
+    )
+
+
+def _positions(ids: np.ndarray, values: Sequence[Optional[int]]) -> np.ndarray:
+    """
+    Find the position of each value in a sorted array of IDs.
+    :param ids: The sorted IDs.
+    :param values: The values to find, None values and values that aren't in ids get -1.
+    :return: The positions.
+    """
+    values = np.array(
+        [-1 if value is None else value for value in values], dtype=np.int64
+    )
+    if not len(ids):
+        return np.full(len(values), -1, dtype=np.int32)
+    positions = np.searchsorted(ids, values).clip(0, len(ids) - 1)
+    return np.where(ids[positions] == values, positions, -1).astype(np.int32)
+
+
+def _with_default(values: Sequence[Optional[int]], dtype) -> np.ndarray:
+    """
+    Convert a column with missing values to an array.
+    :param values: The column.
+    :param dtype: The array's type.
+    :return: The array, with 0 wherever the value was None.
+    """
+    return np.array([value or 0 for value in values], dtype=dtype)
+
+
+def league_snapshot(league_id: int, session=None) -> Optional[LeagueSnapshot]:
+    """
+    Get a league's snapshot, from the process-wide cache unless the league has ingested new matchups since it was
+    loaded.
+    :param league_id: The ID of the league.
+    :param session: The session to query with, defaults to db.session.
+    :return: The league's LeagueSnapshot, or None if there is no such league.
+    """
+    version = data_version(league_id, session)
+    if version is None:
+        return None
+    return cache.get(
+        ("snapshot", league_id),
+        version,
+        lambda: LeagueSnapshot(league_id, version, session),
+    )
@@ -13,8 +13,10 @@ String = db.String
 Boolean = db.Boolean
 DateTime = db.DateTime
 Text = db.Text
+LargeBinary = db.LargeBinary
 ForeignKey = db.ForeignKey
 relationship = db.relationship
+UniqueConstraint = db.UniqueConstraint
 
 
 @login_manager.user_loader
@@ -79,6 +81,9 @@ class League(Model):
     id = Column(Integer, primary_key=True)
     # Attributes
     name = Column(String(64), index=False, unique=False, nullable=False)
+    data_version = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )  # Bumped whenever new matchups are ingested, analytics cached for the league are rebuilt when it changes
 
     def __repr__(self):
         return f"<League {self.name}>"
@@ -93,13 +98,22 @@ class Season(Model):
     num_teams = Column(Integer, index=False, unique=False, nullable=False)
     status = Column(String(64), index=False, unique=False, nullable=True)
     season_type = Column(String(64), index=False, unique=False, nullable=True)
-    pts_rush_yds = Column(Integer, index=False, unique=False, nullable=False)
-    pts_rush_td = Column(Integer, index=False, unique=False, nullable=False)
-    pts_rec_yds = Column(Integer, index=False, unique=False, nullable=False)
-    pts_rec_td = Column(Integer, index=False, unique=False, nullable=False)
-    pts_pass_yds = Column(Integer, index=False, unique=False, nullable=False)
-    pts_pass_td = Column(Integer, index=False, unique=False, nullable=False)
-    pts_bonus_rec_te = Column(Integer, index=False, unique=False, nullable=False)
+    # Scoring weights, points per unit of each stat
+    pts_rush_yds = Column(Float, index=False, unique=False, nullable=False)
+    pts_rush_td = Column(Float, index=False, unique=False, nullable=False)
+    pts_rush_2pt = Column(Float, index=False, unique=False, nullable=False)
+    pts_rec = Column(Float, index=False, unique=False, nullable=False)
+    pts_rec_yds = Column(Float, index=False, unique=False, nullable=False)
+    pts_rec_td = Column(Float, index=False, unique=False, nullable=False)
+    pts_rec_2pt = Column(Float, index=False, unique=False, nullable=False)
+    pts_pass_yds = Column(Float, index=False, unique=False, nullable=False)
+    pts_pass_td = Column(Float, index=False, unique=False, nullable=False)
+    pts_pass_int = Column(Float, index=False, unique=False, nullable=False)
+    pts_pass_2pt = Column(Float, index=False, unique=False, nullable=False)
+    pts_fum_lost = Column(Float, index=False, unique=False, nullable=False)
+    pts_bonus_rec_te = Column(
+        Float, index=False, unique=False, nullable=False
+    )  # Extra points per reception by a tight end
     qb = Column(Integer, index=False, unique=False, nullable=False)
     rb = Column(Integer, index=False, unique=False, nullable=False)
     wr = Column(Integer, index=False, unique=False, nullable=False)
@@ -131,6 +145,8 @@ class Season(Model):
 
 
 class Division(Model):
+    # A season's division number identifies it, the ID is assigned by the database
+    __table_args__ = (UniqueConstraint("season", "number"),)
     # Primary Key
     id = Column(Integer, primary_key=True)
     # Attributes
@@ -143,10 +159,10 @@ class Division(Model):
 
 
 class Team(Model):
+    # A season's roster ID identifies the team, the ID is assigned by the database
+    __table_args__ = (UniqueConstraint("season", "sleeper_roster_id"),)
     # Primary Key
-    id = Column(
-        Integer, primary_key=True
-    )  # Create with league_id + roster_id from sleeper API
+    id = Column(Integer, primary_key=True)
     # Attributes
     sleeper_roster_id = Column(Integer, index=False, unique=False, nullable=False)
     name = Column(String(64), index=False, unique=False, nullable=False)
@@ -177,12 +193,16 @@ class Player(Model):
     number = Column(Integer, index=False, unique=False, nullable=True)
     position = Column(String(5), index=False, unique=False, nullable=False)
     nfl_team = Column(String(3), index=False, unique=False, nullable=True)
-    age = Column(Integer, index=False, unique=False, nullable=False)
-    status = Column(String(64), index=False, unique=False, nullable=False)
-    years_exp = Column(Integer, index=False, unique=False, nullable=False)
-    weight = Column(Integer, index=False, unique=False, nullable=False)
-    height = Column(Integer, index=False, unique=False, nullable=False)
-    injury_status = Column(String(24), index=False, unique=False, nullable=False)
+    # Sleeper leaves these blank for rookies, free agents and retired players
+    age = Column(Integer, index=False, unique=False, nullable=True)
+    status = Column(String(64), index=False, unique=False, nullable=True)
+    years_exp = Column(Integer, index=False, unique=False, nullable=True)
+    weight = Column(Integer, index=False, unique=False, nullable=True)
+    height = Column(Integer, index=False, unique=False, nullable=True)
+    injury_status = Column(String(24), index=False, unique=False, nullable=True)
+    content_hash = Column(
+        String(32), index=False, unique=False, nullable=True
+    )  # Hash of the columns above, so the daily refresh can skip unchanged players
 
 
 class TeamPlayer(Model):
@@ -197,10 +217,15 @@ class TeamPlayer(Model):
 
 
 class Matchup(Model):
+    # Sleeper's matchup_id is only unique within a season's week, the ID is assigned by the database
+    __table_args__ = (UniqueConstraint("season", "week", "number"),)
     # Primary Key
     id = Column(Integer, primary_key=True)
     # Attributes
     week = Column(Integer, index=False, unique=False, nullable=False)
+    number = Column(
+        Integer, index=False, unique=False, nullable=False
+    )  # Sleeper's matchup_id
     matchup_type = Column(
         db.Enum("regular", "playoff", "consolation"),
         index=False,
@@ -208,6 +233,10 @@ class Matchup(Model):
         nullable=False,
     )
     place = Column(Integer, index=False, unique=False, nullable=True)
+    # Foreign Keys
+    season = Column(
+        Integer, ForeignKey("season.id"), index=False, unique=False, nullable=False
+    )
 
 
 class MatchupTeam(Model):
@@ -375,6 +404,8 @@ class DraftPosition(Model):
 
 
 class DraftPick(Model):
+    # A draft's pick number identifies the pick, the ID is assigned by the database
+    __table_args__ = (UniqueConstraint("draft", "pick_num"),)
     # Primary Key
     id = Column(Integer, primary_key=True)
     # Attributes
@@ -410,3 +441,277 @@ class NflState(db.Model):
     week = db.Column(db.Integer, primary_key=True)
     season = db.Column(db.Integer, index=False, unique=False)
     season_type = db.Column(db.String(64), index=False, unique=False)
+
+
+class SeasonSync(Model):
+    # Primary Key
+    season = Column(
+        Integer, ForeignKey("season.id"), primary_key=True, unique=False, nullable=False
+    )
+    # Attributes
+    last_week = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )  # The last week whose matchups and transactions are in the database
+    synced_at = Column(DateTime, index=False, unique=False, nullable=True)
+
+
+class OnboardingJob(Model):
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    # Attributes
+    status = Column(
+        db.Enum("pending", "running", "complete", "failed"),
+        index=False,
+        unique=False,
+        nullable=False,
+        default="pending",
+    )
+    leagues_total = Column(Integer, index=False, unique=False, nullable=True)
+    leagues_done = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    seasons_total = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )
+    seasons_done = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    error = Column(Text, index=False, unique=False, nullable=True)
+    created_at = Column(
+        DateTime, index=False, unique=False, nullable=False, default=datetime.utcnow
+    )
+    updated_at = Column(
+        DateTime,
+        index=False,
+        unique=False,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+    # Foreign Keys
+    user = Column(
+        Integer, ForeignKey("user.id"), index=True, unique=False, nullable=False
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "leagues_total": self.leagues_total,
+            "leagues_done": self.leagues_done,
+            "seasons_total": self.seasons_total,
+            "seasons_done": self.seasons_done,
+            "error": self.error,
+        }
+
+
+class RawPayload(Model):
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    # Attributes
+    endpoint = Column(String(255), index=False, unique=False, nullable=False)
+    kind = Column(
+        String(64), index=False, unique=False, nullable=False
+    )  # The endpoint template, e.g. league/{id}/matchups/{id}
+    league = Column(Integer, index=True, unique=False, nullable=True)
+    season = Column(Integer, index=True, unique=False, nullable=True)
+    week = Column(Integer, index=False, unique=False, nullable=True)
+    payload = Column(
+        LargeBinary, index=False, unique=False, nullable=False
+    )  # zlib compressed JSON
+    fetched_at = Column(
+        DateTime, index=False, unique=False, nullable=False, default=datetime.utcnow
+    )
+    # No foreign keys, payloads are staged before the rows they describe exist
+
+
+class IngestionReport(Model):
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    # Attributes
+    kind = Column(
+        String(32), index=True, unique=False, nullable=False
+    )  # e.g. league, onboard_season, sync
+    subject = Column(
+        String(64), index=False, unique=False, nullable=False
+    )  # e.g. the Sleeper ID of the league or season
+    started_at = Column(DateTime, index=True, unique=False, nullable=False)
+    duration = Column(Float, index=False, unique=False, nullable=False)  # Seconds
+    requests = Column(Integer, index=False, unique=False, nullable=False)
+    request_seconds = Column(Float, index=False, unique=False, nullable=False)
+    rows = Column(Integer, index=False, unique=False, nullable=False)
+    peak_rss_mb = Column(Integer, index=False, unique=False, nullable=True)
+    details = Column(
+        db.JSON, index=False, unique=False, nullable=True
+    )  # Per stage timings, per endpoint requests and per table rows
+
+
+class TeamSeasonStats(Model):
+    # Primary Key
+    team = Column(Integer, ForeignKey("team.id"), primary_key=True, nullable=False)
+    # Attributes, the record and points are for the regular season
+    games = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    wins = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    losses = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    ties = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    points_for = Column(Float, index=False, unique=False, nullable=False, default=0)
+    points_against = Column(Float, index=False, unique=False, nullable=False, default=0)
+    playoff_wins = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    playoff_losses = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )
+    high_score = Column(
+        Float, index=False, unique=False, nullable=True
+    )  # Regular season and playoff games
+    high_week = Column(Integer, index=False, unique=False, nullable=True)
+    low_score = Column(Float, index=False, unique=False, nullable=True)
+    low_week = Column(Integer, index=False, unique=False, nullable=True)
+    # Foreign Keys
+    season = Column(
+        Integer, ForeignKey("season.id"), index=True, unique=False, nullable=False
+    )
+    league = Column(
+        Integer, ForeignKey("league.id"), index=True, unique=False, nullable=False
+    )
+    owner = Column(
+        Integer, ForeignKey("user.id"), index=False, unique=False, nullable=True
+    )
+
+
+class OwnerStats(Model):
+    # Primary Keys
+    league = Column(Integer, ForeignKey("league.id"), primary_key=True, nullable=False)
+    owner = Column(Integer, ForeignKey("user.id"), primary_key=True, nullable=False)
+    # Attributes, all-time totals of the owner's TeamSeasonStats in the league
+    seasons = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    games = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    wins = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    losses = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    ties = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    points_for = Column(Float, index=False, unique=False, nullable=False, default=0)
+    points_against = Column(Float, index=False, unique=False, nullable=False, default=0)
+    playoff_wins = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    playoff_losses = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )
+    high_score = Column(Float, index=False, unique=False, nullable=True)
+    low_score = Column(Float, index=False, unique=False, nullable=True)
+
+
+class LeagueWeekStats(Model):
+    # Primary Keys
+    season = Column(Integer, ForeignKey("season.id"), primary_key=True, nullable=False)
+    week = Column(Integer, primary_key=True, nullable=False)
+    # Attributes
+    games = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )  # Teams that played, not matchups
+    points = Column(Float, index=False, unique=False, nullable=False, default=0)
+    high_score = Column(Float, index=False, unique=False, nullable=True)
+    low_score = Column(Float, index=False, unique=False, nullable=True)
+    # Foreign Keys
+    league = Column(
+        Integer, ForeignKey("league.id"), index=True, unique=False, nullable=False
+    )
+    high_team = Column(
+        Integer, ForeignKey("team.id"), index=False, unique=False, nullable=True
+    )
+    low_team = Column(
+        Integer, ForeignKey("team.id"), index=False, unique=False, nullable=True
+    )
+
+
+class PowerRanking(Model):
+    # Primary Keys
+    team = Column(Integer, ForeignKey("team.id"), primary_key=True, nullable=False)
+    week = Column(Integer, primary_key=True, nullable=False)
+    # Attributes, everything is through the end of the week
+    wins = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    losses = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    ties = Column(Integer, index=False, unique=False, nullable=False, default=0)
+    all_play_wins = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )  # Against every other team in each week
+    all_play_losses = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )
+    all_play_ties = Column(
+        Integer, index=False, unique=False, nullable=False, default=0
+    )
+    points_for = Column(Float, index=False, unique=False, nullable=False, default=0)
+    rolling_points = Column(
+        Float, index=False, unique=False, nullable=True
+    )  # Average points over the last few weeks
+    strength_of_schedule = Column(
+        Float, index=False, unique=False, nullable=True
+    )  # Average points per game of the opponents faced so far
+    score = Column(Float, index=False, unique=False, nullable=False, default=0)
+    rank = Column(Integer, index=False, unique=False, nullable=False)
+    # Foreign Keys
+    season = Column(
+        Integer, ForeignKey("season.id"), index=True, unique=False, nullable=False
+    )
+    league = Column(
+        Integer, ForeignKey("league.id"), index=True, unique=False, nullable=False
+    )
+
+
+class PlayoffOdds(Model):
+    # Primary Keys
+    team = Column(Integer, ForeignKey("team.id"), primary_key=True, nullable=False)
+    week = Column(
+        Integer, primary_key=True, nullable=False
+    )  # The last week played when the odds were simulated
+    # Attributes, probabilities between 0 and 1
+    playoffs = Column(Float, index=False, unique=False, nullable=False)
+    bye = Column(Float, index=False, unique=False, nullable=False)
+    championship = Column(Float, index=False, unique=False, nullable=False)
+    trials = Column(Integer, index=False, unique=False, nullable=False)
+    # Foreign Keys
+    season = Column(
+        Integer, ForeignKey("season.id"), index=True, unique=False, nullable=False
+    )
+    league = Column(
+        Integer, ForeignKey("league.id"), index=True, unique=False, nullable=False
+    )
+
+
+class ManagerEfficiency(Model):
+    # Primary Keys
+    team = Column(Integer, ForeignKey("team.id"), primary_key=True, nullable=False)
+    week = Column(Integer, primary_key=True, nullable=False)
+    # Attributes
+    actual_points = Column(Float, index=False, unique=False, nullable=False)
+    optimal_points = Column(
+        Float, index=False, unique=False, nullable=False
+    )  # The best legal lineup from the team's roster that week
+    bench_points = Column(Float, index=False, unique=False, nullable=False)
+    points_left = Column(
+        Float, index=False, unique=False, nullable=False
+    )  # Optimal minus actual points
+    efficiency = Column(
+        Float, index=False, unique=False, nullable=True
+    )  # Actual over optimal points
+    # Foreign Keys
+    season = Column(
+        Integer, ForeignKey("season.id"), index=True, unique=False, nullable=False
+    )
+    league = Column(
+        Integer, ForeignKey("league.id"), index=True, unique=False, nullable=False
+    )
+
+
+class PlayerWeekStats(Model):
+    # Primary Keys
+    player = Column(Integer, ForeignKey("player.id"), primary_key=True, nullable=False)
+    year = Column(Integer, primary_key=True, nullable=False)
+    week = Column(Integer, primary_key=True, nullable=False)
+    # Attributes, the player's NFL stat line for the week in each category a Season has a weight for
+    pass_yd = Column(Float, index=False, unique=False, nullable=False)
+    pass_td = Column(Float, index=False, unique=False, nullable=False)
+    pass_int = Column(Float, index=False, unique=False, nullable=False)
+    pass_2pt = Column(Float, index=False, unique=False, nullable=False)
+    rush_yd = Column(Float, index=False, unique=False, nullable=False)
+    rush_td = Column(Float, index=False, unique=False, nullable=False)
+    rush_2pt = Column(Float, index=False, unique=False, nullable=False)
+    rec = Column(Float, index=False, unique=False, nullable=False)
+    rec_yd = Column(Float, index=False, unique=False, nullable=False)
+    rec_td = Column(Float, index=False, unique=False, nullable=False)
+    rec_2pt = Column(Float, index=False, unique=False, nullable=False)
+    fum_lost = Column(Float, index=False, unique=False, nullable=False)
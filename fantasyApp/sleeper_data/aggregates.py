@@ -0,0 +1,290 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.orm import aliased
+
+from fantasyApp import db
+from fantasyApp.analytics.lineups import lineup_rows
+from fantasyApp.analytics.power_rankings import season_power_rankings
+from fantasyApp.models import (
+    League,
+    LeagueWeekStats,
+    ManagerEfficiency,
+    Matchup,
+    MatchupTeam,
+    OwnerStats,
+    PowerRanking,
+    Team,
+    TeamSeasonStats,
+)
+from fantasyApp.sleeper_data.instrumentation import traced
+from fantasyApp.sleeper_data.writers import UPSERT_DIALECTS, BulkWriter
+
+# The OwnerStats columns totalled up from TeamSeasonStats, the seasons are counted, the high and low scores are the
+# max and min and the rest are summed
+OWNER_TOTALS = [
+    "seasons",
+    "games",
+    "wins",
+    "losses",
+    "ties",
+    "points_for",
+    "points_against",
+    "playoff_wins",
+    "playoff_losses",
+    "high_score",
+    "low_score",
+]
+
+
+class Game(NamedTuple):
+    """
+    One team's side of a matchup.
+    :ivar team: The ID of the team.
+    :ivar owner: The ID of the team's owner, None for an orphaned team.
+    :ivar league: The ID of the league.
+    :ivar week: The week the matchup was played in.
+    :ivar matchup_type: regular, playoff or consolation.
+    :ivar points: The team's points, None if it hasn't been scored yet.
+    :ivar opponent: The ID of the opponent's team, None if the team had no opponent that week.
+    :ivar opponent_points: The opponent's points, None if the team had no opponent that week.
+    """
+
+    team: int
+    owner: Optional[int]
+    league: int
+    week: int
+    matchup_type: str
+    points: Optional[float]
+    opponent: Optional[int]
+    opponent_points: Optional[float]
+
+
+def season_games(season_id: int, session=None) -> List[Game]:
+    """
+    Get both sides of every matchup in a season in one query, each team's points next to its opponent's.
+    :param season_id: The ID of the season.
+    :param session: The session to query with, defaults to db.session.
+    :return: A Game for each team in each matchup.
+    """
+    session = session or db.session
+    opponent = aliased(MatchupTeam)
+    rows = session.execute(
+        select(
+            MatchupTeam.team,
+            Team.owner,
+            Team.league,
+            Matchup.week,
+            Matchup.matchup_type,
+            MatchupTeam.total_points,
+            opponent.team,
+            opponent.total_points,
+        )
+        .join(Team, Team.id == MatchupTeam.team)
+        .join(Matchup, Matchup.id == MatchupTeam.matchup)
+        .outerjoin(
+            opponent,
+            and_(
+                opponent.matchup == MatchupTeam.matchup,
+                opponent.team != MatchupTeam.team,
+            ),
+        )
+        .where(Team.season == season_id)
+    )
+    return [Game(*row) for row in rows]
+
+
+def team_season_rows(season_id: int, games: List[Game]) -> Dict[int, dict]:
+    """
+    Total up the TeamSeasonStats of every team in a season. The record and points only count regular season games,
+    playoff games are counted separately and consolation games only count towards the high and low scores.
+    :param season_id: The ID of the season.
+    :param games: The season's games.
+    :return: The TeamSeasonStats column values, keyed on the team ID.
+    """
+    rows = {}
+    for game in games:
+        row = rows.setdefault(
+            game.team,
+            {
+                "team": game.team,
+                "games": 0,
+                "wins": 0,
+                "losses": 0,
+                "ties": 0,
+                "points_for": 0.0,
+                "points_against": 0.0,
+                "playoff_wins": 0,
+                "playoff_losses": 0,
+                "high_score": None,
+                "high_week": None,
+                "low_score": None,
+                "low_week": None,
+                "season": season_id,
+                "league": game.league,
+                "owner": game.owner,
+            },
+        )
+        if game.points is None:
+            continue
+        if row["high_score"] is None or game.points > row["high_score"]:
+            row["high_score"], row["high_week"] = game.points, game.week
+        if row["low_score"] is None or game.points < row["low_score"]:
+            row["low_score"], row["low_week"] = game.points, game.week
+        if game.matchup_type == "regular":
+            row["games"] += 1
+            row["points_for"] += game.points
+            if game.opponent_points is not None:
+                row["points_against"] += game.opponent_points
+                if game.points > game.opponent_points:
+                    row["wins"] += 1
+                elif game.points < game.opponent_points:
+                    row["losses"] += 1
+                else:
+                    row["ties"] += 1
+        elif game.matchup_type == "playoff" and game.opponent_points is not None:
+            if game.points > game.opponent_points:
+                row["playoff_wins"] += 1
+            elif game.points < game.opponent_points:
+                row["playoff_losses"] += 1
+    return rows
+
+
+def league_week_rows(
+    season_id: int, games: List[Game], weeks: Iterable[int]
+) -> List[dict]:
+    """
+    Total up the LeagueWeekStats of some of a season's weeks.
+    :param season_id: The ID of the season.
+    :param games: The season's games.
+    :param weeks: The weeks to total up.
+    :return: The LeagueWeekStats column values of each week that has been scored.
+    """
+    weeks = set(weeks)
+    scored = defaultdict(list)
+    for game in games:
+        if game.week in weeks and game.points is not None:
+            scored[game.week].append(game)
+    rows = []
+    for week, week_games in scored.items():
+        high = max(week_games, key=lambda game: game.points)
+        low = min(week_games, key=lambda game: game.points)
+        rows.append(
+            {
+                "season": season_id,
+                "week": week,
+                "games": len(week_games),
+                "points": sum(game.points for game in week_games),
+                "high_score": high.points,
+                "low_score": low.points,
+                "league": high.league,
+                "high_team": high.team,
+                "low_team": low.team,
+            }
+        )
+    return rows
+
+
+def upsert_owner_stats(league_id: int, owners: Iterable[int], session=None) -> None:
+    """
+    Total up the all-time OwnerStats of some of a league's owners from their stored TeamSeasonStats, in one
+    INSERT ... SELECT ... GROUP BY statement. Seasons are filled in by parallel tasks, so the league's row is locked
+    first: another task's totals are then committed before ours are summed, and neither overwrites the other with
+    totals missing a season. Nothing is committed.
+    :param league_id: The ID of the league.
+    :param owners: The IDs of the owners.
+    :param session: The session to write them in, defaults to db.session.
+    """
+    session = session or db.session
+    session.execute(select(League.id).where(League.id == league_id).with_for_update())
+    totals = (
+        select(
+            TeamSeasonStats.league,
+            TeamSeasonStats.owner,
+            func.count(TeamSeasonStats.team),
+            *(
+                func.sum(getattr(TeamSeasonStats, column))
+                for column in OWNER_TOTALS[1:-2]
+            ),
+            func.max(TeamSeasonStats.high_score),
+            func.min(TeamSeasonStats.low_score),
+        )
+        .where(
+            TeamSeasonStats.league == league_id,
+            TeamSeasonStats.owner.in_(list(owners)),
+        )
+        .group_by(TeamSeasonStats.league, TeamSeasonStats.owner)
+    )
+    columns = ["league", "owner", *OWNER_TOTALS]
+    table = OwnerStats.__table__
+    insert = UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+    if insert is None:
+        # Without ON CONFLICT, the owners' rows are replaced instead
+        session.execute(
+            delete(OwnerStats).where(
+                OwnerStats.league == league_id, OwnerStats.owner.in_(list(owners))
+            )
+        )
+        session.execute(table.insert().from_select(columns, totals))
+        return
+    statement = insert(table).from_select(columns, totals)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["league", "owner"],
+            set_={column: statement.excluded[column] for column in OWNER_TOTALS},
+        )
+    )
+
+
+@traced("aggregates")
+def refresh_aggregates(
+    weeks_by_season: Dict[int, Iterable[int]], writer: BulkWriter
+) -> Set[int]:
+    """
+    Bring the aggregate tables up to date after new matchups were written. Each season's games are read in one query
+    and its TeamSeasonStats are totalled up again, which is a few hundred rows at most, but only the LeagueWeekStats
+    and ManagerEfficiency of the weeks that changed are rewritten, only the PowerRankings from the first of them on
+    and only the OwnerStats of the seasons' owners. The writer must have written the seasons' matchups already, the
+    new rows are written but not committed.
+    :param weeks_by_season: The weeks that changed, keyed on the ID of their season.
+    :param writer: The BulkWriter to write the rows with.
+    :return: The IDs of the leagues whose aggregates changed.
+    """
+    leagues = set()
+    owners_by_league = defaultdict(set)
+    for season_id, weeks in weeks_by_season.items():
+        games = season_games(season_id, writer.session)
+        leagues.update(game.league for game in games)
+        for row in team_season_rows(season_id, games).values():
+            writer.add(TeamSeasonStats, row)
+            if row["owner"] is not None:
+                owners_by_league[row["league"]].add(row["owner"])
+        for row in league_week_rows(season_id, games, weeks):
+            writer.add(LeagueWeekStats, row)
+        rankings = season_power_rankings(games)
+        if rankings is not None:
+            for row in rankings.rows(season_id, games[0].league, min(weeks)):
+                writer.add(PowerRanking, row)
+        for row in lineup_rows(season_id, weeks, writer.session):
+            writer.add(ManagerEfficiency, row)
+    # Owner totals are summed from the TeamSeasonStats, so those have to be written first
+    writer.flush()
+    for league_id, owners in owners_by_league.items():
+        upsert_owner_stats(league_id, owners, writer.session)
+    return leagues
+
+
+def bump_data_version(league_ids: Iterable[int], session=None) -> None:
+    """
+    Move the data_version of leagues forward, so analytics cached for them are rebuilt. Nothing is committed.
+    :param league_ids: The IDs of the leagues.
+    :param session: The session to update them in, defaults to db.session.
+    """
+    league_ids = list(league_ids)
+    if league_ids:
+        (session or db.session).execute(
+            update(League)
+            .where(League.id.in_(league_ids))
+            .values(data_version=League.data_version + 1)
+        )
@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Sleeper marks both leagues and drafts as "complete" once they are over, after which their data never changes
+COMPLETE = "complete"
+# A week of NFL stats, they belong to no league and only change until their season is over
+STATS_ENDPOINT = re.compile(r"^stats/nfl/regular/(\d{4})/\d+$")
+# The month of the following year from which a season's stats are final, the regular season ends in early January
+# and stat corrections follow for another week or so
+STATS_FINAL_MONTH = 2
+
+
+def stats_are_final(year: int, now: datetime = None) -> bool:
+    """
+    Check whether a season's NFL stats can still change.
+    :param year: The year of the season.
+    :param now: The current time, defaults to now.
+    :return: True once the season and its stat corrections are over.
+    """
+    now = now or datetime.now()
+    return (now.year, now.month) >= (year + 1, STATS_FINAL_MONTH)
+
+
+class ResponseCache:
+    """
+    A size bounded, SQLite backed cache of Sleeper API responses keyed by endpoint.
+    Anything that belongs to a league or draft with status == "complete" is kept forever, since finished seasons never
+    change, and so are the NFL stats of past seasons. Everything else expires after a short TTL. When the cache grows
+    past max_bytes the least recently used entries are evicted.
+    :ivar path: The path to the SQLite file.
+    :ivar max_bytes: The most compressed payload bytes to keep before evicting.
+    :ivar ttl: How long in seconds to keep responses that could still change.
+    :ivar players_ttl: How long in seconds to keep the players/nfl catalog.
+    :ivar hits: The number of lookups served from the cache.
+    :ivar misses: The number of lookups that had to go to the network.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 300,
+        players_ttl: float = 24 * 60 * 60,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.players_ttl = players_ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                endpoint TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access);
+            CREATE TABLE IF NOT EXISTS statuses (
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                status TEXT,
+                PRIMARY KEY (kind, id)
+            );
+            """)
+        self._conn.commit()
+        self._size = self._total_size()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["ResponseCache"]:
+        """
+        Build a cache from the app config.
+        :param config: The Flask app config (or any mapping with the SLEEPER_CACHE_* keys).
+        :return: A new ResponseCache, or None if caching is turned off or no path is configured.
+        """
+        path = config.get("SLEEPER_CACHE_PATH")
+        if not config.get("SLEEPER_CACHE_ENABLED", True) or not path:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return cls(
+            path,
+            max_bytes=config.get("SLEEPER_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+            ttl=config.get("SLEEPER_CACHE_TTL", 300),
+            players_ttl=config.get("SLEEPER_CACHE_PLAYERS_TTL", 24 * 60 * 60),
+        )
+
+    def get(self, endpoint: str) -> Optional[Any]:
+        """
+        Look up a cached response.
+        :param endpoint: The endpoint relative to the base url.
+        :return: The decoded JSON payload, or None on a miss or if the entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM responses WHERE endpoint = ?",
+                (endpoint,),
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE endpoint = ?",
+                (now, endpoint),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, endpoint: str, payload: Any) -> None:
+        """
+        Store a response, working out how long it should live from the endpoint and the payload itself.
+        :param endpoint: The endpoint relative to the base url.
+        :param payload: The decoded JSON payload returned by the API.
+        """
+        now = time.time()
+        blob = zlib.compress(json.dumps(payload).encode("utf-8"))
+        with self._lock:
+            ttl = self.ttl_for(endpoint, payload)
+            expires_at = None if ttl is None else now + ttl
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE endpoint = ?", (endpoint,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (endpoint, payload, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (endpoint, blob, len(blob), expires_at, now),
+            )
+            self._size += len(blob) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def ttl_for(self, endpoint: str, payload: Any) -> Optional[float]:
+        """
+        Work out how long a response should be cached for. Along the way this remembers the status of any league or
+        draft the payload describes, so later endpoints for the same league or draft know whether it is complete.
+        :param endpoint: The endpoint relative to the base url.
+        :param payload: The decoded JSON payload returned by the API.
+        :return: The TTL in seconds, or None if the response never expires.
+        """
+        segments = endpoint.strip("/").split("/")
+        kind = segments[0]
+        if kind == "user" and len(segments) > 2 and segments[2] == "leagues":
+            self._remember_statuses("league", "league_id", payload)
+        elif kind == "league" and len(segments) == 3 and segments[2] == "drafts":
+            self._remember_statuses("draft", "draft_id", payload)
+        elif kind in ("league", "draft") and len(segments) == 2:
+            self._remember_statuses(kind, f"{kind}_id", [payload])
+
+        if kind in ("league", "draft") and len(segments) > 1:
+            if self._status(kind, segments[1]) == COMPLETE:
+                return None
+        stats = STATS_ENDPOINT.match(endpoint.strip("/"))
+        if stats and stats_are_final(int(stats.group(1))):
+            return None
+        if endpoint.strip("/") == "players/nfl":
+            return self.players_ttl
+        return self.ttl
+
+    def stats(self) -> Dict[str, int]:
+        """
+        A snapshot of the cache counters.
+        :return: A dictionary with hits, misses, entries and bytes.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": self._size,
+            }
+
+    def clear(self) -> None:
+        """
+        Remove every cached response and remembered status.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM statuses")
+            self._conn.commit()
+            self._size = 0
+
+    def _remember_statuses(self, kind: str, id_key: str, items: Any) -> None:
+        if not isinstance(items, list):
+            return
+        rows = [
+            (kind, str(item.get(id_key)), item.get("status"))
+            for item in items
+            if isinstance(item, dict) and item.get(id_key) and item.get("status")
+        ]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO statuses (kind, id, status) VALUES (?, ?, ?)", rows
+        )
+
+    def _status(self, kind: str, object_id: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT status FROM statuses WHERE kind = ? AND id = ?", (kind, object_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _total_size(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def _evict(self) -> None:
+        # Other worker processes write to the same file, so resync before deciding how much to drop
+        self._conn.execute(
+            "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+        )
+        self._size = self._total_size()
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT endpoint, size FROM responses ORDER BY last_access"
+        )
+        evicted = []
+        for endpoint, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((endpoint,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE endpoint = ?", evicted)
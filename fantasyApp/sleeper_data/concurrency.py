@@ -0,0 +1,104 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+
+class AppExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor whose tasks run inside the submitting thread's app context (if there is one) and with a
+    copy of its context variables, so current_app, the config and the request priority are still available from the
+    worker threads. Tasks get their own database session, so they should only do network and CPU work.
+    :ivar app: The app the tasks run in, None outside an app context.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        """
+        :param max_workers: The most tasks to run at once. Defaults to SLEEPER_MAX_WORKERS from the config.
+        """
+        self.app = current_app._get_current_object() if has_app_context() else None
+        if max_workers is None:
+            max_workers = (
+                self.app.config.get("SLEEPER_MAX_WORKERS", 8) if self.app else 8
+            )
+        super().__init__(max_workers=max(max_workers, 1))
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return super().submit(
+            contextvars.copy_context().run, self._call, fn, args, kwargs
+        )
+
+    def _call(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        if self.app is None:
+            return fn(*args, **kwargs)
+        with self.app.app_context():
+            return fn(*args, **kwargs)
+
+
+def fan_out(
+    func: Callable[..., Any], args: Iterable[tuple], max_workers: Optional[int] = None
+) -> List[Any]:
+    """
+    Call a function once per argument tuple on a bounded thread pool. Results come back in the same order as the
+    arguments, so callers can zip them back together. The calls run on an AppExecutor, so current_app and the config
+    are still available from the worker threads.
+    :param func: The function to call, usually one of the SleeperAPI fetch methods.
+    :param args: An iterable of argument tuples, one per call.
+    :param max_workers: The most calls to run at once. Defaults to SLEEPER_MAX_WORKERS from the config.
+    :return: A list of the results in the same order as args.
+    """
+    args = list(args)
+    if max_workers is None:
+        max_workers = (
+            current_app.config.get("SLEEPER_MAX_WORKERS", 8) if has_app_context() else 8
+        )
+    if max_workers <= 1 or len(args) <= 1:
+        return [func(*arg) for arg in args]
+
+    with AppExecutor(max_workers=min(max_workers, len(args))) as executor:
+        futures = [executor.submit(func, *arg) for arg in args]
+        return [future.result() for future in futures]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one. The first caller for a key runs the function, and anyone
+    who asks for the same key while it is still running waits for it and gets the same result (or exception) instead
+    of making the call again. Callers share the returned object, so they must treat it as read only.
+    :ivar shared: The number of calls that were served by another caller's in-flight call.
+    """
+
+    def __init__(self) -> None:
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(
+        self, key: Hashable, func: Callable[..., Any], *args: Any
+    ) -> Tuple[Any, bool]:
+        """
+        Call func(*args) unless a call for the same key is already in flight, in which case wait for that one.
+        :param key: What makes two calls the same, e.g. the endpoint.
+        :param func: The function to call.
+        :param args: The arguments to call it with.
+        :return: The result of the call, and whether it came from another caller's call.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(), True
+        try:
+            future.set_result(func(*args))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result(), False
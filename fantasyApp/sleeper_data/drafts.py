@@ -1,86 +1,108 @@
-from fantasyApp import db
 from fantasyApp.models import Draft, DraftPosition, DraftPick
 from fantasyApp.sleeper_data.utils import SleeperAPI
-from flask import current_app
+from fantasyApp.sleeper_data.instrumentation import traced
+from fantasyApp.sleeper_data.teams import team_ref
+from fantasyApp.sleeper_data.writers import BulkWriter
 from datetime import datetime
 
 
 class NewDraft:
     """
-    A class to represent a new draft. This class will create a new draft in the database and add all the draft positions
-    and draft picks to the database.
+    A class to represent a new draft. The draft, its draft positions and its draft picks are queued on a BulkWriter
+    as plain rows, so adding the same draft again updates it rather than failing.
     :ivar draft: The draft data from the Sleeper API.
     :ivar draft_id: The ID of the draft.
     :ivar settings: The settings for the draft.
     :ivar league_id: The ID of the league.
     :ivar draft_slots: A dictionary mapping draft slots to roster IDs.
     :ivar draft_picks: A list of draft picks.
-    :ivar draft_items_to_add: A list of draft items to add to the database.
+    :ivar writer: The BulkWriter the rows are queued on.
     """
-    draft_items_to_add = []
 
-    def __init__(self, draft: dict) -> None:
+    @traced("draft")
+    def __init__(
+        self,
+        draft: dict,
+        draft_data: dict = None,
+        draft_picks: list[dict] = None,
+        writer: BulkWriter = None,
+    ) -> None:
         """
-        Initialize the NewDraft class with the draft data and add all the positions and picks to the database. This does
-        not add the draft itself to the database or commit the session.
+        Initialize the NewDraft class with the draft data and queue the draft, its positions and its picks. Nothing is
+        written until the writer is flushed.
         :param draft: A dictionary of draft data from the Sleeper API.
+        :param draft_data: The draft's full data if it has already been fetched, otherwise it is fetched here.
+        :param draft_picks: The draft's picks if they have already been fetched, otherwise they are fetched here.
+        :param writer: The BulkWriter to queue the rows on, a new one is created if not given.
         """
         self.draft = draft
         self.draft_id = draft.get("draft_id")
-        self.settings = draft.get("settings")
+        self.settings = draft.get("settings") or {}
         self.league_id = draft.get("league_id")
-        self.draft_slots = SleeperAPI.fetch_draft_data(self.draft_id).get(
-            "slot_to_roster_id"
-        )
-        self.draft_picks = SleeperAPI.fetch_draft_picks(self.draft_id)
+        if draft_data is None:
+            draft_data = SleeperAPI.fetch_draft_data(self.draft_id) or {}
+        if draft_picks is None:
+            draft_picks = SleeperAPI.fetch_draft_picks(self.draft_id)
+        self.draft_slots = draft_data.get("slot_to_roster_id") or {}
+        self.draft_picks = draft_picks
+        self.writer = writer or BulkWriter()
 
-        self.create_draft_positions()
-        self.create_draft_picks()
-        db.session.add_all(self.draft_items_to_add)
+        self.add_draft()
+        self.add_draft_positions()
+        self.add_draft_picks()
 
-    def create_draft_db_item(self) -> Draft:
+    def add_draft(self) -> None:
         """
-        Create the draft database item.
-        :return: The draft database item.
+        Queue the Draft row.
         """
-        draft = Draft(
-            id=self.draft_id,
-            status=self.draft.get("status"),
-            year=self.draft.get("season"),
-            start_time=datetime.fromtimestamp(self.draft.get("start_time") / 1000),
-            type=self.draft.get("type"),
-            rounds=self.settings.get("rounds"),
-            pick_timer=self.settings.get("pick_timer"),
-            scoring_type=self.draft.get("metadata").get("scoring_type"),
-            season=self.league_id,
+        start_time = self.draft.get("start_time")
+        self.writer.add(
+            Draft,
+            {
+                "id": self.draft_id,
+                "status": self.draft.get("status"),
+                "year": self.draft.get("season"),
+                "start_time": (
+                    datetime.fromtimestamp(start_time / 1000) if start_time else None
+                ),
+                "type": self.draft.get("type"),
+                "rounds": self.settings.get("rounds"),
+                "pick_timer": self.settings.get("pick_timer", 0),
+                "scoring_type": (self.draft.get("metadata") or {}).get(
+                    "scoring_type", ""
+                ),
+                "season": self.league_id,
+            },
         )
-        return draft
 
-    def create_draft_positions(self) -> None:
+    def add_draft_positions(self) -> None:
         """
-        Create the draft positions for the draft. Adds the draft positions to the draft_items_to_add list.
+        Queue a DraftPosition row for each slot in the draft.
         """
         for position, roster_id in self.draft_slots.items():
-            team_id = int(str(self.league_id) + str(roster_id))
-            self.draft_items_to_add.append(
-                DraftPosition(draft=self.draft_id, team=team_id, position=position)
+            self.writer.add(
+                DraftPosition,
+                {
+                    "draft": self.draft_id,
+                    "team": team_ref(self.league_id, roster_id),
+                    "position": int(position),
+                },
             )
 
-    def create_draft_picks(self) -> None:
+    def add_draft_picks(self) -> None:
         """
-        Create the draft picks for the draft. Adds the draft picks to the draft_items_to_add list.
+        Queue a DraftPick row for each pick made. A pick is identified by its draft and pick number.
         """
-        if self.draft_picks:
-            for pick in self.draft_picks:
-                team_id = int(str(self.league_id) + str(pick.get("roster_id")))
-                self.draft_items_to_add.append(
-                    DraftPick(
-                        round=pick.get("round"),
-                        pick_num=pick.get("pick_no"),
-                        slot=pick.get("draft_slot"),
-                        keeper=pick.get("is_keeper"),
-                        draft=self.draft_id,
-                        team=team_id,
-                        player=pick.get("player_id"),
-                    )
-                )
+        for pick in self.draft_picks or []:
+            self.writer.add(
+                DraftPick,
+                {
+                    "round": pick.get("round"),
+                    "pick_num": pick.get("pick_no"),
+                    "slot": pick.get("draft_slot"),
+                    "keeper": bool(pick.get("is_keeper")),
+                    "draft": self.draft_id,
+                    "team": team_ref(self.league_id, pick.get("roster_id")),
+                    "player": pick.get("player_id"),
+                },
+            )
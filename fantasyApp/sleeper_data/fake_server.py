@@ -0,0 +1,99 @@
+"""
+A local stand-in for the Sleeper API that serves recorded fixtures over HTTP.
+
+Record some fixtures with SLEEPER_API_MODE=record, then run:
+
+    python -m fantasyApp.sleeper_data.fake_server --fixtures <dir> --port 8765 --latency 0.08
+
+and point the app at it with SLEEPER_BASE_URL=http://127.0.0.1:8765/v1/
+"""
+
+import argparse
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fantasyApp.sleeper_data.fixtures import FixtureStore
+
+URL_PREFIX = "/v1/"
+
+
+def make_handler(store: FixtureStore) -> type:
+    """
+    Build a request handler class that serves fixtures from a store.
+    :param store: The fixtures to serve.
+    :return: A BaseHTTPRequestHandler subclass.
+    """
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+        def do_GET(self) -> None:
+            endpoint = self.path.split("?")[0]
+            if endpoint.startswith(URL_PREFIX):
+                endpoint = endpoint[len(URL_PREFIX) :]
+            path = store.path_for(endpoint)
+            store.delay()
+            if not endpoint or not os.path.exists(path):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with gzip.open(path, "rb") as fixture:
+                body = fixture.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return FixtureHandler
+
+
+def serve_fixtures(
+    directory: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0,
+    jitter: float = 0,
+) -> ThreadingHTTPServer:
+    """
+    Start the fake server on a background thread.
+    :param directory: The fixture directory to serve.
+    :param host: The interface to listen on.
+    :param port: The port to listen on, 0 picks a free one.
+    :param latency: The delay in seconds added to every response.
+    :param jitter: Up to this many extra seconds are added at random to every response.
+    :return: The running server, its base url is http://<host>:<server.server_port>/v1/
+    """
+    store = FixtureStore(directory, latency=latency, jitter=jitter)
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", required=True, help="The fixture directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="Seconds per call")
+    parser.add_argument("--jitter", type=float, default=0, help="Random extra seconds")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures, latency=args.latency, jitter=args.jitter)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    print(f"Serving {args.fixtures} at http://{args.host}:{args.port}{URL_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import gzip
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+
+
+class FixtureStore:
+    """
+    A directory of recorded Sleeper API responses. Each endpoint is stored as a gzipped JSON file at the same path as
+    the endpoint, e.g. league/1234/matchups/5 -> <directory>/league/1234/matchups/5.json.gz.
+    In record mode every response fetched from the API is saved here. In replay mode responses are served from here
+    instead of the network, after an artificial delay so benchmarks still see realistic latency.
+    :ivar directory: The root directory of the fixtures.
+    :ivar mode: Either RECORD or REPLAY.
+    :ivar latency: The delay in seconds added to every replayed response.
+    :ivar jitter: Up to this many extra seconds are added at random to every replayed response.
+    """
+
+    def __init__(
+        self, directory: str, mode: str = REPLAY, latency: float = 0, jitter: float = 0
+    ) -> None:
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["FixtureStore"]:
+        """
+        Build a fixture store from the app config.
+        :param config: The Flask app config (or any mapping with the SLEEPER_API_MODE and SLEEPER_FIXTURE_* keys).
+        :return: A new FixtureStore, or None when talking to the live API.
+        """
+        mode = config.get("SLEEPER_API_MODE", LIVE)
+        if mode not in (RECORD, REPLAY):
+            return None
+        return cls(
+            config.get("SLEEPER_FIXTURE_DIR"),
+            mode=mode,
+            latency=config.get("SLEEPER_REPLAY_LATENCY", 0),
+            jitter=config.get("SLEEPER_REPLAY_JITTER", 0),
+        )
+
+    def path_for(self, endpoint: str) -> str:
+        """
+        Get the fixture file for an endpoint.
+        :param endpoint: The endpoint relative to the base url.
+        :return: The path to the gzipped JSON file.
+        """
+        return (
+            os.path.join(self.directory, *endpoint.strip("/").split("/")) + ".json.gz"
+        )
+
+    def save(self, endpoint: str, payload: Any) -> None:
+        """
+        Record a response.
+        :param endpoint: The endpoint relative to the base url.
+        :param payload: The decoded JSON payload returned by the API.
+        """
+        path = self.path_for(endpoint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as fixture:
+            json.dump(payload, fixture)
+
+    def load(self, endpoint: str) -> Optional[Any]:
+        """
+        Read a recorded response without any delay.
+        :param endpoint: The endpoint relative to the base url.
+        :return: The decoded JSON payload, or None if the endpoint was never recorded.
+        """
+        path = self.path_for(endpoint)
+        if not os.path.exists(path):
+            logger.warning(f"No recorded fixture for {endpoint}")
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as fixture:
+            return json.load(fixture)
+
+    def replay(self, endpoint: str) -> Optional[Any]:
+        """
+        Serve a recorded response after the configured artificial latency.
+        :param endpoint: The endpoint relative to the base url.
+        :return: The decoded JSON payload, or None if the endpoint was never recorded.
+        """
+        self.delay()
+        return self.load(endpoint)
+
+    def iter_chunks(self, endpoint: str, chunk_size: int) -> Iterator[bytes]:
+        """
+        Replay a recorded response as a stream of raw JSON bytes, after the configured artificial latency.
+        :param endpoint: The endpoint relative to the base url.
+        :param chunk_size: The size of each chunk in bytes.
+        :return: An iterator of byte chunks. Nothing is yielded if the endpoint was never recorded.
+        """
+        self.delay()
+        path = self.path_for(endpoint)
+        if not os.path.exists(path):
+            logger.warning(f"No recorded fixture for {endpoint}")
+            return
+        with gzip.open(path, "rb") as fixture:
+            yield from iter(lambda: fixture.read(chunk_size), b"")
+
+    def record_chunks(self, endpoint: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Record a streamed response as it passes through.
+        :param endpoint: The endpoint relative to the base url.
+        :param chunks: The raw JSON bytes of the response.
+        :return: The same chunks, unchanged.
+        """
+        path = self.path_for(endpoint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wb") as fixture:
+            for chunk in chunks:
+                fixture.write(chunk)
+                yield chunk
+
+    def delay(self) -> None:
+        """
+        Sleep for the configured latency plus a random amount of jitter.
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,280 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from flask import current_app
+
+from fantasyApp import db
+from fantasyApp.models import IngestionReport
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_tracer = ContextVar("ingestion_tracer", default=None)
+
+# Reading the process's memory isn't free, so stages only sample it this often
+RSS_SAMPLE_SECONDS = 0.1
+
+
+def rss_bytes() -> int:
+    """
+    Get how much memory this process is using.
+    :return: The current resident set size in bytes, or the peak where the current size isn't available (0 if
+    neither is).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, everything else kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Tracer:
+    """
+    Collects the timings of one ingestion: how long each stage took and how often it ran, every Sleeper request made
+    and how long it took, the rows written per table and the peak memory seen. Stages and requests are recorded from
+    whichever thread runs them, worker threads started with AppExecutor report to the tracer of the run that started
+    them.
+    :ivar kind: What kind of ingestion this is, e.g. league or sync.
+    :ivar subject: What is being ingested, e.g. the Sleeper ID of the league.
+    :ivar started_at: When the ingestion started.
+    :ivar stages: The calls, total seconds and slowest call of each stage, by stage name.
+    :ivar requests: The calls, failures and total seconds of the Sleeper requests, by endpoint template.
+    :ivar rows: The rows written per table.
+    :ivar peak_rss: The most memory the process used at the end of any stage, in bytes.
+    """
+
+    def __init__(self, kind: str, subject: Any) -> None:
+        self.kind = kind
+        self.subject = str(subject)
+        self.started_at = datetime.utcnow()
+        self.stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "max": 0.0})
+        self.requests = defaultdict(lambda: {"calls": 0, "failures": 0, "seconds": 0.0})
+        self.rows = defaultdict(int)
+        self.peak_rss = 0
+        self._start = time.perf_counter()
+        self._sampled = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, elapsed: float) -> None:
+        """
+        Record one run of a stage.
+        :param name: The stage name, e.g. season.fetch.
+        :param elapsed: How long it took in seconds.
+        """
+        now = time.perf_counter()
+        if now - self._sampled >= RSS_SAMPLE_SECONDS:
+            self._sampled = now
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+        with self._lock:
+            stage = self.stages[name]
+            stage["calls"] += 1
+            stage["seconds"] += elapsed
+            stage["max"] = max(stage["max"], elapsed)
+
+    def add_request(
+        self, label: str, elapsed: float, failed: bool, calls: int = 1
+    ) -> None:
+        """
+        Record one Sleeper request.
+        :param label: The endpoint template.
+        :param elapsed: How long it took in seconds.
+        :param failed: Whether it failed.
+        :param calls: How many calls to count, 0 marks a request that was already counted as failed.
+        """
+        with self._lock:
+            request = self.requests[label]
+            request["calls"] += calls
+            request["failures"] += int(failed)
+            request["seconds"] += elapsed
+
+    def add_rows(self, table: str, count: int) -> None:
+        """
+        Record rows written to a table.
+        :param table: The table name.
+        :param count: How many rows were written.
+        """
+        with self._lock:
+            self.rows[table] += count
+
+    def duration(self) -> float:
+        """
+        How long the ingestion has been running.
+        :return: The wall time in seconds.
+        """
+        return time.perf_counter() - self._start
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the ingestion so far.
+        :return: A JSON serializable dictionary of everything recorded.
+        """
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "subject": self.subject,
+                "duration": round(self.duration(), 4),
+                "peak_rss_mb": self.peak_rss // (1024 * 1024),
+                "stages": {
+                    name: {
+                        **stage,
+                        "seconds": round(stage["seconds"], 4),
+                        "max": round(stage["max"], 4),
+                    }
+                    for name, stage in sorted(
+                        self.stages.items(), key=lambda item: -item[1]["seconds"]
+                    )
+                },
+                "requests": {
+                    label: {**request, "seconds": round(request["seconds"], 4)}
+                    for label, request in self.requests.items()
+                },
+                "rows": dict(self.rows),
+            }
+
+    def report_row(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the IngestionReport row for the ingestion.
+        :param summary: The ingestion's summary().
+        :return: The column values of the row.
+        """
+        return {
+            "kind": self.kind,
+            "subject": self.subject,
+            "started_at": self.started_at,
+            "duration": summary["duration"],
+            "requests": sum(request["calls"] for request in self.requests.values()),
+            "request_seconds": round(
+                sum(request["seconds"] for request in self.requests.values()), 4
+            ),
+            "rows": sum(self.rows.values()),
+            "peak_rss_mb": summary["peak_rss_mb"],
+            "details": summary,
+        }
+
+
+@contextmanager
+def trace(kind: str, subject: Any, session=None) -> Iterator[Tracer]:
+    """
+    Trace an ingestion. When it finishes its summary is logged as JSON and stored as an IngestionReport row, a
+    failed ingestion is only logged.
+    :param kind: What kind of ingestion this is, e.g. league or sync.
+    :param subject: What is being ingested, e.g. the Sleeper ID of the league.
+    :param session: The session to store the report with, defaults to db.session.
+    :return: The Tracer, spans and requests inside the block are recorded on it.
+    """
+    tracer = Tracer(kind, subject)
+    token = _tracer.set(tracer)
+    try:
+        yield tracer
+    except Exception:
+        current_app.logger.warning(
+            f"Ingestion report (failed): {json.dumps(tracer.summary())}"
+        )
+        raise
+    finally:
+        _tracer.reset(token)
+    tracer.peak_rss = max(tracer.peak_rss, rss_bytes())
+    summary = tracer.summary()
+    current_app.logger.info(f"Ingestion report: {json.dumps(summary)}")
+    save_report(tracer.report_row(summary), session)
+
+
+def save_report(row: Dict[str, Any], session=None) -> None:
+    """
+    Store an ingestion report in its own commit. A report that can't be stored is logged and dropped, it never
+    fails the ingestion it describes.
+    :param row: The column values of the IngestionReport.
+    :param session: The session to store it with, defaults to db.session.
+    """
+    session = session or db.session
+    try:
+        session.add(IngestionReport(**row))
+        session.commit()
+    except Exception as error:
+        session.rollback()
+        current_app.logger.warning(f"Could not store the ingestion report: {error!r}")
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time a stage of the current ingestion. Outside of a trace() this does nothing.
+    :param name: The stage name, e.g. season.fetch.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add_stage(name, time.perf_counter() - start)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorate a function so every call is timed as a stage of the current ingestion, like wrapping it in span().
+    :param name: The stage name, e.g. season.teams.
+    :return: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current() -> Optional[Tracer]:
+    """
+    Get the tracer of the current ingestion.
+    :return: The Tracer, or None outside of a trace().
+    """
+    return _tracer.get()
+
+
+def record_request(
+    label: str, elapsed: float, failed: bool = False, calls: int = 1
+) -> None:
+    """
+    Record a Sleeper request on the current ingestion's tracer, if there is one.
+    :param label: The endpoint template.
+    :param elapsed: How long it took in seconds.
+    :param failed: Whether it failed.
+    :param calls: How many calls to count, 0 marks a request that was already counted as failed.
+    """
+    tracer = _tracer.get()
+    if tracer is not None:
+        tracer.add_request(label, elapsed, failed, calls)
+
+
+def record_rows(table: str, count: int) -> None:
+    """
+    Record rows written on the current ingestion's tracer, if there is one.
+    :param table: The table name.
+    :param count: How many rows were written.
+    """
+    tracer = _tracer.get()
+    if tracer is not None:
+        tracer.add_rows(table, count)
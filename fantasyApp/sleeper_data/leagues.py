@@ -1,72 +1,154 @@
 from datetime import datetime
+from typing import Iterator, Optional
 
-from celery import shared_task
+from sqlalchemy import Row
+
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.concurrency import AppExecutor
+from fantasyApp.sleeper_data.instrumentation import trace, traced
+from fantasyApp.sleeper_data.lookups import LookupCache
 from fantasyApp.sleeper_data.seasons import NewSeason
+from fantasyApp.sleeper_data.sync import last_completed_week
 from fantasyApp.sleeper_data.utils import SleeperAPI
-from fantasyApp.models import League, Season
+from fantasyApp.sleeper_data.unit_of_work import UnitOfWork
+from fantasyApp.models import League, NflState, Season
 from fantasyApp import db
 from flask import current_app
 
 
-def check_if_added(current_season: dict) -> bool:
+def check_if_added(current_season: dict, lookups: LookupCache = None) -> Optional[Row]:
     """
     Check if the league is already in the database.
     :param current_season: The league data returned from the sleeper API.
-    :return: True if the league is in the database, False otherwise.
+    :param lookups: The LookupCache shared by the ingestion, a new one is created if not given.
+    :return: The current season if the league is in the database, None otherwise.
     """
     current_season_id = current_season.get("league_id")
-    season_in_db = Season.query.filter_by(id=current_season_id).first()
+    season_in_db = (lookups or LookupCache()).get(Season, current_season_id)
     if season_in_db:
         current_app.logger.info(
             f"League for {current_season_id} already exists in our database"
         )
-        return True
-    return False
+    return season_in_db
 
 
 class LeagueTree:
     """
-    A class to represent the league tree and manage league and season data.
+    A class to represent the league tree and manage league and season data. Seasons are found by walking back
+    through each season's previous_league_id, and every season starts downloading on a worker thread as soon as it is
+    found while the walk carries on, so the chain's round trips overlap the seasons' own fetches. All the database
+    work happens afterwards on this thread, in one transaction, along with the staged payloads of everything fetched.
 
     :ivar league_id: The ID of the league.
     :ivar current_season: The current season data.
     :ivar league_in_db: Whether the league is in the database.
-    :ivar seasons_to_add: A list of seasons to add.
+    :ivar seasons_to_add: The new seasons found, newest first.
+    :ivar unit: The UnitOfWork of the ingestion run.
+    :ivar writer: The run's BulkWriter, shared by every season in the tree.
+    :ivar lookups: The run's LookupCache, shared by every season in the tree.
     """
-    seasons_to_add = []
 
-    def __init__(self, current_season: dict) -> None:
+    def __init__(
+        self, current_season: dict, build: bool = True, unit: UnitOfWork = None
+    ) -> None:
         """
         Initialize the LeagueTree with the current season's data.
         :param current_season: The league data returned from the sleeper API.
+        :param build: Whether to find and add the new seasons now, False leaves that to the caller.
+        :param unit: The UnitOfWork of the ingestion run, a new one is created if not given.
         """
-        self.league_id = None
         self.current_season = current_season
+        self.seasons_to_add = []
+        self.unit = unit or UnitOfWork()
+        self.writer = self.unit.writer
+        self.lookups = self.unit.lookups
         # Check if the league exists in our database already
-        self.league_in_db = check_if_added(current_season)
+        season_in_db = check_if_added(current_season, self.lookups)
+        self.league_in_db = season_in_db is not None
+        self.league_id = season_in_db.league if season_in_db else None
         # If it doesn't, search through each previous season until we find the league
-        if not self.league_in_db:
-            self.seasons_to_add.append(current_season)
-            self.dfs_for_seasons_to_add(current_season)
-            # If we didn't find a league, create a new one
-            if not self.league_in_db:
-                self.add_league_to_db()
+        if build and not self.league_in_db:
+            with trace("league", current_season.get("league_id")):
+                with staging.capture(self.writer) as store:
+                    # The current season came from the user's leagues, before the capture started
+                    staging.stage(
+                        f"league/{current_season.get('league_id')}", current_season
+                    )
+                    self.find_seasons_to_add()
+                    # If we didn't find a league, create a new one
+                    if not self.league_in_db:
+                        self.add_league_to_db()
+                        self.league_in_db = True
+                    if store:
+                        store.league = self.league_id
+                    # Add any new seasons found and then commit everything to the database
+                    self.add_seasons()
+                self.unit.commit()
+
+    def walk_seasons(self) -> Iterator[dict]:
+        """
+        Walk back through the previous seasons until we reach one that is already in our database (or the first
+        season of the league), yielding each new season's data as soon as it is found, newest first. If a season in
+        our database is found, its league_id is the league these seasons belong to.
+        :return: An iterator of the new seasons' data from the Sleeper API.
+        """
+        season_data = self.current_season
+        while season_data:
+            yield season_data
+            prev_season_id = season_data.get("previous_league_id")
+            # Sleeper uses "0" as well as null when there is no previous season
+            if not prev_season_id or prev_season_id == "0":
+                return
+            prev_season_in_db = self.lookups.get(Season, prev_season_id)
+            if prev_season_in_db:
+                # We found our league, so these seasons get added to it
+                self.league_id = prev_season_in_db.league
                 self.league_in_db = True
-            # Add any new seasons found and then commit everything to the database
-            self.add_seasons()
-            db.session.commit()
+                return
+            season_data = SleeperAPI.fetch_league_details(prev_season_id)
+            if not season_data:
+                current_app.logger.warning(
+                    f"Could not fetch season {prev_season_id}, stopping the search there"
+                )
+
+    @traced("league.walk")
+    def find_seasons_to_add(self) -> None:
+        """
+        Walk the previous seasons, submitting each new season's fetch to a worker pool as it is found so the walk
+        and the fetches overlap. Returns once every fetch has finished.
+        """
+        max_workers = current_app.config.get("INGEST_SEASON_WORKERS", 4)
+        # Only finished weeks are ingested, the weekly sync picks up the rest
+        state = NflState.query.first()
+        with AppExecutor(max_workers=max_workers) as executor:
+            fetches = []
+            for season_data in self.walk_seasons():
+                new_season = NewSeason(
+                    season_data, writer=self.writer, lookups=self.lookups
+                )
+                self.seasons_to_add.append(new_season)
+                fetches.append(
+                    executor.submit(
+                        new_season.fetch,
+                        last_completed_week(new_season.year, state),
+                    )
+                )
+            for fetch in fetches:
+                fetch.result()
 
+    @traced("league.add")
     def add_seasons(self) -> None:
         """
-        Add the new seasons in seasons_to_add to the database.
-        :return:
+        Add the new seasons in seasons_to_add to the database, oldest first, along with a sync watermark for each so
+        the weekly sync carries on from the last week we ingested. Each season is let go of once it is queued.
         """
-        new_seasons = []
         while self.seasons_to_add:
-            season_data = self.seasons_to_add.pop()
-            # Create a new season object and add it to the database
-            new_seasons.append(NewSeason(season_data, self.league_id).db_item)
-        db.session.add_all(new_seasons)
+            new_season = self.seasons_to_add.pop()
+            new_season.league_id = self.league_id
+            new_season.add()
+            new_season.add_sync()
+            self.unit.touch(new_season.season_id, new_season.weeks_added)
+            self.unit.checkpoint()
 
     def add_league_to_db(self) -> None:
         """
@@ -76,43 +158,18 @@ class LeagueTree:
         # Create a new League object
         league = League(name=self.current_season.get("name"))
         db.session.add(league)
-        # After adding to the database, save the newly generated league_id
+        # Flush to the database to get the newly generated league_id
+        db.session.flush()
         self.league_id = league.id
         current_app.logger.info(
             f"Added league for {self.current_season.get('league_id')} to our database"
         )
 
-    def dfs_for_seasons_to_add(self, season_data: dict) -> None:
-        """
-        Perform a depth-first search through previous seasons to find the league in the database.
-        It grabs the previous season and then checks if it exists in the database. If it doesn't, it adds it to a list of
-        seasons to add the database later and then continues on to the next season. If it does exist, it grabs the
-        league_id and starts to add the new seasons to the database.
-        :param season_data: The league data from the sleeper API
-        :return:
-        """
-        prev_season_id = season_data.get("previous_league_id")
-        # if there is a previous season
-        if prev_season_id:
-            # check if it exists in our database
-            prev_season_in_db = Season.query.filter_by(id=prev_season_id).first()
-            if not prev_season_in_db:
-                # if it doesn't, add it to the list of seasons to add
-                self.seasons_to_add.append(season_data)
-                # and then continue down the graph by calling this function recursively with the previous season
-                self.dfs_for_seasons_to_add(
-                    SleeperAPI.fetch_league_details(prev_season_id)
-                )
-            else:
-                # if it does, we found our league so grab the league_id and start to add the new seasons to the db
-                self.league_id = prev_season_in_db.league
-                self.league_in_db = True
-
 
-# @shared_task(name="check_for_new_leagues")
 def check_for_new_leagues(user_id: int) -> None:
     """
-    Check for new leagues for a user and add them to the database.
+    Check for new leagues for a user and add them to the database, all in the calling process. Registration uses the
+    onboarding tasks instead, this is for scripts and benchmarks.
     :param user_id: The ID of the user to check for new leagues.
     :return: None
     """
@@ -123,5 +180,20 @@ def check_for_new_leagues(user_id: int) -> None:
 
     if leagues_data:  # If the user has leagues
         current_app.logger.info(f"Found {len(leagues_data)} leagues for user {user_id}")
-        for league_data in leagues_data:  # For each league
-            league = LeagueTree(league_data)
+        with UnitOfWork() as unit:
+            # Check every league's current and previous season with one query up front
+            unit.lookups.prefetch(
+                Season,
+                [league_data.get("league_id") for league_data in leagues_data]
+                + [
+                    league_data.get("previous_league_id")
+                    for league_data in leagues_data
+                ],
+            )
+            for league_data in leagues_data:  # For each league
+                league = LeagueTree(league_data, unit=unit)
+        current_app.logger.info(f"Sleeper API latency: {SleeperAPI.latency_stats()}")
+        current_app.logger.info(f"Sleeper API cache: {SleeperAPI.cache_stats()}")
+        current_app.logger.info(
+            f"Sleeper API coalesced requests: {SleeperAPI.coalesced_requests()}"
+        )
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from typing import Any, Hashable, Iterable, Optional, Union
+
+from sqlalchemy import Row, select
+
+from fantasyApp import db
+
+
+def to_key(value: Any) -> Optional[int]:
+    """
+    Convert an ID from the Sleeper API to the integer primary key we store it under.
+    :param value: The ID, Sleeper sends most of them as strings.
+    :return: The ID as an int, or None if it can't be one of our keys (e.g. the "KC" team defense).
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+class LookupCache:
+    """
+    A per-ingestion cache of which rows are already in our database. A whole batch of IDs is resolved with one
+    IN (...) query and the answers are kept for the rest of the run, so checking a season's members costs one round
+    trip instead of one per member, and the next season only asks about IDs it hasn't seen yet. Rows the ingestion
+    queues itself are recorded with add() so later seasons skip them too.
+    :ivar session: The session to query with.
+    :ivar queries: The number of queries made so far.
+    :ivar stats_weeks: The (year, week) of every week of NFL stats queued by this run, or stored for good.
+    """
+
+    # Older SQLite builds allow at most 999 bound parameters per statement
+    CHUNK_SIZE = 500
+
+    def __init__(self, session=None) -> None:
+        self.session = session or db.session
+        self.queries = 0
+        self.stats_weeks = set()
+        self._rows = defaultdict(dict)
+
+    def prefetch(self, model: type, ids: Iterable[Any]) -> None:
+        """
+        Look up every ID we don't have an answer for yet.
+        :param model: The model to look in, it must have a single column primary key.
+        :param ids: The IDs to look up.
+        """
+        known = self._rows[model]
+        keys = {to_key(value) for value in ids}
+        keys.discard(None)
+        missing = list(keys - known.keys())
+        if not missing:
+            return
+        table = model.__table__
+        (primary_key,) = table.primary_key.columns
+        for start in range(0, len(missing), self.CHUNK_SIZE):
+            chunk = missing[start : start + self.CHUNK_SIZE]
+            self.queries += 1
+            for row in self.session.execute(
+                select(table).where(primary_key.in_(chunk))
+            ):
+                known[row._mapping[primary_key.name]] = row
+        for key in missing:
+            known.setdefault(key, None)
+
+    def get(self, model: type, value: Any) -> Union[Row, bool, None]:
+        """
+        Get a row by its ID, looking it up if it hasn't been prefetched.
+        :param model: The model to look in.
+        :param value: The ID.
+        :return: The row, True if this ingestion added it, or None if it isn't in our database.
+        """
+        key = to_key(value)
+        if key is None:
+            return None
+        self.prefetch(model, [key])
+        return self._rows[model][key]
+
+    def exists(self, model: type, value: Any) -> bool:
+        """
+        Check if a row is in our database (or has been queued by this ingestion).
+        :param model: The model to look in.
+        :param value: The ID.
+        :return: True if it is there.
+        """
+        return self.get(model, value) is not None
+
+    def missing(self, model: type, ids: Iterable[Any]) -> set[Hashable]:
+        """
+        Find which of a batch of IDs aren't in our database, in one query for any we haven't seen.
+        :param model: The model to look in.
+        :param ids: The IDs to check.
+        :return: The IDs that aren't there, as they were given.
+        """
+        ids = set(ids)
+        self.prefetch(model, ids)
+        known = self._rows[model]
+        return {value for value in ids if known.get(to_key(value)) is None}
+
+    def clear(self) -> None:
+        """
+        Forget every answer, the next lookups query the database again.
+        """
+        self._rows.clear()
+        self.stats_weeks.clear()
+
+    def add(self, model: type, value: Any) -> None:
+        """
+        Record that a row is now in our database, or will be once the writer is flushed.
+        :param model: The model it was added to.
+        :param value: Its ID.
+        """
+        key = to_key(value)
+        if key is not None and self._rows[model].get(key) is None:
+            self._rows[model][key] = True
@@ -1,61 +1,81 @@
-from fantasyApp import db
-from fantasyApp.models import Matchup, MatchupPlayer, MatchupTeam, Team
-from fantasyApp.sleeper_data.utils import SleeperAPI, preprocess_bracket_data
-from collections import defaultdict
-
-from flask import current_app
+from fantasyApp.models import Matchup, MatchupPlayer, MatchupTeam
+from fantasyApp.sleeper_data.instrumentation import traced
+from fantasyApp.sleeper_data.teams import team_ref
+from fantasyApp.sleeper_data.writers import BulkWriter, Ref
 
 
 class NewMatchup:
-    def __init__(self, matchup, season_id, week):
+    """
+    A class to represent one team's side of a matchup. The team and each of its rostered players are queued on a
+    BulkWriter as plain rows rather than ORM objects.
+    :ivar matchup: The matchup data for this team from the Sleeper API.
+    :ivar season: The ID of the season.
+    :ivar week: The week of the matchup.
+    :ivar number: Sleeper's matchup_id, shared by both teams.
+    :ivar matchup_id: A Ref to the matchup, its ID is assigned by the database.
+    :ivar team: A Ref to the team.
+    :ivar writer: The BulkWriter the rows are queued on.
+    """
+
+    @traced("matchup")
+    def __init__(self, matchup: dict, season_id: int, week: int, writer: BulkWriter):
         self.matchup = matchup
         self.season = season_id
         self.week = week
-        self.matchup_id = int(
-            str(self.season) + str(self.week) + str(self.matchup.get("matchup_id"))
-        )
-        self.team = int(str(self.season) + str(self.matchup.get("roster_id")))
-        self.players = self.matchup.get("players")
-        self.starters = self.matchup.get("starters")
-        self.points = self.matchup.get("players_points")
+        self.writer = writer
+        self.number = int(self.matchup.get("matchup_id"))
+        self.matchup_id = Ref(Matchup, (int(self.season), self.week, self.number))
+        self.team = team_ref(self.season, self.matchup.get("roster_id"))
+        self.players = self.matchup.get("players") or []
+        self.starters = self.matchup.get("starters") or []
+        self.points = self.matchup.get("players_points") or {}
 
         self.add_players()
         self.add_team()
 
-        db.session.add_all(self.players_to_add)
-
-    players_to_add = []
-
-    def create_matchup_db_item(self, matchup_type="Regular", place=None):
-        matchup = Matchup(
-            id=self.matchup_id,
-            week=self.week,
-            matchup_type=matchup_type,
-            place=place,
-        )
-        return matchup
-
-    def add_player(self, player, starter, points):
-        players = MatchupPlayer(
-            matchup=self.matchup_id,
-            player=player,
-            starter=starter,
-            points=points,
-            team=self.team,
+    def add_matchup(self, matchup_type: str = "regular", place: int = None) -> None:
+        """
+        Queue the matchup itself. Only call this for one of the two teams in a matchup.
+        :param matchup_type: One of "regular", "playoff" or "consolation".
+        :param place: The place this postseason matchup decides, if any.
+        """
+        self.writer.add(
+            Matchup,
+            {
+                "week": self.week,
+                "number": self.number,
+                "matchup_type": matchup_type,
+                "place": place,
+                "season": self.season,
+            },
         )
-        return players
 
-    def add_players(self):
+    def add_players(self) -> None:
+        """
+        Queue a MatchupPlayer row for every player on the roster this week.
+        """
+        starters = set(self.starters)
         for player in self.players:
-            starter = player in self.starters
-            points = self.points.get(player)
-
-            self.players_to_add.append(self.add_player(player, starter, points))
+            self.writer.add(
+                MatchupPlayer,
+                {
+                    "matchup": self.matchup_id,
+                    "player": player,
+                    "starter": player in starters,
+                    "points": self.points.get(player),
+                    "team": self.team,
+                },
+            )
 
-    def add_team(self):
-        team = MatchupTeam(
-            Matchup=self.matchup_id,
-            team=self.team,
-            total_points=self.matchup.get("points"),
+    def add_team(self) -> None:
+        """
+        Queue the MatchupTeam row with the team's total points.
+        """
+        self.writer.add(
+            MatchupTeam,
+            {
+                "matchup": self.matchup_id,
+                "team": self.team,
+                "total_points": self.matchup.get("points"),
+            },
         )
-        db.session.add(team)
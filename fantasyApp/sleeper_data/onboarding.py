@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Optional
+
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from fantasyApp import db
+from fantasyApp.models import NflState, OnboardingJob, Season, SeasonSync
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.concurrency import fan_out
+from fantasyApp.sleeper_data.instrumentation import trace
+from fantasyApp.sleeper_data.leagues import LeagueTree
+from fantasyApp.sleeper_data.seasons import NewSeason
+from fantasyApp.sleeper_data.sync import last_completed_week
+from fantasyApp.sleeper_data.utils import SleeperAPI
+from fantasyApp.sleeper_data.unit_of_work import UnitOfWork
+
+
+def update_progress(job_id: int, **increments: int) -> None:
+    """
+    Add to an onboarding job's counters and commit. The counters are incremented in the database rather than in
+    Python, so season tasks finishing at the same time don't overwrite each other. Once every league and season is
+    done the job is marked complete.
+    :param job_id: The ID of the onboarding job.
+    :param increments: How much to add to each counter, e.g. seasons_done=1.
+    """
+    values = {
+        getattr(OnboardingJob, name): getattr(OnboardingJob, name) + amount
+        for name, amount in increments.items()
+    }
+    if values:
+        db.session.execute(
+            update(OnboardingJob).where(OnboardingJob.id == job_id).values(values)
+        )
+    db.session.execute(
+        update(OnboardingJob)
+        .where(
+            OnboardingJob.id == job_id,
+            OnboardingJob.status == "running",
+            OnboardingJob.leagues_done == OnboardingJob.leagues_total,
+            OnboardingJob.seasons_done == OnboardingJob.seasons_total,
+        )
+        .values(status="complete")
+    )
+    db.session.commit()
+
+
+def fail_job(job_id: int, error: Exception) -> None:
+    """
+    Mark an onboarding job as failed.
+    :param job_id: The ID of the onboarding job.
+    :param error: The exception that stopped it.
+    """
+    db.session.rollback()
+    current_app.logger.error(f"Onboarding job {job_id} failed: {error!r}")
+    db.session.execute(
+        update(OnboardingJob)
+        .where(OnboardingJob.id == job_id)
+        .values(status="failed", error=str(error))
+    )
+    db.session.commit()
+
+
+@shared_task(name="onboard_user")
+def onboard_user(job_id: int, user_id: int) -> None:
+    """
+    Start building a newly registered user's profile. Each of their leagues is handed to its own onboard_league task.
+    :param job_id: The ID of the user's onboarding job.
+    :param user_id: The ID of the user.
+    """
+    leagues_data = SleeperAPI.fetch_user_leagues(user_id, datetime.now().year)
+    if leagues_data is None:
+        fail_job(job_id, RuntimeError("Could not fetch the user's leagues"))
+        return
+    current_app.logger.info(f"Found {len(leagues_data)} leagues for user {user_id}")
+    job = db.session.get(OnboardingJob, job_id)
+    job.status = "running"
+    job.leagues_total = len(leagues_data)
+    db.session.commit()
+    for league_data in leagues_data:
+        onboard_league.delay(job_id, league_data)
+    # A user without any leagues is already done
+    update_progress(job_id)
+
+
+@shared_task(name="onboard_league")
+def onboard_league(job_id: int, league_data: dict) -> None:
+    """
+    Find a league's new seasons and add the league and the seasons themselves, then hand each season that hasn't
+    been filled in yet to its own onboard_season task. The season rows are committed first so the seasons can be
+    filled in in parallel. A season only gets its sync watermark once it is filled in, so running this again after
+    a failure picks up the seasons that didn't finish.
+    :param job_id: The ID of the onboarding job.
+    :param league_data: The league's current season data from the Sleeper API.
+    """
+    try:
+        tree = LeagueTree(league_data, build=False)
+        seasons_data = {}
+        if not tree.league_in_db:
+            with trace("onboard_league", league_data.get("league_id")):
+                with staging.capture(tree.writer) as store:
+                    # The current season came from the user's leagues, before the capture started
+                    staging.stage(f"league/{league_data.get('league_id')}", league_data)
+                    seasons_data = {
+                        int(season_data.get("league_id")): season_data
+                        for season_data in tree.walk_seasons()
+                    }
+                    if not tree.league_in_db:
+                        tree.add_league_to_db()
+                    if store:
+                        store.league = tree.league_id
+                    # Oldest first, so each season's previous_season is already there
+                    for season_data in reversed(list(seasons_data.values())):
+                        NewSeason(season_data, tree.league_id, tree.writer).add_season()
+                tree.unit.commit()
+        unfinished = unfinished_seasons(tree.league_id)
+        missing = [
+            season_id for season_id in unfinished if season_id not in seasons_data
+        ]
+        for season_id, season_data in zip(
+            missing, fan_out(SleeperAPI.fetch_league_details, [(i,) for i in missing])
+        ):
+            seasons_data[season_id] = season_data
+    except Exception as error:
+        fail_job(job_id, error)
+        raise
+    unfinished = [seasons_data[i] for i in unfinished if seasons_data.get(i)]
+    update_progress(job_id, leagues_done=1, seasons_total=len(unfinished))
+
+    state = NflState.query.first()
+    for season_data in unfinished:
+        last_week = last_completed_week(int(season_data.get("season")), state)
+        onboard_season.delay(job_id, season_data, last_week)
+
+
+def unfinished_seasons(league_id: int) -> list[int]:
+    """
+    Find the seasons of a league that were added but never filled in.
+    :param league_id: The ID of the league.
+    :return: The IDs of the seasons without a sync watermark.
+    """
+    synced = select(SeasonSync.season)
+    return list(
+        db.session.scalars(
+            select(Season.id).where(
+                Season.league == league_id, Season.id.not_in(synced)
+            )
+        )
+    )
+
+
+@shared_task(bind=True, name="onboard_season", max_retries=5)
+def onboard_season(
+    self, job_id: int, season_data: dict, last_week: Optional[int] = None
+) -> None:
+    """
+    Fill in one season: its users, teams, matchups and drafts, all in one transaction, and then its sync watermark.
+    :param job_id: The ID of the onboarding job.
+    :param season_data: The season's data from the Sleeper API.
+    :param last_week: The last week of matchups to add, defaults to the end of the postseason.
+    """
+    unit = UnitOfWork()
+    try:
+        league_id = unit.lookups.get(Season, season_data.get("league_id")).league
+        new_season = NewSeason(season_data, league_id, unit.writer, unit.lookups)
+        with trace("onboard_season", new_season.season_id):
+            with staging.capture(unit.writer, league_id):
+                new_season.fetch(last_week)
+                new_season.add()
+                new_season.add_sync()
+            unit.touch(new_season.season_id, new_season.weeks_added)
+            unit.commit()
+    except IntegrityError as error:
+        unit.rollback()
+        # The same users show up in every season, so on a database without ON CONFLICT another season's task can add
+        # one of them between our check and our insert. Once it has committed we'll skip them, so just try again.
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=error, countdown=2**self.request.retries)
+        fail_job(job_id, error)
+        raise
+    except Exception as error:
+        fail_job(job_id, error)
+        raise
+    update_progress(job_id, seasons_done=1)
@@ -1,28 +1,126 @@
+import hashlib
+import json
+from collections import Counter
+from typing import Optional
+
+from celery import shared_task
+from sqlalchemy import insert, select, update
+
+from fantasyApp.sleeper_data.ratelimit import request_priority, PRIORITY_BACKGROUND
 from fantasyApp.sleeper_data.utils import SleeperAPI
 from fantasyApp.models import Player
 from fantasyApp import db
 from flask import current_app
 
+# The columns whose changes the daily refresh reports on
+STATUS_COLUMNS = (Player.status, Player.injury_status, Player.nfl_team)
+
+
+def to_int(value) -> Optional[int]:
+    """
+    Convert a numeric value from the Sleeper API to an int. Sleeper sends numbers like height and weight as strings.
+    :param value: The value from the API.
+    :return: The value as an int, or None if it isn't a whole number.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def player_row(player_id: str, player: dict) -> Optional[dict]:
+    """
+    Map a player from the players/nfl catalog to the columns of the Player table.
+    :param player_id: The sleeper ID of the player.
+    :param player: The player's data from the Sleeper API.
+    :return: A dictionary of Player column values, or None for team defenses whose IDs (e.g. "KC") aren't numeric.
+    """
+    if not player_id.isdigit():
+        return None
+    positions = player.get("fantasy_positions") or [player.get("position")]
+    return {
+        "id": int(player_id),
+        "first_name": player.get("first_name"),
+        "last_name": player.get("last_name"),
+        "number": to_int(player.get("number")),
+        "position": positions[0],
+        "nfl_team": player.get("team"),
+        "age": to_int(player.get("age")),
+        "status": player.get("status"),
+        "years_exp": to_int(player.get("years_exp")),
+        "height": to_int(player.get("height")),
+        "weight": to_int(player.get("weight")),
+        "injury_status": player.get("injury_status"),
+    }
 
-def add_players():
-    players = SleeperAPI.fetch_all_players()
-    players_to_add = []
-    for player_id, player in players.items():
-        players_to_add.append(
-            Player(
-                id=player_id,
-                first_name=player.get("first_name"),
-                last_name=player.get("last_name"),
-                number=player.get("number"),
-                position=player.get("fantasy_positions")[0],
-                nfl_team=player.get("team"),
-                age=player.get("age"),
-                status=player.get("status"),
-                years_exp=player.get("years_exp"),
-                height=player.get("height"),
-                weight=player.get("weight"),
-                injury_status=player.get("injury_status"),
-            )
+
+def content_hash(row: dict) -> str:
+    """
+    Hash a player's column values, so a changed player can be spotted without comparing every column.
+    :param row: A dictionary of Player column values, as made by player_row.
+    :return: The hex digest of the row.
+    """
+    return hashlib.md5(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@shared_task(name="refresh_players")
+def refresh_players(chunk_size: int = None) -> dict:
+    """
+    Bring the Player table in line with the players/nfl catalog. Every player's content hash is compared against the
+    one we stored last time, and only new and changed players are written, with bulk inserts and bulk updates in
+    fixed size chunks that are committed as they go. The catalog is streamed so memory stays flat, and the request
+    runs at background priority so it never holds up someone waiting on a page.
+    :param chunk_size: The number of players to write at a time. Defaults to PLAYER_CHUNK_SIZE from the config.
+    :return: Counts of the players inserted, updated and unchanged, and of the updates that changed each status
+    column.
+    """
+    chunk_size = chunk_size or current_app.config.get("PLAYER_CHUNK_SIZE", 1000)
+    # One query for everything we need to compare against
+    existing = {
+        row.id: row
+        for row in db.session.execute(
+            select(Player.id, Player.content_hash, *STATUS_COLUMNS)
         )
-    db.session.add_all(players_to_add)
+    }
+    counts = Counter(inserted=0, updated=0, unchanged=0)
+    inserts, updates = [], []
+    with request_priority(PRIORITY_BACKGROUND):
+        for player_id, player in SleeperAPI.stream_players():
+            row = player_row(player_id, player)
+            if not row:
+                continue
+            row["content_hash"] = content_hash(row)
+            old = existing.get(row["id"])
+            if old is None:
+                inserts.append(row)
+            elif old.content_hash != row["content_hash"]:
+                updates.append(row)
+                for column in STATUS_COLUMNS:
+                    if getattr(old, column.key) != row[column.key]:
+                        counts[column.key] += 1
+            else:
+                counts["unchanged"] += 1
+            if len(inserts) + len(updates) >= chunk_size:
+                write_players(inserts, updates, counts)
+                inserts, updates = [], []
+    write_players(inserts, updates, counts)
+    current_app.logger.info(f"Refreshed the Player table: {dict(counts)}")
+    return dict(counts)
+
+
+def write_players(inserts: list[dict], updates: list[dict], counts: Counter) -> None:
+    """
+    Bulk insert the new players and bulk update the changed ones, then commit.
+    :param inserts: Player column dictionaries for players we don't have yet.
+    :param updates: Player column dictionaries for players whose data changed.
+    :param counts: The running counts, updated with what was written.
+    """
+    if inserts:
+        db.session.execute(insert(Player), inserts)
+    if updates:
+        # An ORM bulk update, matched on each row's primary key
+        db.session.execute(update(Player), updates)
     db.session.commit()
+    counts["inserted"] += len(inserts)
+    counts["updated"] += len(updates)
@@ -0,0 +1,164 @@
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, fall back to a limiter that is only shared within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers go first when several callers are waiting for the same token
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+_priority = contextvars.ContextVar("sleeper_request_priority", default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """
+    Run every Sleeper request made inside the block at the given priority. Requests fanned out to worker threads with
+    fan_out keep the priority of the caller.
+    :param priority: One of the PRIORITY_* constants, lower goes first.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LocalTokenBucket:
+    """
+    A token bucket shared by the threads of a single process.
+    :ivar rate: The number of tokens added per second.
+    :ivar capacity: The most tokens the bucket can hold, i.e. the largest burst allowed.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Try to take a token from the bucket.
+        :return: 0 if a token was taken, otherwise how many seconds until one will be available.
+        """
+        with self._lock:
+            self._tokens, self._updated, wait = _take(
+                self._tokens, self._updated, self.rate, self.capacity
+            )
+        return wait
+
+
+class FileTokenBucket:
+    """
+    A token bucket whose state lives in a small file guarded by an exclusive lock, so every worker process on the node
+    draws from the same bucket.
+    :ivar path: The path to the state file.
+    :ivar rate: The number of tokens added per second.
+    :ivar capacity: The most tokens the bucket can hold, i.e. the largest burst allowed.
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float) -> None:
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def try_acquire(self) -> float:
+        """
+        Try to take a token from the bucket.
+        :return: 0 if a token was taken, otherwise how many seconds until one will be available.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, 64, 0)
+            try:
+                tokens, updated = json.loads(raw)
+            except ValueError:
+                tokens, updated = self.capacity, time.time()
+            tokens, updated, wait = _take(tokens, updated, self.rate, self.capacity)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, json.dumps([tokens, updated]).encode("utf-8"), 0)
+        finally:
+            os.close(fd)  # Closing the file releases the lock
+        return wait
+
+
+def _take(tokens: float, updated: float, rate: float, capacity: float) -> tuple:
+    now = time.time()
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, now, 0.0
+    return tokens, now, (1 - tokens) / rate
+
+
+class RateLimiter:
+    """
+    Hands out permission to call the Sleeper API at a steady rate. Callers queue in priority order (then first come,
+    first served) instead of bursting and getting throttled, and only the caller at the front of the queue draws from
+    the bucket.
+    :ivar bucket: The token bucket shared with the other workers.
+    """
+
+    def __init__(self, bucket: Any) -> None:
+        self.bucket = bucket
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RateLimiter":
+        """
+        Build a rate limiter from the app config. The bucket is shared across processes through
+        SLEEPER_RATE_LIMIT_PATH when the platform supports file locks, otherwise it is local to this process.
+        :param config: The Flask app config (or any mapping with the SLEEPER_RATE_LIMIT_* keys).
+        :return: A new RateLimiter.
+        """
+        rate = config.get("SLEEPER_RATE_LIMIT_PER_MINUTE", 900) / 60
+        capacity = config.get("SLEEPER_RATE_LIMIT_BURST", 20)
+        path = config.get("SLEEPER_RATE_LIMIT_PATH")
+        if path and fcntl is not None:
+            return cls(FileTokenBucket(path, rate, capacity))
+        if path:
+            logger.warning(
+                "File locks are not available, Sleeper rate limiting is per process"
+            )
+        return cls(LocalTokenBucket(rate, capacity))
+
+    def acquire(self) -> None:
+        """
+        Block until this caller may make a request, using the priority set with request_priority.
+        """
+        entry = (_priority.get(), next(self._counter))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if self._waiting[0] == entry:
+                        wait = self.bucket.try_acquire()
+                        if not wait:
+                            return
+                    else:
+                        wait = None  # Sleep until the queue moves
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
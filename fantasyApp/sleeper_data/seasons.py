@@ -1,24 +1,32 @@
 from datetime import datetime
+from typing import Union
 
 from fantasyApp.sleeper_data.teams import NewTeam
 from fantasyApp.sleeper_data.drafts import NewDraft
 from fantasyApp.sleeper_data.users import NewUser
 from fantasyApp.sleeper_data.matchups import NewMatchup
+from fantasyApp.sleeper_data.transactions import NewTransaction
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.cache import stats_are_final
+from fantasyApp.sleeper_data.concurrency import fan_out
+from fantasyApp.sleeper_data.instrumentation import span, traced
+from fantasyApp.sleeper_data.lookups import LookupCache, to_key
+from fantasyApp.sleeper_data.stats import SCORING, add_stats, stored_weeks
 from fantasyApp.sleeper_data.utils import SleeperAPI, preprocess_bracket_data
-from fantasyApp.models import Season, User, Division
-from fantasyApp import db
+from fantasyApp.sleeper_data.writers import BulkWriter, Ref, RowBuffer
+from fantasyApp.models import Season, SeasonSync, User, Division, Player, Transaction
 from flask import current_app
 
 
 class NewSeason:
     """
     A class to represent a new season. It will ensure that all data related to the season is added to the database.
+    Building a season is split in two so seasons can be pipelined: fetch() only talks to the Sleeper API and can run
+    on a worker thread, while add() queues everything on the writer and must run on the thread that owns the session.
+    Every row is keyed on an ID built from Sleeper's IDs, so adding a season again updates it instead of failing.
     :ivar season: The season data from the Sleeper API.
     :ivar season_id: The ID of the season.
-    :ivar league_id: The ID of the league.
-    :ivar users: A list of users in the season.
-    :ivar teams: A list of teams in the season.
-    :ivar matchups: A list of matchups in the season.
+    :ivar league_id: The ID of the league, it can be set after fetching once the league is known.
     :ivar year: The year of the season.
     :ivar total_teams: The total number of teams in the season.
     :ivar settings: The settings of the season.
@@ -26,211 +34,471 @@ class NewSeason:
     :ivar playoff_start: The starting week of the playoffs.
     :ivar scoring: The scoring settings of the season.
     :ivar positions: The roster positions of the season.
-    :ivar db_item: The database item created for the season.
-    :ivar new_users: A list of new users to add to the database.
-    :ivar new_teams: A list of new teams to add to the database.
-    :ivar new_matchups: A list of new matchups to add to the database.
-    :ivar new_drafts: A list of new drafts to add to the database.
-    :ivar new_transactions: A list of new transactions to add to the database.
+    :ivar writer: The BulkWriter that the season's rows are queued on.
+    :ivar lookups: The LookupCache used to check which users and players are already in our database.
+    :ivar buffer: The RowBuffer that fetch() queues matchup rows on until add() hands them to the writer.
+    :ivar users_data: The season's users from the Sleeper API, once fetched.
+    :ivar rosters_data: The season's rosters from the Sleeper API, once fetched.
+    :ivar drafts_data: The season's drafts from the Sleeper API with their full data and picks, once fetched.
+    :ivar bracket: The processed playoff and consolation brackets, once fetched.
+    :ivar weeks_added: The weeks whose matchups have been queued.
+    :ivar transactions_data: The transactions from the Sleeper API for each week added, once fetched.
+    :ivar stats_data: The NFL stats from the Sleeper API for each week added, once fetched.
     :ivar team_name_map: A map of user IDs to team names.
-    :ivar division_map: A map of division numbers to division IDs.
+    :ivar division_map: A map of division numbers to Refs to the season's divisions.
     """
-    new_users = []
-    new_teams = []
-    new_matchups = []
-    new_drafts = []
-    new_transactions = []
 
-    team_name_map = {}
-    division_map = {}
-
-    def __init__(self, season: dict, league_id: int) -> None:
+    def __init__(
+        self,
+        season: dict,
+        league_id: int = None,
+        writer: BulkWriter = None,
+        lookups: LookupCache = None,
+    ) -> None:
         """
-        Initialize the NewSeason object with the season data. This will grab all the necessary data from the season
-        dictionary and then create a new database object that can be added to the database
+        Initialize the NewSeason object with the season data. This only reads the season dictionary, nothing is
+        fetched or added to the database until fetch() and add() are called.
         :param season: A dictionary containing the season data from the Sleeper API
-        :param league_id: The ID of the league
+        :param league_id: The ID of the league, if it is known yet
+        :param writer: The BulkWriter to queue the season's rows on, a new one is created if not given
+        :param lookups: The LookupCache shared by the ingestion, a new one is created if not given
         """
         self.season = season
         self.season_id = season.get("league_id")
         self.league_id = league_id
-        self.users = []
-        self.teams = []
-        self.matchups = []
+        self.writer = writer or BulkWriter()
+        self.lookups = lookups or LookupCache()
+        self.buffer = RowBuffer()
 
         self.year = season.get("season")
         self.total_teams = season.get("total_rosters")
 
-        self.settings = season.get("settings")
-        self.start_week = self.settings.get("start_week")
+        self.settings = season.get("settings") or {}
+        self.start_week = self.settings.get("start_week") or 1
         self.playoff_start = self.settings.get("playoff_week_start")
-        self.scoring = self.settings.get("scoring_settings")
-        self.positions = self.settings.get("roster_positions")
+        # Sleeper keeps these next to the settings, not inside them
+        self.scoring = season.get("scoring_settings") or {}
+        self.positions = season.get("roster_positions") or []
+
+        self.users_data = None
+        self.rosters_data = None
+        self.drafts_data = None
+        self.bracket = None
+        self.weeks_added = []
+        self.transactions_data = None
+        self.stats_data = None
+
+        self.team_name_map = {}
+        self.division_map = {}
+
+    @traced("season.fetch")
+    def fetch(self, last_week: int = None) -> None:
+        """
+        Fetch everything the season needs from the Sleeper API and build its matchup rows. The users, rosters, drafts
+        and brackets are fetched together, then the matchups and each draft's picks, then the transactions and NFL
+        stats for every week added. Nothing here touches the database, the matchup rows wait in the buffer, so it is
+        safe to run on a worker thread.
+        :param last_week: The last week of matchups to fetch, defaults to the end of the postseason
+        """
+        # Tag the payloads that don't say which season they're for, e.g. the drafts
+        with staging.tag(season=self.season_id, league=self.league_id):
+            self.users_data, self.rosters_data, drafts, self.bracket = fan_out(
+                lambda fetch: fetch(self.season_id),
+                [
+                    (SleeperAPI.fetch_league_users,),
+                    (SleeperAPI.fetch_league_rosters,),
+                    (SleeperAPI.fetch_league_drafts,),
+                    (preprocess_bracket_data,),
+                ],
+            )
+            drafts = drafts or []
+            draft_details = fan_out(
+                lambda draft_id: (
+                    SleeperAPI.fetch_draft_data(draft_id),
+                    SleeperAPI.fetch_draft_picks(draft_id),
+                ),
+                [(draft.get("draft_id"),) for draft in drafts],
+            )
+            self.drafts_data = [
+                (draft, draft_data or {}, picks or [])
+                for draft, (draft_data, picks) in zip(drafts, draft_details)
+            ]
+            self.weeks_added = self.get_new_matchups(
+                last_week=last_week, writer=self.buffer
+            )
+            self.transactions_data = self.fetch_transactions(self.weeks_added)
+            self.stats_data = self.fetch_stats(self.weeks_added)
 
-        self.db_item = self.create_db_item()
+    @traced("season.add")
+    def add(self) -> None:
+        """
+        Queue the season and everything fetched for it on the writer: its divisions, new users, teams, drafts,
+        matchups and transactions, and the NFL stats of the weeks added unless they are already stored for good.
+        Nothing is flushed or committed here.
+        """
+        if self.users_data is None:
+            self.fetch()
+        self.add_season()
         self.get_new_divisions()
         self.get_new_users()
+        self.get_new_teams()
+        self.get_new_drafts()
+        self.writer.extend(self.buffer)
+        self.get_new_transactions()
+        self.get_new_stats()
 
-    def create_db_item(self) -> Season:
-        """
-        Create a new Season database object from the season data.
-        :return: A new Season database object
-        """
-        season = Season(
-            id=self.season_id,
-            name=self.season.get("name"),
-            year=self.year,
-            num_teams=self.total_teams,
-            status=self.season.get("status"),
-            season_type=self.season.get("season_type"),
-            pts_rush_yds=self.scoring.get("rush_yd"),
-            pts_rush_td=self.scoring.get("rush_td"),
-            pts_rec_yds=self.scoring.get("rec_yd"),
-            pts_rec_td=self.scoring.get("rec_td"),
-            pts_pass_yds=self.scoring.get("pass_yd"),
-            pts_pass_td=self.scoring.get("pass_td"),
-            pts_bonus_rec_te=self.scoring.get("bonus_rec_te"),
-            qb=self.positions.count("QB"),
-            rb=self.positions.count("RB"),
-            wr=self.positions.count("WR"),
-            te=self.positions.count("TE"),
-            w_r_t=self.positions.count("FLEX"),
-            w_r=self.positions.count("WRRB_FLEX"),
-            w_t=self.positions.count("REC_FLEX"),
-            q_w_r_t=self.positions.count("SUPER_FLEX"),
-            k=self.positions.count("K"),
-            dst=self.positions.count("DST"),
-            bn=self.positions.count("BN"),
-            ir=self.settings.get("reserve_slots"),
-            taxi=self.settings.get("taxi_slots"),
-            dl=self.positions.count("DL"),
-            lb=self.positions.count("LB"),
-            db=self.positions.count("DB"),
-            idp_flex=self.positions.count("IDP_FLEX"),
-            pick_trading=bool(self.settings.get("pick_trading")),
-            playoffs_start_wk=self.playoff_start,
-            num_poff_teams=self.settings.get("playoff_teams"),
-            last_league_champ=self.season.get("metadata").get(
-                "latest_league_winner_roster_id", None
+    def add_season(self) -> None:
+        """
+        Queue the Season row.
+        """
+        metadata = self.season.get("metadata") or {}
+        champ = metadata.get("latest_league_winner_roster_id")
+        previous_season = self.season.get("previous_league_id")
+        self.writer.add(
+            Season,
+            dict(
+                id=self.season_id,
+                name=self.season.get("name"),
+                year=self.year,
+                num_teams=self.total_teams,
+                status=self.season.get("status"),
+                season_type=self.season.get("season_type"),
+                **{
+                    column: self.scoring.get(stat, 0)
+                    for column, stat in SCORING.items()
+                },
+                qb=self.positions.count("QB"),
+                rb=self.positions.count("RB"),
+                wr=self.positions.count("WR"),
+                te=self.positions.count("TE"),
+                w_r_t=self.positions.count("FLEX"),
+                w_r=self.positions.count("WRRB_FLEX"),
+                w_t=self.positions.count("REC_FLEX"),
+                q_w_r_t=self.positions.count("SUPER_FLEX"),
+                k=self.positions.count("K"),
+                dst=self.positions.count("DEF"),
+                bn=self.positions.count("BN"),
+                ir=self.settings.get("reserve_slots") or 0,
+                taxi=self.settings.get("taxi_slots") or 0,
+                dl=self.positions.count("DL"),
+                lb=self.positions.count("LB"),
+                db=self.positions.count("DB"),
+                idp_flex=self.positions.count("IDP_FLEX"),
+                pick_trading=bool(self.settings.get("pick_trading")),
+                playoffs_start_wk=self.playoff_start,
+                num_poff_teams=self.settings.get("playoff_teams"),
+                last_league_champ=int(champ) if champ else None,
+                league=self.league_id,
+                # Sleeper uses "0" as well as null when there is no previous season
+                previous_season=None if previous_season == "0" else previous_season,
             ),
-            league=self.league_id,
-            previous_season=self.season.get("previous_league_id"),
         )
-        return season
 
+    def add_sync(self) -> None:
+        """
+        Queue the season's sync watermark, so the weekly sync carries on from the last week we added.
+        """
+        self.writer.add(
+            SeasonSync,
+            {
+                "season": self.season_id,
+                "last_week": self.weeks_added[-1] if self.weeks_added else 0,
+                "synced_at": datetime.utcnow(),
+            },
+        )
+
+    @traced("season.users")
     def get_new_users(self) -> None:
         """
-        Get the new users for the season and add them to the database if they aren't already in it. Also map the
-        user's team name to their user ID.
+        Queue the season's users that aren't in our database yet. Also map the user's team name to their user ID.
         """
-        users_data = SleeperAPI.fetch_league_users(self.season_id)
-        if users_data:
-            for user_data in users_data:
-                user_id = user_data.get("user_id")
-                self.team_name_map[user_id] = {
-                    "team_name": user_data.get("metadata").get("team_name"),
-                    "commish": user_data.get("is_owner"),
-                }
+        users_data = self.users_data or []
+        # One query for every member we haven't seen yet this ingestion
+        self.lookups.prefetch(
+            User, (user_data.get("user_id") for user_data in users_data)
+        )
+        for user_data in users_data:
+            user_id = user_data.get("user_id")
+            self.team_name_map[user_id] = {
+                "team_name": (user_data.get("metadata") or {}).get("team_name")
+                or user_data.get("display_name"),
+                "commish": user_data.get("is_owner"),
+            }
 
-                in_db = User.query.filter_by(id=user_id).first()
-                if not in_db:
-                    self.new_users.append(
-                        NewUser(user_data).create_unregistered_db_item()
-                    )
+            if not self.lookups.exists(User, user_id):
+                # Someone may register in the meantime, so never overwrite an existing user
+                self.writer.add(User, NewUser.create_unregistered_row(user_data), False)
+                self.lookups.add(User, user_id)
 
     def get_new_divisions(self) -> None:
         """
-        Get the new divisions for the season and add them to the database. Also map the season's division number to
-        our database's division id.
+        Queue the season's divisions. Also map the season's division number to a Ref to the division, its ID is
+        assigned by the database.
         """
-        metadata = self.season.get("metadata")
+        metadata = self.season.get("metadata") or {}
         for key, value in metadata.items():
             if key.startswith("division_") and not key.endswith("_avatar"):
-                division_number = key.split("_")[1]
-                division_name = value
-                # Create the division object
-                division = Division(
-                    name=division_name,
-                    number=division_number,
-                    season=self.season_id,
+                division_number = int(key.split("_")[1])
+                self.writer.add(
+                    Division,
+                    {
+                        "name": value,
+                        "number": division_number,
+                        "season": self.season_id,
+                    },
+                )
+                self.division_map[division_number] = Ref(
+                    Division, (int(self.season_id), division_number)
                 )
-                # Add the division to the session and flush to get the id
-                db.session.add(division)
-                db.session.flush() # sends to the database to get the id but doesn't commit
-
-                # map our database's division id we just created to the season's division number
-                self.division_map[division_number] = division.id
 
+    @traced("season.teams")
     def get_new_teams(self) -> None:
         """
-        Get the new teams for the season, create a new Team object and add it to a list of teams to add to the database later
+        Queue the season's teams and their rosters.
+        """
+        # Team defenses (e.g. "KC") are never in the Player table, so only check real players
+        rostered = {
+            player
+            for team_data in self.rosters_data or []
+            for player in team_data.get("players") or []
+            if to_key(player) is not None
+        }
+        unknown = self.lookups.missing(Player, rostered)
+        if unknown:
+            current_app.logger.warning(
+                f"{len(unknown)} rostered players in season {self.season_id} aren't in the Player table"
+            )
+        for team_data in self.rosters_data or []:
+            division = self.division_map.get(
+                (team_data.get("settings") or {}).get("division")
+            )
+            NewTeam(
+                team_data,
+                self.season_id,
+                self.league_id,
+                self.team_name_map.get(team_data.get("owner_id"), {}),
+                self.year,
+                division,
+                self.writer,
+            )
+
+    @traced("season.drafts")
+    def get_new_drafts(self) -> None:
+        """
+        Queue each of the season's drafts with its positions and picks.
+        """
+        for draft, draft_data, picks in self.drafts_data or []:
+            NewDraft(draft, draft_data, picks, self.writer)
+
+    @traced("season.matchups")
+    def get_new_matchups(
+        self,
+        first_week: int = None,
+        last_week: int = None,
+        writer: Union[BulkWriter, RowBuffer] = None,
+    ) -> list[int]:
+        """
+        Get the matchups for every week of the season, or just the weeks between first_week and last_week. The
+        bracket tells us how many postseason rounds there are, so every regular season and postseason week is fetched
+        in one concurrent batch and then handed to NewMatchup in week order.
+        :param first_week: The first week to add, defaults to the start of the season
+        :param last_week: The last week to add, defaults to the end of the postseason
+        :param writer: Where to queue the matchup rows, defaults to the season's writer
+        :return: The weeks that were added, in order
         """
-        teams_data = SleeperAPI.fetch_league_rosters(self.season_id)
-        if teams_data:
-            for team_data in teams_data:
-                division = self.division_map.get(
-                    team_data.get("settings").get("division")
+        first_week = first_week or self.start_week
+        # The brackets are only needed once the range reaches the postseason
+        bracket = self.bracket or {}
+        if self.bracket is None and (
+            last_week is None or last_week >= self.playoff_start
+        ):
+            bracket = self.bracket = preprocess_bracket_data(self.season_id)
+        end = self.playoff_start + len(bracket)
+        if last_week is not None:
+            end = min(end, last_week + 1)
+        weeks = list(range(first_week, end))
+        with span("season.fetch_matchups"):
+            weeks_data = SleeperAPI.fetch_matchups_batch(self.season_id, weeks)
+        weeks_added = []
+        for week, matchups_data in zip(weeks, weeks_data):
+            if matchups_data is None:
+                # Stop at a failed week so nothing after it is marked as added
+                current_app.logger.warning(
+                    f"Could not fetch week {week} matchups for season {self.season_id}"
                 )
-                self.new_teams.append(
-                    NewTeam(
-                        team_data,
-                        self.season_id,
-                        self.league_id,
-                        self.team_name_map[team_data.get("owner_id")],
-                        self.year,
-                        division,
-                    ).create_team_db_item()
+                break
+            # Regular Season Matchups
+            if week < self.playoff_start:
+                self.add_week_matchups(matchups_data, week, writer=writer)
+            # Post Season Matchups, which end at the first week without any
+            elif matchups_data:
+                playoff_round = week - self.playoff_start + 1
+                self.add_week_matchups(
+                    matchups_data, week, bracket.get(playoff_round), writer
                 )
+            else:
+                break
+            weeks_added.append(week)
+        return weeks_added
 
-    def get_new_drafts(self):
-        drafts_data = SleeperAPI.fetch_league_drafts(self.season_id)
-        if drafts_data:
-            for draft_data in drafts_data:
-                self.new_drafts.append(NewDraft(draft_data))
-
-    def get_new_matchups(self):
-        # Regular Season Matchups
-        for week in range(self.start_week, self.playoff_start):
-            matchups_data = SleeperAPI.fetch_matchups(self.season_id, week)
-            matchups = []
-            for matchup in matchups_data:
-                match_id = matchup.get("matchup_id")
-                if match_id not in matchups:
-                    matchups.append(match_id)
-                    self.new_matchups.append(
-                        NewMatchup(
-                            matchup, self.season_id, week
-                        ).create_matchup_db_item()
-                    )
-                else:
-                    NewMatchup(matchup, self.season_id, week)
-        # Post Season Matchups
-        bracket = preprocess_bracket_data(self.season_id)
-        playoff_round = 1
-        week = self.playoff_start
-        postseason_week = SleeperAPI.fetch_matchups(self.season_id, week)
-        while postseason_week:
-            bracket_data = bracket.get(playoff_round)
-            matchups = []
-            for matchup in postseason_week:
-                match_id = matchup.get("matchup_id")
-
-                if match_id not in matchups:
-                    matchups.append(match_id)
-                    team_id = matchup.get("roster_id")
-                    match_data = bracket_data.get(team_id)
-                    postseason_type = match_data.get("type")
-                    place = match_data.get("place")
-                    self.new_matchups.append(
-                        NewMatchup(
-                            matchup, self.season_id, week
-                        ).create_matchup_db_item(postseason_type, place)
-                    )
+    @traced("season.week_matchups")
+    def add_week_matchups(
+        self,
+        matchups_data: list[dict],
+        week: int,
+        bracket_data: dict = None,
+        writer: Union[BulkWriter, RowBuffer] = None,
+    ) -> None:
+        """
+        Create the matchups for a single week. Both teams in a matchup share a matchup_id, so the Matchup itself is
+        only created for the first team we see.
+        :param matchups_data: The matchup data for the week from the Sleeper API
+        :param week: The week number
+        :param bracket_data: The bracket data for this playoff round, None for regular season weeks
+        :param writer: Where to queue the matchup rows, defaults to the season's writer
+        """
+        writer = writer or self.writer
+        matchups = []
+        for matchup in matchups_data:
+            match_id = matchup.get("matchup_id")
+            if match_id is None:
+                # The team didn't play this week, e.g. it was knocked out of the playoffs
+                continue
+            new_matchup = NewMatchup(matchup, self.season_id, week, writer)
+            if match_id not in matchups:
+                matchups.append(match_id)
+                if bracket_data is None:
+                    new_matchup.add_matchup()
                 else:
-                    NewMatchup(matchup, self.season_id, week)
-            playoff_round += 1
-            week += 1
-            postseason_week = SleeperAPI.fetch_matchups(self.season_id, week)
+                    match_data = bracket_data.get(matchup.get("roster_id")) or {}
+                    postseason_type = match_data.get("type", "consolation")
+                    place = match_data.get("seeding")
+                    new_matchup.add_matchup(postseason_type, place)
+
+    @traced("season.fetch_transactions")
+    def fetch_transactions(self, weeks: list[int]) -> list[tuple[int, list[dict]]]:
+        """
+        Fetch the season's transactions for each of the given weeks in one concurrent batch. Nothing here touches the
+        database, so it is safe to run on a worker thread.
+        :param weeks: The weeks to fetch transactions for.
+        :return: A (week, transactions) tuple for each week that could be fetched, in order.
+        """
+        weeks_data = SleeperAPI.fetch_transactions_batch(self.season_id, weeks)
+        transactions_data = []
+        for week, transactions in zip(weeks, weeks_data):
+            if transactions is None:
+                current_app.logger.warning(
+                    f"Could not fetch week {week} transactions for season {self.season_id}"
+                )
+                continue
+            transactions_data.append((week, transactions))
+        return transactions_data
+
+    @traced("season.transactions")
+    def get_new_transactions(self, weeks: list[int] = None) -> None:
+        """
+        Queue the season's trades and claims that aren't in our database yet. Sleeper never changes a transaction once
+        it has been processed, so the ones we already have are skipped, which also keeps their traded items from being
+        added twice. Anyone who made a transaction but has since left the league is added as an unregistered user.
+        :param weeks: The weeks to fetch and add transactions for, defaults to the weeks already fetched by fetch()
+        """
+        transactions_data = (
+            self.transactions_data if weeks is None else self.fetch_transactions(weeks)
+        )
+        transactions = [
+            (week, transaction)
+            for week, week_transactions in transactions_data or []
+            for transaction in week_transactions
+        ]
+        new_ids = self.lookups.missing(
+            Transaction,
+            (transaction.get("transaction_id") for _, transaction in transactions),
+        )
+        transactions = [
+            (week, transaction)
+            for week, transaction in transactions
+            if transaction.get("transaction_id") in new_ids
+        ]
+        self.get_new_creators(
+            transaction.get("creator") for _, transaction in transactions
+        )
 
-    def get_new_transactions(self):
-        pass
+        for week, transaction in transactions:
+            if not self.lookups.exists(User, transaction.get("creator")):
+                continue
+            NewTransaction(transaction, week, self.season_id, self.writer)
+            self.lookups.add(Transaction, transaction.get("transaction_id"))
+
+    def get_new_creators(self, creators) -> None:
+        """
+        Queue the users who made the season's transactions but aren't in our database, e.g. members who have since left
+        the league. Their details are fetched concurrently from the Sleeper API.
+        :param creators: The user IDs of the transactions' creators.
+        """
+        missing = [
+            creator
+            for creator in self.lookups.missing(User, creators)
+            if creator is not None
+        ]
+        with staging.tag(season=self.season_id, league=self.league_id):
+            users_data = fan_out(
+                SleeperAPI.fetch_user, [(creator,) for creator in missing]
+            )
+        for creator, user_data in zip(missing, users_data):
+            if not user_data:
+                current_app.logger.warning(
+                    f"Could not fetch user {creator}, skipping their transactions"
+                )
+                continue
+            self.writer.add(User, NewUser.create_unregistered_row(user_data), False)
+            self.lookups.add(User, creator)
+
+    @traced("season.fetch_stats")
+    def fetch_stats(self, weeks: list[int]) -> list[tuple[int, dict]]:
+        """
+        Fetch the NFL stats for each of the given weeks in one concurrent batch. Nothing here touches the database, so
+        it is safe to run on a worker thread.
+        :param weeks: The weeks to fetch stats for.
+        :return: A (week, stats) tuple for each week that could be fetched, in order.
+        """
+        weeks_data = SleeperAPI.fetch_stats_batch(self.year, weeks)
+        stats_data = []
+        for week, stats in zip(weeks, weeks_data):
+            if stats is None:
+                current_app.logger.warning(
+                    f"Could not fetch week {week} stats for season {self.season_id}"
+                )
+                continue
+            stats_data.append((week, stats))
+        return stats_data
+
+    @traced("season.stats")
+    def get_new_stats(self, weeks: list[int] = None) -> None:
+        """
+        Queue the NFL stat lines of each week, so the season's player points can be worked out again under other
+        scoring settings, with every player in the Player table that recorded a stat a Season has a weight for. The
+        stats don't belong to a league, so each week is only queued once per run. Stat corrections can still change a
+        week until its season is final, so until then every league upserts them again, after that a week that is
+        already stored is skipped.
+        :param weeks: The weeks to fetch and add stats for, defaults to the weeks already fetched by fetch()
+        """
+        year = int(self.year)
+        stats_data = self.stats_data if weeks is None else self.fetch_stats(weeks)
+        done = {
+            week
+            for (stats_year, week) in self.lookups.stats_weeks
+            if stats_year == year
+        }
+        if stats_are_final(year):
+            done |= stored_weeks(
+                year,
+                [week for week, _ in stats_data or [] if week not in done],
+                self.writer.session,
+            )
+        for week, stats in stats_data or []:
+            if week in done:
+                continue
+            players = set(stats) - self.lookups.missing(Player, stats)
+            add_stats(self.writer, year, week, stats, players)
+            done.add(week)
+        self.lookups.stats_weeks.update((year, week) for week in done)
@@ -0,0 +1,256 @@
+import json
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import func, or_, select
+
+from fantasyApp import db
+from fantasyApp.models import RawPayload
+from fantasyApp.sleeper_data.transport import endpoint_label
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+# league/<season id>, optionally followed by a per-week endpoint like matchups/<week> or transactions/<week>
+LEAGUE_ENDPOINT = re.compile(r"^league/(\d+)(?:/[a-z_]+/(\d+))?")
+# A week of NFL stats, every league shares it, so it is staged without a league or season
+SHARED_ENDPOINT = re.compile(r"^stats/nfl/regular/(\d{4})/(\d+)$")
+
+_store = ContextVar("staging_store", default=None)
+_tags = ContextVar("staging_tags", default={})
+_replay = ContextVar("staging_replay", default=None)
+
+
+class StagedSeason(NamedTuple):
+    """
+    The latest staged payloads for one season.
+    :ivar league: Our database's ID for the season's league, if it was known when the payloads were staged.
+    :ivar payloads: The decoded payloads, keyed on their endpoint.
+    """
+
+    league: Optional[int]
+    payloads: Dict[str, Any]
+
+
+class StagingStore:
+    """
+    Collects the raw payloads fetched during one ingestion run, compressed and tagged with the league, season and week
+    they belong to, so the run's rows can later be rebuilt from them without going back to Sleeper. Payloads are
+    staged on whichever thread fetched them and only handed to the writer by drain(), on the thread that owns the
+    session. The staging table is append-only, every fetch adds a new row and the newest one for an endpoint wins.
+    Payloads every league shares, i.e. NFL stats, are staged without a league or season and found by their endpoint.
+    :ivar writer: The BulkWriter the staged rows are queued on.
+    :ivar league: The league the run is for, used for any payload staged before its league was known.
+    :ivar staged: The number of payloads staged so far.
+    """
+
+    def __init__(self, writer: BulkWriter, league: int = None) -> None:
+        self.writer = writer
+        self.league = league
+        self.staged = 0
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def stage(self, endpoint: str, payload: Any, tags: Dict[str, int] = None) -> None:
+        """
+        Compress a payload and hold on to it until the next drain(). Safe to call from any thread.
+        :param endpoint: The endpoint the payload was fetched from.
+        :param payload: The decoded JSON payload.
+        :param tags: The league and season the payload belongs to, the endpoint itself is used where it says.
+        """
+        tags = tags or {}
+        match = LEAGUE_ENDPOINT.match(endpoint)
+        shared = SHARED_ENDPOINT.match(endpoint)
+        if shared:
+            tags = {}
+        row = {
+            "endpoint": endpoint,
+            "kind": endpoint_label(endpoint),
+            "league": tags.get("league"),
+            "season": int(match.group(1)) if match else tags.get("season"),
+            "week": (
+                int(match.group(2))
+                if match and match.group(2)
+                else int(shared.group(2)) if shared else None
+            ),
+            "payload": zlib.compress(
+                json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            ),
+            "fetched_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._rows.append(row)
+            self.staged += 1
+
+    def drain(self) -> None:
+        """
+        Queue everything staged so far on the writer, filling in the run's league where it wasn't known yet, except on
+        the payloads every league shares.
+        """
+        with self._lock:
+            rows, self._rows = self._rows, []
+        for row in rows:
+            if not SHARED_ENDPOINT.match(row["endpoint"]):
+                row["league"] = row["league"] or self.league
+            self.writer.add(RawPayload, row, False)
+
+
+@contextmanager
+def capture(writer: BulkWriter, league: int = None) -> Iterator[Optional[StagingStore]]:
+    """
+    Stage every payload fetched inside the block, including on worker threads started from it. The staged rows are
+    queued on the writer when the block finishes without an error.
+    :param writer: The BulkWriter to queue the staged rows on.
+    :param league: The league the run is for, if it is known yet.
+    :return: The StagingStore, or None if staging is turned off.
+    """
+    if not current_app.config.get("INGEST_STAGING", True):
+        yield None
+        return
+    store = StagingStore(writer, league)
+    store_token = _store.set(store)
+    tags_token = _tags.set({"league": league} if league else {})
+    try:
+        yield store
+        store.drain()
+    finally:
+        _tags.reset(tags_token)
+        _store.reset(store_token)
+
+
+@contextmanager
+def tag(**tags: Optional[int]) -> Iterator[None]:
+    """
+    Tag every payload staged inside the block, e.g. with the season a draft belongs to.
+    :param tags: The league and/or season, None values are ignored.
+    """
+    token = _tags.set(
+        {**_tags.get(), **{key: value for key, value in tags.items() if value}}
+    )
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def stage(endpoint: str, payload: Any) -> None:
+    """
+    Stage a payload if a capture() is active, otherwise do nothing.
+    :param endpoint: The endpoint the payload was fetched from.
+    :param payload: The decoded JSON payload, None (a failed request) is never staged.
+    """
+    store = _store.get()
+    if store is not None and payload is not None:
+        store.stage(endpoint, payload, _tags.get())
+
+
+@contextmanager
+def replay(payloads: Dict[str, Any]) -> Iterator[None]:
+    """
+    Serve every fetch inside the block, including on worker threads started from it, from staged payloads instead
+    of the Sleeper API. Endpoints that were never staged come back as None, like a failed request.
+    :param payloads: The staged payloads, keyed on their endpoint.
+    """
+    token = _replay.set(payloads)
+    try:
+        yield
+    finally:
+        _replay.reset(token)
+
+
+def replaying() -> bool:
+    """
+    Check whether fetches are being served from staged payloads.
+    :return: True inside a replay() block.
+    """
+    return _replay.get() is not None
+
+
+def replayed(endpoint: str) -> Optional[Any]:
+    """
+    Get a staged payload inside a replay() block.
+    :param endpoint: The endpoint to get.
+    :return: The decoded payload, or None if it was never staged.
+    """
+    return _replay.get().get(endpoint)
+
+
+def load(season_ids: Iterable[int], session=None) -> Dict[int, StagedSeason]:
+    """
+    Load the newest staged payload of every endpoint for each of the seasons, in one query, along with the NFL stats
+    of the seasons' years, which every league shares, in another.
+    :param season_ids: The IDs of the seasons.
+    :param session: The session to query with, defaults to db.session.
+    :return: A StagedSeason for each season that has staged payloads.
+    """
+    session = session or db.session
+    season_ids = [int(season_id) for season_id in season_ids]
+    latest = (
+        select(func.max(RawPayload.id))
+        .where(RawPayload.season.in_(season_ids))
+        .group_by(RawPayload.season, RawPayload.endpoint)
+    )
+    rows = session.execute(
+        select(
+            RawPayload.season,
+            RawPayload.league,
+            RawPayload.endpoint,
+            RawPayload.payload,
+        ).where(RawPayload.id.in_(latest))
+    )
+    leagues = {}
+    payloads = {}
+    for season, league, endpoint, payload in rows:
+        leagues[season] = leagues.get(season) or league
+        payloads.setdefault(season, {})[endpoint] = json.loads(zlib.decompress(payload))
+    years = {
+        season: (season_payloads.get(f"league/{season}") or {}).get("season")
+        for season, season_payloads in payloads.items()
+    }
+    stats = load_shared({year for year in years.values() if year}, session)
+    for season, year in years.items():
+        for endpoint, payload in stats.items():
+            if SHARED_ENDPOINT.match(endpoint).group(1) == str(year):
+                payloads[season][endpoint] = payload
+    return {
+        season: StagedSeason(leagues[season], season_payloads)
+        for season, season_payloads in payloads.items()
+    }
+
+
+def load_shared(years: Iterable[str], session=None) -> Dict[str, Any]:
+    """
+    Load the newest staged NFL stats of every week of some years.
+    :param years: The years.
+    :param session: The session to query with, defaults to db.session.
+    :return: The decoded payloads, keyed on their endpoint.
+    """
+    years = list(years)
+    if not years:
+        return {}
+    session = session or db.session
+    latest = (
+        select(func.max(RawPayload.id))
+        .where(
+            RawPayload.season.is_(None),
+            or_(
+                *(
+                    RawPayload.endpoint.like(f"stats/nfl/regular/{year}/%")
+                    for year in years
+                )
+            ),
+        )
+        .group_by(RawPayload.endpoint)
+    )
+    rows = session.execute(
+        select(RawPayload.endpoint, RawPayload.payload).where(RawPayload.id.in_(latest))
+    )
+    return {
+        endpoint: json.loads(zlib.decompress(payload))
+        for endpoint, payload in rows
+        if SHARED_ENDPOINT.match(endpoint)
+    }
@@ -0,0 +1,85 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.models import PlayerWeekStats
+from fantasyApp.sleeper_data.lookups import to_key
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+# Sleeper's name for each stat we keep, keyed on the Season column with the points it is worth
+SCORING = {
+    "pts_pass_yds": "pass_yd",
+    "pts_pass_td": "pass_td",
+    "pts_pass_int": "pass_int",
+    "pts_pass_2pt": "pass_2pt",
+    "pts_rush_yds": "rush_yd",
+    "pts_rush_td": "rush_td",
+    "pts_rush_2pt": "rush_2pt",
+    "pts_rec": "rec",
+    "pts_rec_yds": "rec_yd",
+    "pts_rec_td": "rec_td",
+    "pts_rec_2pt": "rec_2pt",
+    "pts_fum_lost": "fum_lost",
+    "pts_bonus_rec_te": "bonus_rec_te",
+}
+# The stats stored in PlayerWeekStats, the tight end reception bonus is worked out from rec and the player's position
+STATS = tuple(stat for stat in SCORING.values() if stat != "bonus_rec_te")
+
+
+def stat_row(player_id: str, year: int, week: int, stats: dict) -> Optional[dict]:
+    """
+    Map a player's stat line from the Sleeper API to the columns of the PlayerWeekStats table.
+    :param player_id: The sleeper ID of the player.
+    :param year: The NFL season (year).
+    :param week: The week of the stat line.
+    :param stats: The player's stats from the Sleeper API.
+    :return: A dictionary of PlayerWeekStats column values, or None if the player didn't record any of the stats we
+    keep, e.g. kickers and team defenses.
+    """
+    player = to_key(player_id)
+    values = {stat: float((stats or {}).get(stat) or 0) for stat in STATS}
+    if player is None or not any(values.values()):
+        return None
+    return {"player": player, "year": int(year), "week": week, **values}
+
+
+def add_stats(
+    writer: BulkWriter, year: int, week: int, stats: dict, players: Iterable[str]
+) -> int:
+    """
+    Queue the stat lines of a week for the given players.
+    :param writer: The BulkWriter to queue the rows on.
+    :param year: The NFL season (year).
+    :param week: The week of the stats.
+    :param stats: Every player's stats that week from the Sleeper API.
+    :param players: The sleeper IDs of the players to keep the stats of.
+    :return: The number of stat lines queued.
+    """
+    queued = 0
+    for player_id in players:
+        row = stat_row(player_id, year, week, stats.get(str(player_id)))
+        if row:
+            writer.add(PlayerWeekStats, row)
+            queued += 1
+    return queued
+
+
+def stored_weeks(year: int, weeks: Iterable[int], session=None) -> set[int]:
+    """
+    Find which weeks of a season already have their stat lines stored, e.g. by another league.
+    :param year: The NFL season (year).
+    :param weeks: The weeks to check.
+    :param session: The session to query with, defaults to db.session.
+    :return: The weeks that have stat lines.
+    """
+    weeks = list(weeks)
+    if not weeks:
+        return set()
+    return set(
+        (session or db.session).scalars(
+            select(PlayerWeekStats.week)
+            .where(PlayerWeekStats.year == int(year), PlayerWeekStats.week.in_(weeks))
+            .distinct()
+        )
+    )
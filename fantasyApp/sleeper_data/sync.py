@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import Optional
+
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import delete, select
+
+from fantasyApp import db
+from fantasyApp.analytics.playoff_odds import refresh_playoff_odds
+from fantasyApp.models import NflState, Season, SeasonSync, Team, TeamPlayer
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.concurrency import fan_out
+from fantasyApp.sleeper_data.instrumentation import trace
+from fantasyApp.sleeper_data.seasons import NewSeason
+from fantasyApp.sleeper_data.teams import team_ref
+from fantasyApp.sleeper_data.unit_of_work import UnitOfWork
+from fantasyApp.sleeper_data.utils import SleeperAPI
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+
+def update_nfl_state() -> Optional[NflState]:
+    """
+    Fetch the current state of the NFL season and store it as the only row in the NflState table.
+    :return: The new NflState, or None if the Sleeper API couldn't be reached.
+    """
+    state_data = SleeperAPI.fetch_nfl_state()
+    if not state_data:
+        current_app.logger.warning("Could not fetch the NFL state")
+        return None
+    NflState.query.delete()
+    state = NflState(
+        week=state_data.get("week"),
+        season=int(state_data.get("season")),
+        season_type=state_data.get("season_type"),
+    )
+    db.session.add(state)
+    db.session.commit()
+    return state
+
+
+def last_completed_week(year: int, state: Optional[NflState]) -> Optional[int]:
+    """
+    Work out the last week of a season whose games are all finished.
+    :param year: The year of the season.
+    :param state: The current NFL state, if we have it.
+    :return: The last completed week, or None if the whole season is finished (or we can't tell).
+    """
+    if state is None:
+        return None
+    if int(year) == state.season and state.season_type in ("pre", "regular", "post"):
+        return state.week - 1
+    return None
+
+
+def sync_rosters(season_id: int, writer: BulkWriter) -> None:
+    """
+    Replace the players on every team in a season with their current rosters.
+    :param season_id: The ID of the season.
+    :param writer: The BulkWriter to queue the new TeamPlayer rows on.
+    """
+    rosters = SleeperAPI.fetch_league_rosters(season_id)
+    if not rosters:
+        return
+    teams = select(Team.id).where(Team.season == season_id)
+    db.session.execute(delete(TeamPlayer).where(TeamPlayer.team.in_(teams)))
+    for roster in rosters:
+        team = team_ref(season_id, roster.get("roster_id"))
+        for player in roster.get("players") or []:
+            writer.add(TeamPlayer, {"team": team, "player": player})
+
+
+def sync_season(
+    season: Season, season_data: dict, state: NflState, writer: BulkWriter
+) -> list[int]:
+    """
+    Bring one season up to date. Only the weeks after the season's watermark are fetched, along with the
+    transactions and NFL stats for those weeks and the current rosters, and then the watermark is moved forward.
+    :param season: The season in our database.
+    :param season_data: The season's league data from the Sleeper API.
+    :param state: The current NFL state.
+    :param writer: The BulkWriter to queue new rows on.
+    :return: The weeks that were added.
+    """
+    sync = db.session.get(SeasonSync, season.id) or SeasonSync(
+        season=season.id, last_week=0
+    )
+    new_season = NewSeason(season_data, season.league, writer)
+    first_week = max(sync.last_week + 1, new_season.start_week)
+    last_week = last_completed_week(season.year, state)
+
+    weeks = []
+    if last_week is None or last_week >= first_week:
+        weeks = new_season.get_new_matchups(first_week, last_week)
+        new_season.get_new_transactions(weeks)
+        new_season.get_new_stats(weeks)
+    sync_rosters(season.id, writer)
+
+    season.status = season_data.get("status")
+    if weeks:
+        sync.last_week = weeks[-1]
+    sync.synced_at = datetime.utcnow()
+    db.session.add(sync)
+    return weeks
+
+
+@shared_task(name="sync_leagues")
+def sync_leagues() -> None:
+    """
+    Keep every unfinished season in our database current. Each season costs a handful of requests per week (its
+    league details, the new weeks' matchups and transactions, and its rosters) instead of a full re-ingest. Each
+    season is committed on its own and nothing is held on to between them. Seasons that gained weeks then get their
+    playoff odds refreshed.
+    """
+    state = update_nfl_state()
+    if state is None:
+        return
+    state_week = state.week
+    season_ids = list(
+        db.session.scalars(
+            select(Season.id).where(
+                (Season.status != "complete") | (Season.status.is_(None))
+            )
+        )
+    )
+    current_app.logger.info(f"Syncing {len(season_ids)} seasons for week {state.week}")
+    # Grab every season's details up front, concurrently, the rest of the sync is per season
+    seasons_data = fan_out(
+        SleeperAPI.fetch_league_details, [(season_id,) for season_id in season_ids]
+    )
+    synced = []
+    with UnitOfWork() as unit:
+        for season_id, season_data in zip(season_ids, seasons_data):
+            if not season_data:
+                current_app.logger.warning(f"Could not fetch season {season_id}")
+                continue
+            # Every commit empties the session, so load this season's rows fresh
+            season = unit.session.get(Season, season_id)
+            state = unit.session.get(NflState, state_week)
+            with trace("sync", season_id):
+                with staging.capture(unit.writer, season.league):
+                    # The season's details were fetched before the capture started
+                    staging.stage(f"league/{season_id}", season_data)
+                    weeks = sync_season(season, season_data, state, unit.writer)
+                unit.touch(season_id, weeks)
+                unit.commit()
+            current_app.logger.info(f"Synced weeks {weeks} for season {season_id}")
+            if weeks:
+                synced.append(season_id)
+    # New weeks change the standings, so the odds of those seasons are simulated again
+    if synced:
+        refresh_playoff_odds.delay(synced)
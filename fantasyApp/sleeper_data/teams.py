@@ -1,44 +1,81 @@
-from fantasyApp import db
+from typing import Optional
+
 from fantasyApp.models import Team, TeamPlayer
-from fantasyApp.sleeper_data.utils import SleeperAPI
-from flask import current_app
+from fantasyApp.sleeper_data.instrumentation import traced
+from fantasyApp.sleeper_data.writers import BulkWriter, Ref
+
+
+def team_ref(season_id: int, roster_id: Optional[int]) -> Optional[Ref]:
+    """
+    Point at one of a season's teams from another row, the BulkWriter swaps it for the team's ID.
+    :param season_id: The ID of the season.
+    :param roster_id: The team's roster ID within the season.
+    :return: The Ref, or None if there is no roster ID.
+    """
+    if roster_id is None:
+        return None
+    return Ref(Team, (int(season_id), int(roster_id)))
 
 
 class NewTeam:
-    def __init__(self, team, season_id, league_id, map, year, division):
+    """
+    A class to represent a new team. The team and each of its rostered players are queued on a BulkWriter as plain
+    rows. The team's ID is assigned by the database, it is identified by its season and roster ID.
+    :ivar team: The roster data from the Sleeper API.
+    :ivar season_id: The ID of the season.
+    :ivar league_id: The ID of the league.
+    :ivar roster_id: The team's roster ID within the season.
+    :ivar team_name: The name of the team.
+    :ivar ref: A Ref to the team, for its rostered players.
+    :ivar year: The year of the season.
+    :ivar owner: The user ID of the team's owner.
+    :ivar is_commish: Whether the owner is the commissioner.
+    :ivar division: A Ref to the team's division, None if the league has none.
+    :ivar writer: The BulkWriter the rows are queued on.
+    """
+
+    @traced("team")
+    def __init__(
+        self, team, season_id, league_id, map, year, division, writer: BulkWriter
+    ):
         self.team = team
         self.season_id = season_id
         self.league_id = league_id
-        self.team_name = map.get("team_name")
-        self.team_id = int(str(self.season_id) + str(self.roster_id))
         self.roster_id = team.get("roster_id")
+        self.team_name = map.get("team_name") or f"Team {self.roster_id}"
+        self.ref = team_ref(self.season_id, self.roster_id)
         self.year = year
         self.owner = team.get("owner_id")
-        self.is_commish = map.get("commish")
+        self.is_commish = bool(map.get("commish"))
         self.division = division
+        self.writer = writer
 
+        self.add_team()
         self.add_players()
 
-    players_to_add = []
-
-    def create_team_db_item(self):
-        team = Team(
-            id=self.team_id,
-            sleeper_roster_id=self.roster_id,
-            name=self.team_name,
-            year=self.year,
-            is_commish=self.is_commish,
-            division=self.division,
-            owner=self.owner,
-            season=self.season_id,
-            league=self.league_id,
+    def add_team(self) -> None:
+        """
+        Queue the Team row.
+        """
+        self.writer.add(
+            Team,
+            {
+                "sleeper_roster_id": self.roster_id,
+                "name": self.team_name,
+                "year": self.year,
+                "is_commish": self.is_commish,
+                "division": self.division,
+                "owner": self.owner,
+                "season": self.season_id,
+                "league": self.league_id,
+            },
         )
-        return team
 
-    def add_players(self):
+    def add_players(self) -> None:
+        """
+        Queue a TeamPlayer row for every player on the roster.
+        """
         # TODO: Figure out how to match nicknames for the players
-        players = self.team.get("players")
-        players_to_add = []
-        for player in players:
-            players_to_add.append(TeamPlayer(team=self.team_id, player=player))
-        db.session.add_all(players_to_add)
+        for player in self.team.get("players") or []:
+            # Don't overwrite a nickname someone has set
+            self.writer.add(TeamPlayer, {"team": self.ref, "player": player}, False)
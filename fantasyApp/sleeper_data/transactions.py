@@ -1,66 +1,174 @@
-from fantasyApp import db
+from datetime import datetime
+from typing import Optional, Union
+
 from fantasyApp.models import Transaction, Claim, TradedItem
-from fantasyApp.sleeper_data.utils import SleeperAPI
+from fantasyApp.sleeper_data.lookups import to_key
+from fantasyApp.sleeper_data.instrumentation import traced
+from fantasyApp.sleeper_data.teams import team_ref
+from fantasyApp.sleeper_data.writers import BulkWriter, Ref, RowBuffer
+
+# Sleeper's transaction types, commissioner moves aren't trades or claims so they are left out
+CLAIM_TYPES = {"waiver": "Waiver", "free_agent": "Free Agent"}
+CLAIM_STATUSES = {"complete": "Complete", "failed": "Failed"}
+
+
+def to_datetime(timestamp: Optional[int]) -> Optional[datetime]:
+    """
+    Convert one of Sleeper's millisecond epoch timestamps to a datetime.
+    :param timestamp: The timestamp in milliseconds.
+    :return: The datetime, or None if there is no timestamp.
+    """
+    return datetime.fromtimestamp(timestamp / 1000) if timestamp else None
 
 
 class NewTransaction:
-    def __init__(self, transaction, week, season_id):
+    """
+    A class to represent a new transaction. The transaction is queued on a BulkWriter as a Transaction row along with
+    either a Claim row for a waiver or free agent move, or a TradedItem row for every player, pick and FAAB amount
+    that changed hands in a trade. The Transaction and Claim are keyed on Sleeper's transaction ID.
+    :ivar transaction: The transaction data from the Sleeper API.
+    :ivar transaction_id: The ID of the transaction.
+    :ivar transaction_type: Sleeper's type for the transaction, e.g. waiver.
+    :ivar status: Sleeper's status for the transaction, e.g. complete.
+    :ivar week: The week the transaction was processed in.
+    :ivar season_id: The ID of the season.
+    :ivar adds: A dictionary mapping each added player to the roster ID that added them.
+    :ivar drops: A dictionary mapping each dropped player to the roster ID that dropped them.
+    :ivar writer: The BulkWriter the rows are queued on.
+    """
+
+    @traced("transaction")
+    def __init__(
+        self,
+        transaction: dict,
+        week: int,
+        season_id: int,
+        writer: Union[BulkWriter, RowBuffer],
+    ) -> None:
+        """
+        Initialize the NewTransaction class with the transaction data and queue its rows. Transactions we don't store,
+        e.g. commissioner moves or trades that never went through, are skipped.
+        :param transaction: A dictionary of transaction data from the Sleeper API.
+        :param week: The week the transaction was processed in.
+        :param season_id: The ID of the season.
+        :param writer: The BulkWriter to queue the rows on.
+        """
         self.transaction = transaction
-        self.transaction_id = transaction.get("transaction_id")
-        self.creator = transaction.get("creator")
-        self.time_created = transaction.get("created")  # Need to convert this
-        self.time_processed = transaction.get("status_updated")  # Need to convert this
-        self.week = week
-        self.season = season_id
+        self.transaction_id = int(transaction.get("transaction_id"))
         self.transaction_type = transaction.get("type")
-        self.transaction_items = []
-
-        if self.transaction_type == "trade":
-            self.type = "trade"
-            self.transaction_items.append(self.add_trade_items())
-        else:
-            self.type = "claim"
-            self.transaction_items.append(self.add_claim_items())
+        self.status = transaction.get("status")
+        self.week = week
+        self.season_id = season_id
+        self.adds = transaction.get("adds") or {}
+        self.drops = transaction.get("drops") or {}
+        self.writer = writer
 
-    def create_db_item(self):
-        transaction = Transaction(
-            id=self.transaction_id,
-            creator=self.creator,
-            time_created=self.time_created,
-            time_processed=self.time_processed,
-            week=self.week,
-            season=self.season,
-            type=self.type,
-        )
-        self.transaction_items.append(transaction)
+        if self.transaction_type == "trade" and self.status == "complete":
+            self.add_transaction("trade")
+            self.add_trade_items()
+        elif self.transaction_type in CLAIM_TYPES and self.status in CLAIM_STATUSES:
+            self.add_transaction("claim")
+            self.add_claim()
 
-        return self.transaction_items
+    def team_id(self, roster_id: Optional[int]) -> Optional[Ref]:
+        """
+        Point at the team of one of the season's roster IDs.
+        :param roster_id: The roster ID.
+        :return: A Ref to the team, or None if there is no roster ID.
+        """
+        return team_ref(self.season_id, roster_id)
 
-    def add_claim_items(self):
-        # If "adds" exists in the transaction, get the first player id from it.
-        # If "adds" doesn't exist, set added_player to None.
-        added_player = (
-                self.transaction.get("adds")
-                and list(self.transaction.get("adds").keys())[0]
+    def add_transaction(self, transaction_type: str) -> None:
+        """
+        Queue the Transaction row.
+        :param transaction_type: Our type for the transaction, trade or claim.
+        """
+        self.writer.add(
+            Transaction,
+            {
+                "id": self.transaction_id,
+                "type": transaction_type,
+                "week": self.week,
+                "time_created": to_datetime(self.transaction.get("created")),
+                "time_processed": to_datetime(self.transaction.get("status_updated")),
+                "season": self.season_id,
+                "creator": int(self.transaction.get("creator")),
+            },
         )
-        # If "drops" exists in the transaction, get the first player id from it.
-        # If "drops" doesn't exist, set dropped_player to None.
-        dropped_player = (
-                self.transaction.get("drops")
-                and list(self.transaction.get("drops").keys())[0]
-        )
-        settings = self.transaction.get("settings")
 
-        claim = Claim(
-            transaction=self.transaction_id,
-            type=self.transaction_type,
-            status=self.transaction.get("status"),
-            added_player=added_player,
-            dropped_player=dropped_player,
-            waiver_order=settings.get("seq"),
-            bid=settings.get("bid"),
+    def add_claim(self) -> None:
+        """
+        Queue the Claim row, a claim adds and drops at most one player each.
+        """
+        settings = self.transaction.get("settings") or {}
+        self.writer.add(
+            Claim,
+            {
+                # There is only ever one claim per transaction
+                "id": self.transaction_id,
+                "type": CLAIM_TYPES[self.transaction_type],
+                "status": CLAIM_STATUSES[self.status],
+                "waiver_order": settings.get("seq"),
+                "bid": settings.get("waiver_bid"),
+                "transaction": self.transaction_id,
+                "added_player": to_key(next(iter(self.adds), None)),
+                "dropped_player": to_key(next(iter(self.drops), None)),
+            },
         )
-        return claim
 
-    def add_trade_items(self):
-        pass
+    def add_trade_items(self) -> None:
+        """
+        Queue a TradedItem row for every player, draft pick and FAAB amount in the trade. Traded items have no ID
+        from Sleeper, so the caller only builds a trade that isn't in our database yet.
+        """
+        for player, roster_id in self.adds.items():
+            self.add_traded_item(
+                "Player",
+                self.drops.get(player),
+                roster_id,
+                # Team defenses (e.g. "KC") aren't in the Player table
+                player=to_key(player),
+            )
+        for pick in self.transaction.get("draft_picks") or []:
+            self.add_traded_item(
+                "Pick",
+                pick.get("previous_owner_id"),
+                pick.get("owner_id"),
+                year=int(pick.get("season")),
+                round=pick.get("round"),
+                orig_team=self.team_id(pick.get("roster_id")),
+            )
+        for budget in self.transaction.get("waiver_budget") or []:
+            self.add_traded_item(
+                "FAAB",
+                budget.get("sender"),
+                budget.get("receiver"),
+                amount=budget.get("amount"),
+            )
+
+    def add_traded_item(
+        self, item_type: str, old_roster: int, new_roster: int, **values
+    ) -> None:
+        """
+        Queue a single TradedItem row. Every row has the same columns, so a trade's items are written in one batch.
+        :param item_type: Player, Pick or FAAB.
+        :param old_roster: The roster ID that gave the item up.
+        :param new_roster: The roster ID that received the item.
+        :param values: The item's other columns, e.g. the player or the pick's year and round.
+        """
+        if old_roster is None or new_roster is None:
+            return
+        self.writer.add(
+            TradedItem,
+            {
+                "item_type": item_type,
+                "year": values.get("year"),
+                "round": values.get("round"),
+                "amount": values.get("amount"),
+                "transaction": self.transaction_id,
+                "player": values.get("player"),
+                "old_team": self.team_id(old_roster),
+                "new_team": self.team_id(new_roster),
+                "orig_team": values.get("orig_team"),
+            },
+        )
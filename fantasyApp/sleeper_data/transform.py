@@ -0,0 +1,73 @@
+from typing import Iterable
+
+from celery import shared_task
+from flask import current_app
+
+from fantasyApp.models import Season
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.instrumentation import trace
+from fantasyApp.sleeper_data.seasons import NewSeason
+from fantasyApp.sleeper_data.unit_of_work import UnitOfWork
+
+
+def transform_seasons(season_ids: Iterable[int], unit: UnitOfWork) -> list[int]:
+    """
+    Build the normalized rows of each season (the season, its users, teams, matchups, drafts and transactions) from
+    its staged payloads instead of the Sleeper API. Every season's payloads are loaded in one query and the rows are
+    queued on the run's writer, which writes each table in executemany batches, so no request is made and the only
+    database work is one read and a few bulk upserts per table.
+    :param season_ids: The IDs of the seasons to rebuild.
+    :param unit: The UnitOfWork of the run, nothing is committed.
+    :return: The IDs of the seasons that were rebuilt.
+    """
+    lookups = unit.lookups
+    staged = staging.load(season_ids)
+    lookups.prefetch(Season, staged)
+    # Oldest first, so each season's previous_season is already there
+    seasons = sorted(
+        staged.items(),
+        key=lambda item: str(
+            (item[1].payloads.get(f"league/{item[0]}") or {}).get("season")
+        ),
+    )
+    rebuilt = []
+    for season_id, (league_id, payloads) in seasons:
+        season_data = payloads.get(f"league/{season_id}")
+        season_in_db = lookups.get(Season, season_id)
+        league_id = league_id or (season_in_db.league if season_in_db else None)
+        if not season_data or league_id is None:
+            current_app.logger.warning(
+                f"Season {season_id} isn't fully staged, it can't be rebuilt"
+            )
+            continue
+        # Only rebuild the weeks that were fetched, the rest were never ingested
+        weeks = [
+            int(endpoint.rsplit("/", 1)[1])
+            for endpoint in payloads
+            if endpoint.startswith(f"league/{season_id}/matchups/")
+        ]
+        new_season = NewSeason(season_data, league_id, unit.writer, lookups)
+        with staging.replay(payloads):
+            new_season.fetch(max(weeks, default=0))
+            new_season.add()
+        new_season.add_sync()
+        unit.touch(season_id, new_season.weeks_added)
+        unit.checkpoint()
+        rebuilt.append(season_id)
+    return rebuilt
+
+
+@shared_task(name="rebuild_seasons")
+def rebuild_seasons(season_ids: list[int]) -> dict:
+    """
+    Rebuild seasons from their staged payloads and commit them, e.g. after a schema change or a bug fix in one of the
+    builders.
+    :param season_ids: The IDs of the seasons to rebuild.
+    :return: The number of rows written per table.
+    """
+    with UnitOfWork() as unit, trace("rebuild", ",".join(map(str, season_ids))):
+        rebuilt = transform_seasons(season_ids, unit)
+        unit.commit()
+    rows_written = dict(unit.writer.rows_written)
+    current_app.logger.info(f"Rebuilt seasons {rebuilt} from staging: {rows_written}")
+    return rows_written
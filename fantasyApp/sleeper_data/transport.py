@@ -0,0 +1,197 @@
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fantasyApp.sleeper_data import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Status codes that are worth retrying. Everything else (404 for an unknown user, etc.) is returned immediately.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def endpoint_label(endpoint: str) -> str:
+    """
+    Collapse an endpoint into a template so latency counters don't grow with every league, draft and week we fetch.
+    e.g. "league/1234/matchups/5" -> "league/{id}/matchups/{id}" and "user/bob" -> "user/{id}"
+    :param endpoint: The endpoint relative to the base url.
+    :return: The endpoint template.
+    """
+    segments = endpoint.strip("/").split("/")
+    label = []
+    for index, segment in enumerate(segments):
+        if re.search(r"\d", segment) or (index > 0 and segments[index - 1] == "user"):
+            label.append("{id}")
+        else:
+            label.append(segment)
+    return "/".join(label)
+
+
+class SleeperTransport:
+    """
+    A shared keep-alive HTTP session for the Sleeper API. Connections are pooled and reused across calls, every request
+    has a timeout, and 429/5xx responses are retried with exponential backoff and jitter.
+    :ivar session: The pooled requests session.
+    :ivar timeout: A (connect, read) timeout tuple.
+    :ivar max_retries: The number of times a failed request is retried.
+    :ivar backoff_factor: The base delay in seconds for the exponential backoff.
+    :ivar backoff_max: The longest we will ever sleep between retries.
+    :ivar throttle: An optional callable run before every attempt, used to plug in rate limiting.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        max_retries: int = 4,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 30.0,
+    ) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.throttle = None
+
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SleeperTransport":
+        """
+        Build a transport from the app config, falling back to the defaults for anything that isn't set.
+        :param config: The Flask app config (or any mapping with the SLEEPER_* keys).
+        :return: A new SleeperTransport.
+        """
+        return cls(
+            pool_size=config.get("SLEEPER_POOL_SIZE", 10),
+            connect_timeout=config.get("SLEEPER_CONNECT_TIMEOUT", 3.05),
+            read_timeout=config.get("SLEEPER_READ_TIMEOUT", 10.0),
+            max_retries=config.get("SLEEPER_MAX_RETRIES", 4),
+            backoff_factor=config.get("SLEEPER_BACKOFF_FACTOR", 0.5),
+            backoff_max=config.get("SLEEPER_BACKOFF_MAX", 30.0),
+        )
+
+    def request(
+        self, url: str, label: str, stream: bool = False
+    ) -> Optional[requests.Response]:
+        """
+        GET a url, retrying connection errors, timeouts, 429s and 5xx responses.
+        :param url: The full url to fetch.
+        :param label: The endpoint template used for the latency counters.
+        :param stream: Whether to stream the response body instead of downloading it all at once.
+        :return: The successful response, or None if the request failed or ran out of retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.throttle:
+                self.throttle()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.record(label, time.perf_counter() - start, failed=True)
+                if attempt == self.max_retries:
+                    logger.error(
+                        f"Giving up on {url} after {attempt + 1} attempts: {error}"
+                    )
+                    return None
+                self.backoff(attempt)
+                continue
+            failed = response.status_code != 200
+            self.record(label, time.perf_counter() - start, failed=failed)
+            if not failed:
+                return response
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                response.close()
+                self.backoff(attempt, response.headers.get("Retry-After"))
+                continue
+            if response.status_code in RETRY_STATUSES:
+                logger.error(
+                    f"Giving up on {url} after {attempt + 1} attempts: HTTP {response.status_code}"
+                )
+            response.close()
+            return None
+
+    def get_json(self, url: str, label: str) -> Optional[Any]:
+        """
+        GET a url and decode the JSON body.
+        :param url: The full url to fetch.
+        :param label: The endpoint template used for the latency counters.
+        :return: The decoded JSON, or None if the request failed or the body wasn't JSON.
+        """
+        response = self.request(url, label)
+        if response is None:
+            return None
+        try:
+            return response.json()
+        except ValueError as error:
+            # e.g. an HTML error page from a proxy, the attempt was already counted as a call so only add the failure
+            logger.error(f"{url} didn't return JSON: {error}")
+            self.record(label, 0.0, failed=True, calls=0)
+            return None
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> None:
+        """
+        Sleep before the next attempt using exponential backoff with full jitter. A Retry-After header from the server
+        is treated as a lower bound.
+        :param attempt: The zero based attempt number that just failed.
+        :param retry_after: The value of the Retry-After header, if there was one.
+        """
+        delay = random.uniform(
+            0, min(self.backoff_max, self.backoff_factor * 2**attempt)
+        )
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        time.sleep(delay)
+
+    def record(
+        self, label: str, elapsed: float, failed: bool = False, calls: int = 1
+    ) -> None:
+        """
+        Add a request to the per-endpoint latency counters.
+        :param label: The endpoint template.
+        :param elapsed: How long the attempt took in seconds.
+        :param failed: Whether the attempt failed.
+        :param calls: How many calls to count, 0 marks an attempt that was already counted as failed.
+        """
+        with self._lock:
+            stats = self._stats.setdefault(
+                label, {"calls": 0, "failures": 0, "total_time": 0.0, "max_time": 0.0}
+            )
+            stats["calls"] += calls
+            stats["failures"] += int(failed)
+            stats["total_time"] += elapsed
+            stats["max_time"] = max(stats["max_time"], elapsed)
+        # Also count it towards the ingestion that made it, if there is one
+        instrumentation.record_request(label, elapsed, failed, calls)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        A snapshot of the per-endpoint latency counters.
+        :return: A dictionary mapping endpoint templates to calls, failures, total, average and max time in seconds.
+        """
+        with self._lock:
+            snapshot = {label: dict(stats) for label, stats in self._stats.items()}
+        for stats in snapshot.values():
+            stats["avg_time"] = stats["total_time"] / stats["calls"]
+        return snapshot
+
+    def reset_stats(self) -> None:
+        """
+        Clear the latency counters.
+        """
+        with self._lock:
+            self._stats = {}
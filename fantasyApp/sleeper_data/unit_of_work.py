@@ -0,0 +1,115 @@
+import gc
+from typing import Iterable
+
+from flask import current_app
+
+from fantasyApp import db
+from fantasyApp.sleeper_data.aggregates import bump_data_version, refresh_aggregates
+from fantasyApp.sleeper_data.instrumentation import rss_bytes, span
+from fantasyApp.sleeper_data.lookups import LookupCache
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+
+class UnitOfWork:
+    """
+    Everything one ingestion run holds on to: its BulkWriter, its LookupCache and the session they share. Nothing in
+    the sleeper_data builders outlives the run, so a worker that ingests thousands of leagues doesn't grow with each
+    one. Call checkpoint() between seasons: pending rows are written once there are flush_rows of them, and if the
+    process has grown past the memory ceiling the run also drops its lookup cache and lets go of the session's
+    objects. Mark the weeks whose matchups were written with touch(). commit() writes everything, refreshes the
+    aggregate tables of the touched weeks, bumps their leagues' data_version and starts the next chunk with an empty
+    session.
+    :ivar session: The session the run writes in.
+    :ivar writer: The run's BulkWriter.
+    :ivar lookups: The run's LookupCache.
+    :ivar flush_rows: How many pending rows, across all tables, to hold before writing them at a checkpoint.
+    :ivar memory_ceiling: The resident set size in bytes above which a checkpoint sheds memory, 0 turns it off.
+    :ivar sheds: The number of times memory has been shed.
+    :ivar touched: The weeks whose matchups were written since the last commit, keyed on the ID of their season.
+    """
+
+    def __init__(
+        self,
+        session=None,
+        batch_size: int = None,
+        flush_rows: int = None,
+        memory_ceiling: int = None,
+    ) -> None:
+        config = current_app.config
+        self.session = session or db.session
+        self.writer = BulkWriter(batch_size, self.session)
+        self.lookups = LookupCache(self.session)
+        self.flush_rows = flush_rows or config.get("INGEST_FLUSH_ROWS", 20000)
+        if memory_ceiling is None:
+            memory_ceiling = config.get("INGEST_MEMORY_CEILING_MB", 512) * 1024 * 1024
+        self.memory_ceiling = memory_ceiling
+        self.sheds = 0
+        self.touched = {}
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is not None:
+            self.rollback()
+        self.lookups.clear()
+
+    def touch(self, season_id: int, weeks: Iterable[int]) -> None:
+        """
+        Mark weeks of a season as changed, so their aggregates are refreshed on the next commit().
+        :param season_id: The ID of the season.
+        :param weeks: The weeks whose matchups were written.
+        """
+        weeks = set(weeks)
+        if weeks:
+            self.touched.setdefault(int(season_id), set()).update(weeks)
+
+    def checkpoint(self) -> None:
+        """
+        Write the pending rows if there are enough of them, and shed memory if the process is over the ceiling.
+        Nothing is committed.
+        """
+        if self.writer.pending() >= self.flush_rows:
+            self.writer.flush()
+        if self.memory_ceiling and rss_bytes() > self.memory_ceiling:
+            self.shed()
+
+    def shed(self) -> None:
+        """
+        Write every pending row and drop everything the run only keeps to save queries, i.e. the lookup cache and the
+        session's clean objects. Lookups are answered from the database again afterwards, which sees the rows just
+        written since they are in the same transaction.
+        """
+        self.writer.flush()
+        self.lookups.clear()
+        # The flush left nothing new or dirty in the session, so none of its objects have unsaved changes
+        self.session.expunge_all()
+        gc.collect()
+        self.sheds += 1
+        current_app.logger.warning(
+            f"Ingestion went over its memory ceiling, now using {rss_bytes() // (1024 * 1024)}MB"
+        )
+
+    def commit(self) -> None:
+        """
+        Write every pending row, refresh the aggregates of the touched seasons and bump their leagues' data_version,
+        then commit and empty the session so the next chunk starts from nothing. ORM objects loaded before a commit
+        are detached by it, so reload anything still needed by its ID.
+        """
+        self.writer.flush()
+        if self.touched:
+            leagues = refresh_aggregates(self.touched, self.writer)
+            bump_data_version(leagues, self.session)
+            self.touched = {}
+        with span("commit"):
+            self.session.commit()
+        self.session.expunge_all()
+
+    def rollback(self) -> None:
+        """
+        Throw away the pending rows and roll back.
+        """
+        self.writer = BulkWriter(self.writer.batch_size, self.session)
+        self.session.rollback()
+        self.lookups.clear()
+        self.touched = {}
@@ -1,5 +1,6 @@
 from sqlalchemy import func
 
+from fantasyApp.sleeper_data.lookups import LookupCache
 from fantasyApp.sleeper_data.utils import SleeperAPI
 from fantasyApp.models import User
 from fantasyApp import db
@@ -19,16 +20,20 @@ def add_unregistered_user(user_id: int, username: str) -> None:
     db.session.commit()
 
 
-def add_users_from_season(season_id: int) -> dict:
+def add_users_from_season(season_id: int, lookups: LookupCache = None) -> dict:
     """
     Add users from a season to the database.
     :param season_id: The ID of the season.
+    :param lookups: The LookupCache shared by the ingestion, a new one is created if not given.
     :return: A dictionary mapping user IDs to team names and whether they are the commissioner.
     """
+    lookups = lookups or LookupCache()
     # Fetch the users from the season
     users_data = SleeperAPI.fetch_league_users(season_id)
     team_map = {}
     if users_data:  # If the season has users
+        # Check which users are in our database with one query
+        lookups.prefetch(User, (user_data["user_id"] for user_data in users_data))
         for user_data in users_data:
             # Grab user info to map to teams
             user_id = user_data["user_id"]
@@ -41,11 +46,11 @@ def add_users_from_season(season_id: int) -> dict:
                 commish_value = False
             team_map[user_id]["commish"] = commish_value
             # Check if the user exists in our database
-            user = User.query.filter_by(id=user_id).first()
-            if user:
+            if lookups.exists(User, user_id):
                 continue
             else:
                 add_unregistered_user(user_id, user_data["display_name"])
+                lookups.add(User, user_id)
     return team_map
 
 
@@ -58,9 +63,6 @@ class NewUser:
     :ivar email: The email of the user.
     :ivar password: The password of the user.
     """
-    def __init__(self, user):
-        self.user = user
-        self.user_id = user.get("user_id")
 
     def __init__(self, username: str, email: str, password: str) -> None:
         self.username = username.lower()
@@ -80,21 +82,23 @@ class NewUser:
             user.password = self.password
             user.registered = True
             self.user_id = user.id
-        else:  # Otherwise create a new user
+        else:  # Otherwise create a new user with their Sleeper user ID
+            self.user = SleeperAPI.fetch_user(self.username)
             db.session.add(self.create_registered_db_item(self.email, self.password))
         db.session.commit()
 
-    def create_unregistered_db_item(self) -> User:
+    @staticmethod
+    def create_unregistered_row(user: dict) -> dict:
         """
-        Create an unregistered user item for the database.
-        :return: A User object with only an id and username.
+        Create an unregistered user row for a BulkWriter.
+        :param user: The user's data from a league's users in the Sleeper API.
+        :return: The column values for a User with only an id and username.
         """
-        user = User(
-            id=self.user.get("user_id"),
-            username=self.user.get("username").lower,
-            registered=False,
-        )
-        return user
+        return {
+            "id": int(user.get("user_id")),
+            "username": user.get("display_name").lower(),
+            "registered": False,
+        }
 
     def create_registered_db_item(self, email: str, password: str) -> User:
         """
@@ -104,8 +108,8 @@ class NewUser:
         :return: A User object with an id, username, email, password, and registered status.
         """
         user = User(
-            id=self.user.get("user_id"),
-            username=self.user.get("username").lower,
+            id=int(self.user.get("user_id")),
+            username=self.user.get("username").lower(),
             email=email,
             password=password,
             registered=True,
@@ -1,24 +1,164 @@
-import requests
+import codecs
+import json
+import re
+import threading
+import time
 from collections import defaultdict
-from typing import Union, Dict, List, Any, Optional
+from typing import Union, Dict, List, Any, Optional, Iterable, Iterator, Tuple
+
+from flask import current_app, has_app_context
+
+from fantasyApp.sleeper_data.cache import ResponseCache
+from fantasyApp.sleeper_data.concurrency import SingleFlight, fan_out
+from fantasyApp.sleeper_data.fixtures import FixtureStore, REPLAY
+from fantasyApp.sleeper_data import instrumentation, staging
+from fantasyApp.sleeper_data.ratelimit import RateLimiter
+from fantasyApp.sleeper_data.transport import SleeperTransport, endpoint_label
+
+DEFAULT_BASE_URL = "https://api.sleeper.app/v1/"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
 
 
 class SleeperAPI:
     """
     A class to represent the Sleeper API and fetch data from it.
+    All requests go through one shared SleeperTransport so connections are kept alive and reused between calls, and
+    responses are kept in an on-disk ResponseCache so finished seasons are only ever fetched once. Requests that do go
+    to the network wait their turn on a RateLimiter shared by every worker on the node. In record or replay mode,
+    responses are also saved to or served from a FixtureStore. Concurrent requests for the same endpoint within a
+    process are coalesced into one. During ingestion every payload fetched is also staged (see staging.capture), and
+    a rebuild serves them back from staging instead of the network.
     """
-    BASE_URL = "https://api.sleeper.app/v1/"
+
+    BASE_URL = DEFAULT_BASE_URL
+
+    _lock = threading.Lock()
+    _configured = False
+    _transport = None
+    _cache = None
+    _fixtures = None
+    _in_flight = SingleFlight()
+
+    @classmethod
+    def configure(cls, config: Dict[str, Any] = None) -> None:
+        """
+        Set up the base url, transport, rate limiter, response cache and fixtures from the app config. This happens
+        automatically the first time anything is fetched, call it again to pick up a different config.
+        :param config: The config to use, defaults to the current app's config.
+        """
+        if config is None:
+            config = current_app.config if has_app_context() else {}
+        with cls._lock:
+            cls.BASE_URL = config.get("SLEEPER_BASE_URL") or DEFAULT_BASE_URL
+            transport = SleeperTransport.from_config(config)
+            transport.throttle = RateLimiter.from_config(config).acquire
+            cls._transport = transport
+            cls._cache = ResponseCache.from_config(config)
+            cls._fixtures = FixtureStore.from_config(config)
+            cls._configured = True
+
+    @classmethod
+    def get_transport(cls) -> SleeperTransport:
+        """
+        Get the shared transport, configuring the API from the app config the first time it is needed.
+        :return: The shared SleeperTransport.
+        """
+        if not cls._configured:
+            cls.configure()
+        return cls._transport
+
+    @classmethod
+    def get_cache(cls) -> Optional[ResponseCache]:
+        """
+        Get the shared response cache, configuring the API from the app config the first time it is needed.
+        :return: The shared ResponseCache, or None if caching is turned off.
+        """
+        if not cls._configured:
+            cls.configure()
+        return cls._cache
+
+    @classmethod
+    def get_fixtures(cls) -> Optional[FixtureStore]:
+        """
+        Get the fixture store, configuring the API from the app config the first time it is needed.
+        :return: The FixtureStore in record or replay mode, or None when talking to the live API.
+        """
+        if not cls._configured:
+            cls.configure()
+        return cls._fixtures
+
+    @classmethod
+    def cache_stats(cls) -> Dict[str, int]:
+        """
+        Get the hit/miss counters of the shared response cache.
+        :return: A dictionary with hits, misses, entries and bytes, or an empty dictionary if caching is turned off.
+        """
+        cache = cls.get_cache()
+        return cache.stats() if cache else {}
+
+    @classmethod
+    def latency_stats(cls) -> Dict[str, Dict[str, float]]:
+        """
+        Get the per-endpoint latency counters of the shared transport.
+        :return: A dictionary mapping endpoint templates to their call counts and timings.
+        """
+        return cls.get_transport().stats()
+
+    @classmethod
+    def coalesced_requests(cls) -> int:
+        """
+        Get the number of requests that were served by another thread's identical in-flight request.
+        :return: The number of coalesced requests.
+        """
+        return cls._in_flight.shared
 
     @staticmethod
-    def fetch_data(endpoint: str) -> Optional[Dict, List[Dict]]:
+    def fetch_data(endpoint: str) -> Optional[Union[Dict, List[Dict]]]:
         """
-        General method to fetch data from the Sleeper API.
+        General method to fetch data from the Sleeper API. If another thread is already fetching the same endpoint
+        this waits for that request and shares its result, which callers must not modify. Either way the payload is
+        staged and the request recorded for the caller's own ingestion, which may not be the one that made it.
         :param endpoint: The endpoint to fetch data from.
-        :return: The JSON data returned from the API as a dictionary.
+        :return: The JSON data returned from the API as a dictionary, or None if the request failed.
         """
-        url = f"{SleeperAPI.BASE_URL}/{endpoint}"
-        response = requests.get(url)
-        return response.json() if response.status_code == 200 else None
+        if staging.replaying():
+            return staging.replayed(endpoint)
+        start = time.perf_counter()
+        data, shared = SleeperAPI._in_flight.do(
+            endpoint, SleeperAPI._fetch_data, endpoint
+        )
+        if shared:
+            # The transport only counted the request for the ingestion that made it
+            instrumentation.record_request(
+                endpoint_label(endpoint), time.perf_counter() - start, data is None
+            )
+        staging.stage(endpoint, data)
+        return data
+
+    @staticmethod
+    def _fetch_data(endpoint: str) -> Optional[Union[Dict, List[Dict]]]:
+        fixtures = SleeperAPI.get_fixtures()
+        if fixtures and fixtures.mode == REPLAY:
+            start = time.perf_counter()
+            data = fixtures.replay(endpoint)
+            SleeperAPI.get_transport().record(
+                endpoint_label(endpoint), time.perf_counter() - start, data is None
+            )
+        else:
+            cache = SleeperAPI.get_cache()
+            data = cache.get(endpoint) if cache else None
+            if data is None:
+                url = f"{SleeperAPI.BASE_URL.rstrip('/')}/{endpoint}"
+                data = SleeperAPI.get_transport().get_json(
+                    url, endpoint_label(endpoint)
+                )
+                if cache and data is not None:
+                    cache.put(endpoint, data)
+            if fixtures and data is not None:
+                fixtures.save(endpoint, data)
+        return data
 
     @staticmethod
     def fetch_user(username: str) -> dict:
@@ -79,6 +219,66 @@ class SleeperAPI:
         """
         return SleeperAPI.fetch_data(f"league/{league_id}/matchups/{week}")
 
+    @staticmethod
+    def fetch_matchups_batch(league_id: int, weeks: List[int]) -> List[list[dict]]:
+        """
+        Fetch the matchups for several weeks of a league at once. The weeks are fetched concurrently on a bounded
+        worker pool, so this takes about as long as the slowest week instead of the sum of all of them.
+        :param league_id: The sleeper ID of the league
+        :param weeks: The week numbers to fetch matchups for
+        :return: A list with the matchup data for each week, in the same order as weeks.
+        """
+        return fan_out(SleeperAPI.fetch_matchups, [(league_id, week) for week in weeks])
+
+    @staticmethod
+    def fetch_transactions(league_id: int, week: int) -> list[dict]:
+        """
+        This retrieves all transactions in a league for a given week, Sleeper calls the week a leg. Each dictionary
+        is a trade, waiver claim, free agent move or commissioner move.
+        adds/drops: Maps each player_id added or dropped to the roster_id that added or dropped them
+        draft_picks: The picks traded, each with its season, round, original roster_id, previous_owner_id and owner_id
+        waiver_budget: The FAAB traded, each with its sender, receiver and amount
+        created/status_updated: Millisecond epoch timestamps
+        :param league_id: The sleeper ID of the league
+        :param week: The week number to fetch transactions for
+        :return: Returns a list of dictionaries containing each transaction processed that week.
+        """
+        return SleeperAPI.fetch_data(f"league/{league_id}/transactions/{week}")
+
+    @staticmethod
+    def fetch_transactions_batch(league_id: int, weeks: List[int]) -> List[list[dict]]:
+        """
+        Fetch the transactions for several weeks of a league at once, concurrently like fetch_matchups_batch.
+        :param league_id: The sleeper ID of the league
+        :param weeks: The week numbers to fetch transactions for
+        :return: A list with the transactions for each week, in the same order as weeks.
+        """
+        return fan_out(
+            SleeperAPI.fetch_transactions, [(league_id, week) for week in weeks]
+        )
+
+    @staticmethod
+    def fetch_stats(year: int, week: int) -> dict:
+        """
+        Fetch every NFL player's stat line for a regular season week. The stats are the same for every league, only
+        the points they're worth depend on the league's scoring settings.
+        :param year: The NFL season (year)
+        :param week: The week number
+        :return: A dictionary mapping each player_id to their stats that week, keyed on Sleeper's stat names, e.g.
+        rec, rec_yd and pass_td. Stats a player didn't record are left out.
+        """
+        return SleeperAPI.fetch_data(f"stats/nfl/regular/{year}/{week}")
+
+    @staticmethod
+    def fetch_stats_batch(year: int, weeks: List[int]) -> List[dict]:
+        """
+        Fetch the stats for several weeks of an NFL season at once, concurrently like fetch_matchups_batch.
+        :param year: The NFL season (year)
+        :param weeks: The week numbers to fetch stats for
+        :return: A list with the stats for each week, in the same order as weeks.
+        """
+        return fan_out(SleeperAPI.fetch_stats, [(year, week) for week in weeks])
+
     @staticmethod
     def fetch_playoff_bracket(league_id: int) -> list[dict]:
         """
@@ -143,6 +343,15 @@ class SleeperAPI:
         """
         return SleeperAPI.fetch_data(f"draft/{draft_id}/picks")
 
+    @staticmethod
+    def fetch_nfl_state() -> dict:
+        """
+        Fetches the current state of the NFL season from the Sleeper API.
+        :return: A dictionary containing the current week, season (year), season_type ("pre", "regular", "post" or
+        "off") and more.
+        """
+        return SleeperAPI.fetch_data("state/nfl")
+
     @staticmethod
     def fetch_players() -> dict:
         """
@@ -151,6 +360,104 @@ class SleeperAPI:
         """
         return SleeperAPI.fetch_data(f"players/nfl")
 
+    @staticmethod
+    def stream_data(endpoint: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream an endpoint that returns one large JSON object, yielding it one key at a time as the response comes in
+        so the whole document never has to be held in memory. This skips the response cache but still records and
+        replays fixtures.
+        :param endpoint: The endpoint to fetch data from.
+        :return: An iterator of (key, value) pairs from the top level object. Nothing is yielded if the request failed.
+        """
+        fixtures = SleeperAPI.get_fixtures()
+        if fixtures and fixtures.mode == REPLAY:
+            yield from iter_json_object(
+                fixtures.iter_chunks(endpoint, STREAM_CHUNK_SIZE)
+            )
+            return
+        url = f"{SleeperAPI.BASE_URL.rstrip('/')}/{endpoint}"
+        response = SleeperAPI.get_transport().request(
+            url, endpoint_label(endpoint), stream=True
+        )
+        if response is None:
+            return
+        try:
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            if fixtures:
+                chunks = fixtures.record_chunks(endpoint, chunks)
+            yield from iter_json_object(chunks)
+        finally:
+            response.close()
+
+    @staticmethod
+    def stream_players() -> Iterator[Tuple[str, dict]]:
+        """
+        Streams all players in the NFL from the Sleeper API one at a time. Should only be called once per day
+        :return: An iterator of (player_id, player data) pairs.
+        """
+        return SleeperAPI.stream_data("players/nfl")
+
+
+def iter_json_object(chunks: Iterable[bytes]) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parse a JSON object from a stream of byte chunks, yielding each key and value as soon as it has been
+    read. Only the current, partially read chunk is ever buffered.
+    :param chunks: The raw bytes of a JSON document whose top level is an object, in any sized pieces.
+    :return: An iterator of (key, value) pairs in document order.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer, pos = "", 0
+
+    def fill() -> None:
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Unexpected end of JSON document")
+        buffer, pos = buffer[pos:] + text.decode(chunk), 0
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            fill()
+
+    def next_value() -> Any:
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # The value is only safe to take once a delimiter follows it, otherwise a number could be cut in half
+                after = _WHITESPACE.match(buffer, end).end()
+                if after < len(buffer) and buffer[after] in ",}]:":
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                pass
+            fill()
+
+    if next_char() != "{":
+        raise ValueError("Expected a JSON object")
+    pos += 1
+    if next_char() == "}":
+        return
+    while True:
+        key = next_value()
+        if next_char() != ":":
+            raise ValueError(f"Expected ':' after {key!r}")
+        pos += 1
+        yield key, next_value()
+        separator = next_char()
+        pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' after {key!r}")
+
 
 def preprocess_bracket_data(league_id: int) -> dict:
     """
@@ -158,15 +465,17 @@ def preprocess_bracket_data(league_id: int) -> dict:
     :param league_id: The sleeper ID of the league
     :return: A dictionary containing the bracket data for the league.
     """
-    playoff_bracket = SleeperAPI.fetch_playoff_bracket(league_id)
-    consolation_bracket = SleeperAPI.fetch_consolation_bracket(league_id)
+    playoff_bracket, consolation_bracket = fan_out(
+        lambda fetch: fetch(league_id),
+        [(SleeperAPI.fetch_playoff_bracket,), (SleeperAPI.fetch_consolation_bracket,)],
+    )
 
     bracket_data = defaultdict(dict)
 
-    for match in playoff_bracket:
+    for match in playoff_bracket or []:
         process_matchup(match, bracket_data, "playoff")
 
-    for match in consolation_bracket:
+    for match in consolation_bracket or []:
         process_matchup(match, bracket_data, "consolation")
 
     return bracket_data
@@ -0,0 +1,226 @@
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import Table, UniqueConstraint, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from fantasyApp import db
+from fantasyApp.sleeper_data.instrumentation import record_rows, span
+
+# The dialects whose insert() supports ON CONFLICT, anything else gets a plain insert
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+# How many natural keys are looked up per query when resolving Refs
+REF_CHUNK_SIZE = 500
+
+
+class Ref(NamedTuple):
+    """
+    A foreign key to a row whose ID is assigned by the database, e.g. a team, given by the row's natural key instead.
+    The BulkWriter swaps it for the ID when the row holding it is written, by which time the row it points at has
+    been, since parent tables are always written first.
+    :ivar model: The model class of the row pointed at, e.g. Team.
+    :ivar key: The values of the model's natural_key() columns, in order, e.g. (season_id, roster_id).
+    """
+
+    model: type
+    key: Tuple[Hashable, ...]
+
+
+def natural_key(table: Table) -> Optional[List[str]]:
+    """
+    Get the columns that identify a row of a table whose ID is assigned by the database.
+    :param table: The table.
+    :return: The columns of the table's unique constraint, or None if it doesn't have one.
+    """
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            return [column.name for column in constraint.columns]
+    return None
+
+
+class RowBuffer:
+    """
+    Collects rows in memory without touching the database, so they can be built on a worker thread and handed to a
+    BulkWriter on the thread that owns the session. It has the same add() as BulkWriter, so the builders can be given
+    either one.
+    :ivar rows: The queued (model, row, update) tuples, in the order they were added.
+    """
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def add(self, model: type, row: Dict, update: bool = True) -> None:
+        """
+        Queue a row.
+        :param model: The model class the row belongs to, e.g. MatchupPlayer.
+        :param row: A dictionary of column values.
+        :param update: Passed on to BulkWriter.add.
+        """
+        self.rows.append((model, row, update))
+
+
+class BulkWriter:
+    """
+    An ingestion writer that accumulates rows as plain dictionaries and writes them with SQLAlchemy Core insert()
+    executemany in batches, skipping the ORM unit of work entirely. Whenever a batch is written, every pending table
+    is written in foreign key order so parent rows always land before their children. Nothing is committed, that is
+    left to the caller.
+
+    Rows are upserted on their primary keys with INSERT ... ON CONFLICT, so ingestion can be re-run or resumed after a
+    failure without primary key conflicts. A conflicting row is only rewritten if one of its values actually changed.
+    Rows of tables whose ID the database assigns (teams, divisions, matchups, draft picks) are written without it and
+    upserted on their natural key instead, and rows point at them with a Ref.
+    :ivar batch_size: How many rows of a table to accumulate before writing.
+    :ivar session: The session whose transaction the rows are written in.
+    :ivar upsert: Whether to upsert, False writes plain inserts that fail on existing rows.
+    :ivar rows_written: The number of rows sent to the database so far, per table name.
+    """
+
+    def __init__(
+        self, batch_size: int = None, session=None, upsert: bool = True
+    ) -> None:
+        self.batch_size = batch_size or current_app.config.get(
+            "INGEST_BATCH_SIZE", 5000
+        )
+        self.session = session or db.session
+        self.upsert = upsert
+        self.rows_written = defaultdict(int)
+        self._pending = defaultdict(list)
+
+    def add(self, model: type, row: Dict, update: bool = True) -> None:
+        """
+        Queue a row to be inserted.
+        :param model: The model class the row belongs to, e.g. MatchupPlayer.
+        :param row: A dictionary of column values.
+        :param update: Whether to overwrite an existing row with the same primary key. False keeps the existing row,
+        e.g. for users who may have registered since.
+        """
+        pending = self._pending[(model.__table__, update)]
+        pending.append(row)
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def extend(self, buffer: RowBuffer) -> None:
+        """
+        Queue every row collected in a RowBuffer, then empty it.
+        :param buffer: The RowBuffer to take the rows from.
+        """
+        for model, row, update in buffer.rows:
+            self.add(model, row, update)
+        buffer.rows = []
+
+    def flush(self) -> None:
+        """
+        Write every pending row, parent tables first. Pending ORM objects (e.g. the leagues the rows point at) are
+        flushed before them, since Core inserts don't autoflush the session.
+        """
+        # The IDs of the rows Refs point at, looked up once per flush
+        ids = {}
+        with span("flush"):
+            self.session.flush()
+            for table in db.metadata.sorted_tables:
+                for update in (True, False):
+                    rows = self._pending.pop((table, update), None)
+                    if rows:
+                        rows = self.resolve(table, rows, ids)
+                    if rows:
+                        with span(f"write.{table.name}"):
+                            self.session.execute(
+                                self.statement(table, rows[0], update), rows
+                            )
+                        self.rows_written[table.name] += len(rows)
+                        record_rows(table.name, len(rows))
+
+    def resolve(
+        self, table: Table, rows: List[Dict], ids: Dict[type, Dict]
+    ) -> List[Dict]:
+        """
+        Swap every Ref in a batch of rows for the ID of the row it points at. A Ref to a row that isn't in the database
+        becomes None, or drops its row if the column can't be null.
+        :param table: The table being written.
+        :param rows: The rows, their Refs are replaced in place.
+        :param ids: The IDs already looked up this flush, by model and natural key, new ones are added to it.
+        :return: The rows that can be written.
+        """
+        wanted = defaultdict(set)
+        for row in rows:
+            for value in row.values():
+                if isinstance(value, Ref) and value.key not in ids.get(value.model, {}):
+                    wanted[value.model].add(value.key)
+        for model, keys in wanted.items():
+            ids.setdefault(model, {}).update(self.lookup_ids(model, keys))
+        resolved = []
+        for row in rows:
+            for name, value in row.items():
+                if isinstance(value, Ref):
+                    row[name] = ids[value.model].get(value.key)
+                    if row[name] is None and not table.c[name].nullable:
+                        break
+            else:
+                resolved.append(row)
+        if len(resolved) < len(rows):
+            current_app.logger.warning(
+                f"Dropped {len(rows) - len(resolved)} {table.name} rows that point at rows that aren't in the database"
+            )
+        return resolved
+
+    def lookup_ids(self, model: type, keys: Iterable[Tuple]) -> Dict[Tuple, int]:
+        """
+        Look up the IDs of rows by their natural key.
+        :param model: The model class of the rows.
+        :param keys: The natural keys.
+        :return: A dictionary mapping each natural key that is in the database to its row's ID.
+        """
+        table = model.__table__
+        columns = [table.c[name] for name in natural_key(table)]
+        (id_column,) = table.primary_key.columns
+        keys = list(keys)
+        ids = {}
+        for start in range(0, len(keys), REF_CHUNK_SIZE):
+            rows = self.session.execute(
+                select(id_column, *columns).where(
+                    tuple_(*columns).in_(keys[start : start + REF_CHUNK_SIZE])
+                )
+            )
+            for row_id, *key in rows:
+                ids[tuple(key)] = row_id
+        return ids
+
+    def statement(self, table: Table, row: Dict, update: bool = True):
+        """
+        Build the insert statement for a batch of rows.
+        :param table: The table being written.
+        :param row: One of the rows, its keys are the columns being written.
+        :param update: Whether conflicting rows are overwritten or left alone.
+        :return: An upsert if the database supports it, otherwise a plain insert.
+        """
+        insert = UPSERT_DIALECTS.get(self.session.get_bind().dialect.name)
+        if not self.upsert or insert is None:
+            return table.insert()
+        statement = insert(table)
+        keys = [column.name for column in table.primary_key]
+        if any(name not in row for name in keys) and natural_key(table):
+            # The database assigns the ID, so the row is matched on its natural key
+            keys = natural_key(table)
+        columns = [name for name in row if name not in keys]
+        if not update or not columns:
+            return statement.on_conflict_do_nothing(index_elements=keys)
+        return statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: statement.excluded[name] for name in columns},
+            # Leave rows that haven't changed alone
+            where=or_(
+                *(
+                    table.c[name].is_distinct_from(statement.excluded[name])
+                    for name in columns
+                )
+            ),
+        )
+
+    def pending(self) -> int:
+        """
+        The number of rows waiting to be written.
+        :return: The number of queued rows across all tables.
+        """
+        return sum(len(rows) for rows in self._pending.values())
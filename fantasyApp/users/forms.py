@@ -6,6 +6,7 @@ from wtforms import StringField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from fantasyApp.models import User
 from fantasyApp.sleeper_data.utils import SleeperAPI
+from fantasyApp.sleeper_data.ratelimit import request_priority, PRIORITY_INTERACTIVE
 
 
 class RegistrationForm(FlaskForm):
@@ -30,7 +31,9 @@ class RegistrationForm(FlaskForm):
                 "This username is already claimed on Fantasy Fieldhouse"
             )
         else:
-            user_data = SleeperAPI.fetch_user(username.data)
+            # Someone is waiting on this page, so jump ahead of any background ingestion
+            with request_priority(PRIORITY_INTERACTIVE):
+                user_data = SleeperAPI.fetch_user(username.data)
             if user_data is None:
                 raise ValidationError("This username does not exist on Sleeper")
 
@@ -1,8 +1,17 @@
-from flask import Blueprint, redirect, url_for, flash, render_template, request
+from flask import (
+    Blueprint,
+    redirect,
+    url_for,
+    flash,
+    render_template,
+    request,
+    jsonify,
+    abort,
+)
 from flask_login import current_user, login_user, logout_user, login_required
 
 from fantasyApp import bcrypt, db
-from fantasyApp.models import User, Post
+from fantasyApp.models import User, Post, OnboardingJob
 from fantasyApp.users.forms import (
     RegistrationForm,
     LoginForm,
@@ -12,8 +21,7 @@ from fantasyApp.users.forms import (
 )
 from fantasyApp.users.utils import save_picture, send_reset_email
 from fantasyApp.sleeper_data.users import NewUser
-from fantasyApp.sleeper_data.leagues import check_for_new_leagues
-
+from fantasyApp.sleeper_data.onboarding import onboard_user
 
 users = Blueprint("users", __name__)
 
@@ -29,36 +37,45 @@ def register():
         )
         # Create a new user or register an existing user
         user_id = NewUser(form.username.data, form.email.data, hashed_password).user_id
-        # Build out the user's profile by adding all their data to the database
-        check_for_new_leagues(user_id)
-        flash(f"Your account has been created! You are now able to log in", "success")
-        return redirect(url_for("users.login"))
+        # Log them straight in, only they may watch their profile being built
+        login_user(db.session.get(User, user_id))
+        # Build out the user's profile in the background, the build profile page shows its progress
+        job = OnboardingJob(user=user_id)
+        db.session.add(job)
+        db.session.commit()
+        onboard_user.delay(job.id, user_id)
+        flash(
+            f"Your account has been created! Now we're pulling in your leagues",
+            "success",
+        )
+        return redirect(url_for("users.build_profile", job_id=job.id))
     return render_template("register.html", title="Register", form=form)
 
 
-# @users.route("/register", methods=["GET", "POST"])
-# def register():
-#     if current_user.is_authenticated:
-#         return redirect(url_for("main.home"))
-#     form = RegistrationForm()
-#     if form.validate_on_submit():
-#         hashed_password = bcrypt.generate_password_hash(form.password.data).decode(
-#             "utf-8"
-#         )
-#         # Create a new user
-#         user_id = register_user(form.username.data, form.email.data, hashed_password)
-#         return redirect(url_for("users.build_profile", user_id=user_id))
-#     return render_template("register.html", title="Register", form=form)
-
-
-# @users.route("/register/<string:user_id>", methods=["GET", "POST"])
-# def build_profile(user_id):
-#     if current_user.is_authenticated:
-#         return redirect(url_for("main.home"))
-#     check_for_new_leagues.apply_async(args=[user_id])
-#     flash(f"Your account has been created! You are now able to log in", "success")
-#     return redirect(url_for("users.login"))
-#     return render_template("build_profile.html", title="Build Profile")
+def own_job_or_403(job_id: int) -> OnboardingJob:
+    """
+    Get one of the current user's onboarding jobs.
+    :param job_id: The ID of the job.
+    :return: The OnboardingJob, aborts with a 404 if there is no such job or a 403 if it is someone else's.
+    """
+    job = db.get_or_404(OnboardingJob, job_id)
+    if job.user != current_user.id:
+        abort(403)
+    return job
+
+
+@users.route("/register/<int:job_id>")
+@login_required
+def build_profile(job_id):
+    job = own_job_or_403(job_id)
+    return render_template("build_profile.html", title="Build Profile", job=job)
+
+
+@users.route("/register/<int:job_id>/status")
+@login_required
+def onboarding_status(job_id):
+    job = own_job_or_403(job_id)
+    return jsonify(job.to_dict())
 
 
 @users.route("/login", methods=["GET", "POST"])
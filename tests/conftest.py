@@ -0,0 +1,80 @@
+import logging
+import os
+from datetime import datetime
+
+import pytest
+
+from config import Config
+from fantasyApp import create_app, db
+from fantasyApp.analytics.cache import cache
+from fantasyApp.models import League, Player
+from fantasyApp.sleeper_data.leagues import check_for_new_leagues
+from fantasyApp.sleeper_data.utils import SleeperAPI
+from tests import sleeper_league
+
+YEAR = datetime.now().year
+# Real 19 digit league IDs, too long to have anything appended to them in a 64 bit integer, newest season first
+SEASONS = (
+    (1048277353727209472, YEAR),
+    (917432846812864512, YEAR - 1),
+    (784573398291869696, YEAR - 2),
+)
+USER_ID = "500"
+TEAMS = 4
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    An app with its own SQLite database that replays Sleeper fixtures instead of going to the network, and runs
+    Celery tasks in the calling process.
+    """
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(tmp_path / "test.db")
+        SECRET_KEY = "test"
+        WTF_CSRF_ENABLED = False
+        SLEEPER_API_MODE = "replay"
+        SLEEPER_FIXTURE_DIR = str(tmp_path / "fixtures")
+        SLEEPER_CACHE_ENABLED = False
+        SLEEPER_RATE_LIMIT_PATH = None
+        PLAYOFF_ODDS_TRIALS = 2000
+        CELERY = {**Config.CELERY, "task_always_eager": True}
+
+    app = create_app(TestConfig)
+    app.logger.setLevel(logging.ERROR)
+    with app.app_context():
+        SleeperAPI.configure()
+        cache.invalidate()
+        yield app
+        db.session.remove()
+    cache.invalidate()
+
+
+@pytest.fixture
+def fixtures(app):
+    """
+    Record a three season league as Sleeper fixtures, with the Player table seeded with its players.
+    :return: Each season's league details, newest first.
+    """
+    leagues = sleeper_league.build(
+        app.config["SLEEPER_FIXTURE_DIR"], SEASONS, USER_ID, TEAMS
+    )
+    for player, position in sleeper_league.players(TEAMS).items():
+        db.session.add(
+            Player(
+                id=player, first_name="Player", last_name=str(player), position=position
+            )
+        )
+    db.session.commit()
+    return leagues
+
+
+@pytest.fixture
+def league(fixtures):
+    """
+    Ingest the recorded league.
+    :return: The ID of the league in our database.
+    """
+    check_for_new_leagues(USER_ID)
+    return db.session.scalars(db.select(League.id)).one()
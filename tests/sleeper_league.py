@@ -0,0 +1,366 @@
+import random
+from typing import Dict, List, Sequence, Tuple
+
+from fantasyApp.sleeper_data.fixtures import FixtureStore
+
+# Each roster's players, in lineup order, the first five start along with the roster's team defense
+ROSTER_POSITIONS = ("QB", "RB", "WR", "TE", "RB", "WR")
+LINEUP = ["QB", "RB", "WR", "TE", "FLEX", "DEF", "BN", "BN"]
+STARTERS = 5
+# Each roster's team defense, which Sleeper IDs by the team's abbreviation and which isn't in the Player table
+DEFENSES = ("BUF", "SF", "DAL", "PHI", "MIA", "DET", "BAL", "GB")
+# Every league shares the same users, so owners carry over from season to season
+FIRST_USER = 9
+# A user who made a trade but has since left the league, only reachable through user/<id>
+FORMER_USER = "77"
+# Transaction IDs are as long as league IDs
+TRANSACTION_BASE = 1_050_000_000_000_000_000
+
+
+def player_id(roster_id: int, slot: int) -> str:
+    """
+    Get the sleeper ID of one of a roster's players, every season's rosters have the same players.
+    :param roster_id: The roster ID.
+    :param slot: The player's index in ROSTER_POSITIONS.
+    :return: The player's sleeper ID.
+    """
+    return str(1000 + roster_id * 10 + slot)
+
+
+def roster(roster_id: int) -> List[str]:
+    """
+    Get the sleeper IDs of a roster's players and its team defense, every season's rosters have the same players.
+    :param roster_id: The roster ID.
+    :return: The IDs, in ROSTER_POSITIONS order with the defense last.
+    """
+    return [player_id(roster_id, slot) for slot in range(len(ROSTER_POSITIONS))] + [
+        DEFENSES[roster_id - 1]
+    ]
+
+
+def players(teams: int) -> Dict[int, str]:
+    """
+    Get every rostered player and their position, for seeding the Player table.
+    :param teams: The number of teams in the league.
+    :return: A dictionary mapping each player's sleeper ID to their position.
+    """
+    return {
+        int(player_id(roster_id, slot)): position
+        for roster_id in range(1, teams + 1)
+        for slot, position in enumerate(ROSTER_POSITIONS)
+    }
+
+
+def pairings(teams: int, week: int) -> List[Tuple[int, int]]:
+    """
+    Get a week's matchups from a round robin, so every pair of teams meets.
+    :param teams: The number of teams, an even number.
+    :param week: The week.
+    :return: The pairs of roster IDs playing each other.
+    """
+    rotation = list(range(2, teams + 1))
+    shift = (week - 1) % len(rotation)
+    order = [1] + rotation[shift:] + rotation[:shift]
+    return [(order[i], order[teams - 1 - i]) for i in range(teams // 2)]
+
+
+def league_payload(
+    league_id: int, year: int, previous: int, teams: int, regular_weeks: int
+) -> dict:
+    """
+    Build a league's details, as returned by league/<league_id>.
+    """
+    return {
+        "league_id": str(league_id),
+        "name": "Replay League",
+        "season": str(year),
+        "status": "complete",
+        "season_type": "regular",
+        "total_rosters": teams,
+        "previous_league_id": str(previous) if previous else None,
+        "settings": {
+            "start_week": 1,
+            "playoff_week_start": regular_weeks + 1,
+            "playoff_teams": 2,
+            "reserve_slots": 1,
+            "taxi_slots": 0,
+            "pick_trading": 1,
+        },
+        "scoring_settings": {
+            "pass_yd": 0.04,
+            "pass_td": 4,
+            "rush_yd": 0.1,
+            "rush_td": 6,
+            "rec": 1,
+            "rec_yd": 0.1,
+            "rec_td": 6,
+            "bonus_rec_te": 0.5,
+        },
+        "roster_positions": LINEUP,
+        "metadata": {"latest_league_winner_roster_id": "1"},
+    }
+
+
+def week_matchups(
+    teams: int, week: int, regular_weeks: int, rng: random.Random
+) -> List[dict]:
+    """
+    Build a week's matchups, as returned by league/<league_id>/matchups/<week>. In the postseason week the top two
+    rosters play for the title and the bottom two in the consolation bracket, like the brackets say.
+    """
+    if week > regular_weeks:
+        pairs = [(1, 2), (3, 4)]
+    else:
+        pairs = pairings(teams, week)
+    rows = []
+    for matchup_id, pair in enumerate(pairs, start=1):
+        for roster_id in pair:
+            players = roster(roster_id)
+            points = {player: round(rng.uniform(0, 25), 2) for player in players}
+            starters = players[:STARTERS] + players[-1:]
+            rows.append(
+                {
+                    "matchup_id": matchup_id,
+                    "roster_id": roster_id,
+                    "players": players,
+                    "starters": starters,
+                    "players_points": points,
+                    "points": round(sum(points[player] for player in starters), 2),
+                }
+            )
+    return rows
+
+
+def week_transactions(
+    league_id: int, year: int, week: int, transaction_base: int
+) -> List[dict]:
+    """
+    Build a week's transactions, as returned by league/<league_id>/transactions/<week>: a waiver claim, a failed
+    claim, a defense picked up as a free agent, a trade of players, a pick and FAAB, and a commissioner move and a
+    failed trade that are never stored.
+    """
+    base = transaction_base + week * 10
+    created = 1_700_000_000_000 + week * 86_400_000
+
+    def transaction(offset: int, kind: str, status: str, creator: str, **values):
+        return {
+            "transaction_id": str(base + offset),
+            "type": kind,
+            "status": status,
+            "leg": week,
+            "creator": creator,
+            "created": created,
+            "status_updated": created + offset,
+            "roster_ids": values.pop("roster_ids", [1]),
+            "adds": values.pop("adds", None),
+            "drops": values.pop("drops", None),
+            "settings": values.pop("settings", None),
+            "draft_picks": values.pop("draft_picks", []),
+            "waiver_budget": values.pop("waiver_budget", []),
+        }
+
+    return [
+        transaction(
+            1,
+            "waiver",
+            "complete",
+            str(FIRST_USER),
+            adds={player_id(1, 5): 1},
+            drops={player_id(1, 4): 1},
+            settings={"seq": 2, "waiver_bid": 17},
+        ),
+        transaction(
+            2,
+            "waiver",
+            "failed",
+            str(FIRST_USER + 1),
+            roster_ids=[2],
+            adds={player_id(1, 5): 2},
+            settings={"seq": 1, "waiver_bid": 9},
+        ),
+        transaction(3, "free_agent", "complete", str(FIRST_USER + 1), adds={"KC": 2}),
+        transaction(
+            4,
+            "trade",
+            "complete",
+            FORMER_USER,
+            roster_ids=[1, 2],
+            adds={player_id(1, 3): 2, player_id(2, 1): 1},
+            drops={player_id(1, 3): 1, player_id(2, 1): 2},
+            draft_picks=[
+                {
+                    "season": str(year + 1),
+                    "round": 2,
+                    "roster_id": 3,
+                    "previous_owner_id": 1,
+                    "owner_id": 2,
+                }
+            ],
+            waiver_budget=[{"sender": 2, "receiver": 1, "amount": 10}],
+        ),
+        transaction(
+            5, "commissioner", "complete", str(FIRST_USER), adds={player_id(3, 1): 3}
+        ),
+        transaction(
+            6,
+            "trade",
+            "failed",
+            str(FIRST_USER),
+            roster_ids=[1, 2],
+            adds={player_id(1, 2): 2},
+            drops={player_id(1, 2): 1},
+        ),
+    ]
+
+
+def draft_payloads(
+    league_id: int, draft_id: int, year: int, teams: int
+) -> Tuple[List[dict], dict, List[dict]]:
+    """
+    Build a season's startup draft, as returned by league/<league_id>/drafts, draft/<draft_id> and
+    draft/<draft_id>/picks.
+    """
+    draft = {
+        "draft_id": str(draft_id),
+        "league_id": str(league_id),
+        "season": str(year),
+        "status": "complete",
+        "type": "snake",
+        "start_time": 1_690_000_000_000,
+        "settings": {"rounds": 2, "pick_timer": 60},
+        "metadata": {"scoring_type": "ppr"},
+    }
+    slots = {str(slot): slot for slot in range(1, teams + 1)}
+    picks = []
+    for pick_no in range(1, 2 * teams + 1):
+        round_no = (pick_no - 1) // teams + 1
+        slot = (pick_no - 1) % teams + 1
+        if round_no % 2 == 0:
+            slot = teams + 1 - slot
+        picks.append(
+            {
+                "round": round_no,
+                "pick_no": pick_no,
+                "draft_slot": slot,
+                "roster_id": slot,
+                "player_id": player_id(slot, round_no - 1),
+                "is_keeper": None,
+            }
+        )
+    return [draft], {**draft, "slot_to_roster_id": slots}, picks
+
+
+def week_stats(teams: int, rng: random.Random) -> Dict[str, dict]:
+    """
+    Build a week's NFL stats, as returned by stats/nfl/regular/<year>/<week>, for every rostered player and team
+    defense.
+    """
+    stats = {}
+    for player, position in players(teams).items():
+        stats[str(player)] = {
+            "pass_yd": rng.randint(150, 350) if position == "QB" else 0,
+            "pass_td": rng.randint(0, 3) if position == "QB" else 0,
+            "rush_yd": rng.randint(0, 90),
+            "rec": rng.randint(0, 9) if position != "QB" else 0,
+            "rec_yd": rng.randint(0, 120) if position != "QB" else 0,
+            "rec_td": rng.randint(0, 1),
+            "fum_lost": rng.randint(0, 1),
+            "gp": 1,
+        }
+    for defense in DEFENSES[:teams] + ("KC",):
+        stats[defense] = {"def_td": rng.randint(0, 1), "gp": 1}
+    return stats
+
+
+def build(
+    directory: str,
+    seasons: Sequence[Tuple[int, int]],
+    user_id: str = "500",
+    teams: int = 4,
+    regular_weeks: int = 3,
+    seed: int = 1,
+    first_transaction: int = TRANSACTION_BASE,
+) -> List[dict]:
+    """
+    Record a league's history as Sleeper fixtures, so ingestion can replay it without the network.
+    :param directory: The fixture directory.
+    :param seasons: The (league ID, year) of each season, newest first, each season's previous season is the next.
+    :param user_id: The user whose leagues the newest season is listed under.
+    :param teams: The number of teams, an even number of at least four.
+    :param regular_weeks: The number of regular season weeks, the postseason is the week after.
+    :param seed: The random seed for the scores and stats.
+    :param first_transaction: Where the league's transaction IDs start, so two leagues don't share any.
+    :return: Each season's league details, newest first.
+    """
+    fixtures = FixtureStore(directory)
+    rng = random.Random(seed)
+    leagues = []
+    for i, (league_id, year) in enumerate(seasons):
+        previous = seasons[i + 1][0] if i + 1 < len(seasons) else None
+        league = league_payload(league_id, year, previous, teams, regular_weeks)
+        leagues.append(league)
+        fixtures.save(f"league/{league_id}", league)
+        fixtures.save(
+            f"league/{league_id}/users",
+            [
+                {
+                    "user_id": str(user),
+                    "username": f"user{user}",
+                    "display_name": f"User{user}",
+                    "is_owner": user == FIRST_USER,
+                    "metadata": {"team_name": f"Team {user}"},
+                }
+                for user in range(FIRST_USER, FIRST_USER + teams)
+            ],
+        )
+        fixtures.save(
+            f"league/{league_id}/rosters",
+            [
+                {
+                    "roster_id": roster_id,
+                    "owner_id": str(FIRST_USER - 1 + roster_id),
+                    "players": roster(roster_id),
+                    "settings": {"division": None},
+                }
+                for roster_id in range(1, teams + 1)
+            ],
+        )
+        fixtures.save(
+            f"league/{league_id}/winners_bracket",
+            [{"r": 1, "m": 1, "t1": 1, "t2": 2, "w": 1, "l": 2, "p": 1}],
+        )
+        fixtures.save(
+            f"league/{league_id}/losers_bracket",
+            [{"r": 1, "m": 2, "t1": 3, "t2": 4, "w": 3, "l": 4, "p": 3}],
+        )
+        for week in range(1, regular_weeks + 3):
+            played = week <= regular_weeks + 1
+            fixtures.save(
+                f"league/{league_id}/matchups/{week}",
+                week_matchups(teams, week, regular_weeks, rng) if played else [],
+            )
+            fixtures.save(
+                f"league/{league_id}/transactions/{week}",
+                (
+                    week_transactions(
+                        league_id, year, week, first_transaction + 10_000 * i
+                    )
+                    if played
+                    else []
+                ),
+            )
+            fixtures.save(
+                f"stats/nfl/regular/{year}/{week}",
+                week_stats(teams, rng) if played else {},
+            )
+        draft_id = league_id + 1
+        drafts, draft, picks = draft_payloads(league_id, draft_id, year, teams)
+        fixtures.save(f"league/{league_id}/drafts", drafts)
+        fixtures.save(f"draft/{draft_id}", draft)
+        fixtures.save(f"draft/{draft_id}/picks", picks)
+    fixtures.save(f"user/{user_id}/leagues/nfl/{seasons[0][1]}", [leagues[0]])
+    fixtures.save(
+        f"user/{FORMER_USER}",
+        {"user_id": FORMER_USER, "username": "former", "display_name": "Former"},
+    )
+    return leagues
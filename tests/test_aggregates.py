@@ -0,0 +1,114 @@
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import select
+
+from fantasyApp import db
+from fantasyApp.models import (
+    LeagueWeekStats,
+    Matchup,
+    MatchupTeam,
+    OnboardingJob,
+    OwnerStats,
+    Team,
+    TeamSeasonStats,
+    User,
+)
+from fantasyApp.sleeper_data.onboarding import onboard_user
+from tests.conftest import SEASONS, TEAMS, USER_ID
+
+
+def team_games() -> dict:
+    """
+    Work out every team's regular season record the slow way, one matchup at a time.
+    :return: A dictionary mapping each team ID to its wins, losses, points for and points against.
+    """
+    sides = defaultdict(list)
+    for matchup, team, points in db.session.execute(
+        select(MatchupTeam.matchup, MatchupTeam.team, MatchupTeam.total_points)
+        .join(Matchup, Matchup.id == MatchupTeam.matchup)
+        .where(Matchup.matchup_type == "regular")
+    ):
+        sides[matchup].append((team, points))
+    records = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    for (team, points), (opponent, opponent_points) in (
+        pair for pair in sides.values() for pair in (pair, pair[::-1])
+    ):
+        record = records[team]
+        record[0] += points > opponent_points
+        record[1] += points < opponent_points
+        record[2] += points
+        record[3] += opponent_points
+    return records
+
+
+def test_team_season_stats(league):
+    records = team_games()
+    rows = db.session.scalars(select(TeamSeasonStats)).all()
+    assert len(rows) == len(SEASONS) * TEAMS
+    for row in rows:
+        wins, losses, points_for, points_against = records[row.team]
+        assert (row.wins, row.losses, row.ties) == (wins, losses, 0)
+        assert row.games == wins + losses
+        assert row.points_for == pytest.approx(points_for)
+        assert row.points_against == pytest.approx(points_against)
+        # Every team plays once in the postseason, only the final counts
+        assert row.playoff_wins + row.playoff_losses <= 1
+
+
+def assert_owner_totals() -> None:
+    """
+    Check every owner's OwnerStats against the TeamSeasonStats of all of their seasons.
+    """
+    owners = db.session.scalars(select(OwnerStats)).all()
+    assert len(owners) == TEAMS
+    for owner in owners:
+        seasons = db.session.scalars(
+            select(TeamSeasonStats).where(
+                TeamSeasonStats.owner == owner.owner,
+                TeamSeasonStats.league == owner.league,
+            )
+        ).all()
+        assert owner.seasons == len(seasons) == len(SEASONS)
+        assert owner.wins == sum(season.wins for season in seasons)
+        assert owner.losses == sum(season.losses for season in seasons)
+        assert owner.points_for == pytest.approx(
+            sum(season.points_for for season in seasons)
+        )
+        assert owner.high_score == max(season.high_score for season in seasons)
+        assert owner.low_score == min(season.low_score for season in seasons)
+
+
+def test_owner_stats_total_their_seasons(league):
+    assert_owner_totals()
+
+
+def test_owner_stats_total_separately_committed_seasons(app, fixtures):
+    # Onboarding fills in each season in its own task and transaction, every one of them updates the owners' totals
+    user = User(id=int(USER_ID), username="owner", email="owner@example.com")
+    job = OnboardingJob(user=user.id)
+    db.session.add_all([user, job])
+    db.session.commit()
+    onboard_user(job.id, USER_ID)
+    db.session.expire_all()
+    assert db.session.get(OnboardingJob, job.id).status == "complete"
+    assert db.session.query(TeamSeasonStats).count() == len(SEASONS) * TEAMS
+    assert_owner_totals()
+
+
+def test_league_week_stats(league):
+    rows = db.session.scalars(select(LeagueWeekStats)).all()
+    # Three regular season weeks and the postseason week of each season
+    assert len(rows) == len(SEASONS) * 4
+    for row in rows:
+        scores = db.session.execute(
+            select(MatchupTeam.team, MatchupTeam.total_points)
+            .join(Matchup, Matchup.id == MatchupTeam.matchup)
+            .join(Team, Team.id == MatchupTeam.team)
+            .where(Team.season == row.season, Matchup.week == row.week)
+        ).all()
+        assert row.games == len(scores) == TEAMS
+        assert row.points == pytest.approx(sum(points for _, points in scores))
+        assert row.high_score == max(points for _, points in scores)
+        assert dict(scores)[row.high_team] == row.high_score
+        assert dict(scores)[row.low_team] == row.low_score
@@ -0,0 +1,211 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+from sqlalchemy import select, update
+
+from fantasyApp import db
+from fantasyApp.analytics.head_to_head import head_to_head
+from fantasyApp.analytics.lineups import lineup_rows, score_lineups
+from fantasyApp.analytics.playoff_odds import playoff_odds, refresh_playoff_odds
+from fantasyApp.analytics.power_rankings import weekly_series
+from fantasyApp.analytics.rescoring import rescored_standings
+from fantasyApp.analytics.snapshot import league_snapshot
+from fantasyApp.models import (
+    IngestionReport,
+    League,
+    ManagerEfficiency,
+    Matchup,
+    MatchupPlayer,
+    MatchupTeam,
+    Player,
+    PlayerWeekStats,
+    PlayoffOdds,
+    Season,
+    Team,
+    TeamSeasonStats,
+)
+from tests.conftest import SEASONS, TEAMS
+from tests.sleeper_league import DEFENSES, STARTERS
+
+
+def latest_season() -> Season:
+    """
+    Get the league's newest season.
+    """
+    return db.session.scalars(select(Season).order_by(Season.year.desc())).first()
+
+
+def test_head_to_head(league):
+    matrix = head_to_head(league)
+    sides = defaultdict(list)
+    for matchup, owner, points in db.session.execute(
+        select(MatchupTeam.matchup, Team.owner, MatchupTeam.total_points).join(
+            Team, Team.id == MatchupTeam.team
+        )
+    ):
+        sides[matchup].append((owner, points))
+    expected = defaultdict(lambda: [0, 0, 0.0])
+    for (owner, points), (opponent, opponent_points) in (
+        pair for pair in sides.values() for pair in (pair, pair[::-1])
+    ):
+        record = expected[(owner, opponent)]
+        record[0] += 1
+        record[1] += points > opponent_points
+        record[2] += points
+    assert len(matrix.owners) == TEAMS
+    for (owner, opponent), (games, wins, points_for) in expected.items():
+        record = matrix.record(owner, opponent)
+        assert (record["games"], record["wins"]) == (games, wins)
+        assert record["points_for"] == pytest.approx(points_for)
+    # The second call is served from the cache
+    assert head_to_head(league) is matrix
+
+
+def test_power_rankings(league):
+    season = latest_season()
+    series = weekly_series(season.id)
+    assert len(series) == TEAMS
+    for week in range(1, 4):
+        ranks = sorted(
+            row["rank"]
+            for rows in series.values()
+            for row in rows
+            if row["week"] == week
+        )
+        assert ranks == list(range(1, TEAMS + 1))
+    for team, rows in series.items():
+        stats = db.session.get(TeamSeasonStats, team)
+        assert [row["week"] for row in rows] == [1, 2, 3]
+        assert rows[-1]["wins"] == stats.wins
+        assert rows[-1]["points_for"] == pytest.approx(stats.points_for)
+
+
+def test_snapshot_keeps_team_defenses(league):
+    snapshot = league_snapshot(league)
+    defenses = np.isin(snapshot.player_ids, DEFENSES)
+    assert defenses.sum() == TEAMS
+    assert (snapshot.player_numbers()[defenses] == -1).all()
+    assert (snapshot.player_numbers()[~defenses] > 0).all()
+    lines = np.isin(snapshot.line_player, np.flatnonzero(defenses))
+    assert (snapshot.positions[snapshot.line_position[lines]] == "DEF").all()
+    assert snapshot.line_starter[lines].all()
+    assert (snapshot.line_game[lines] >= 0).all()
+
+
+def test_playoff_odds(league):
+    season = latest_season()
+    odds = playoff_odds(season.id, trials=500)
+    assert (odds.model.last_week, odds.model.remaining) == (3, 0)
+    # The regular season is over, so the top two in the standings are in and nobody else is
+    standings = db.session.scalars(
+        select(TeamSeasonStats.team)
+        .where(TeamSeasonStats.season == season.id)
+        .order_by(TeamSeasonStats.wins.desc(), TeamSeasonStats.points_for.desc())
+    ).all()
+    made = dict(zip(odds.teams.tolist(), odds.playoffs.tolist()))
+    assert [made[team] for team in standings] == [1.0, 1.0, 0.0, 0.0]
+    assert odds.championship.sum() == pytest.approx(1.0)
+
+    # Refreshing the odds isn't an ingestion, so it leaves no ingestion report behind
+    reports = db.session.query(IngestionReport).count()
+    refresh_playoff_odds([season.id])
+    rows = db.session.scalars(
+        select(PlayoffOdds).where(PlayoffOdds.season == season.id)
+    ).all()
+    assert len(rows) == TEAMS
+    assert sum(row.playoffs for row in rows) == pytest.approx(2.0)
+    assert db.session.query(IngestionReport).count() == reports
+
+
+def test_playoff_odds_mid_season(league):
+    # Before the last regular season week is scored, its matchups are drawn at random
+    season = latest_season()
+    db.session.execute(
+        update(MatchupTeam)
+        .where(
+            MatchupTeam.matchup.in_(
+                select(Matchup.id).where(Matchup.season == season.id, Matchup.week >= 3)
+            )
+        )
+        .values(total_points=None)
+    )
+    db.session.execute(update(League).values(data_version=League.data_version + 1))
+    db.session.commit()
+
+    odds = playoff_odds(season.id, trials=2000)
+    assert (odds.model.last_week, odds.model.remaining) == (2, 1)
+    assert odds.playoffs.sum() == pytest.approx(2.0)
+    assert odds.championship.sum() == pytest.approx(1.0)
+    # With a week to go somebody is still in doubt
+    assert ((odds.playoffs > 0) & (odds.playoffs < 1)).any()
+
+
+def test_score_lineups(league):
+    scored = score_lineups([league])
+    assert scored == len(SEASONS) * 4 * TEAMS
+    actual = {
+        (team, week): points
+        for team, week, points in db.session.execute(
+            select(MatchupTeam.team, Matchup.week, MatchupTeam.total_points).join(
+                Matchup, Matchup.id == MatchupTeam.matchup
+            )
+        )
+    }
+    rows = db.session.scalars(select(ManagerEfficiency)).all()
+    assert len(rows) == scored
+    for row in rows:
+        assert row.actual_points == pytest.approx(actual[(row.team, row.week)])
+        # Every starter, team defenses included, can be fitted in the optimal lineup
+        assert row.optimal_points >= row.actual_points - 1e-6
+        assert 0 < row.efficiency <= 1 + 1e-9
+
+    # Scoring a few weeks as they are ingested agrees with scoring the whole history
+    season = latest_season()
+    by_game = {(row.team, row.week): row.optimal_points for row in rows}
+    for row in lineup_rows(season.id, [1, 2]):
+        assert row["optimal_points"] == pytest.approx(
+            by_game[(row["team"], row["week"])]
+        )
+
+
+def test_rescored_standings(league):
+    unchanged = rescored_standings(league, {})
+    for row in unchanged["standings"]:
+        assert row["wins"] == row["actual_wins"]
+        assert row["points_for"] == pytest.approx(row["actual_points_for"])
+    # Team defenses have no stat lines, every other starter does
+    assert unchanged["coverage"] == pytest.approx(STARTERS / (STARTERS + 1))
+
+    # Standard scoring takes away the point per reception and the tight end bonus from every starter
+    positions = dict(db.session.execute(select(Player.id, Player.position)).all())
+    receptions = {
+        (player, year, week): rec
+        for player, year, week, rec in db.session.execute(
+            select(
+                PlayerWeekStats.player,
+                PlayerWeekStats.year,
+                PlayerWeekStats.week,
+                PlayerWeekStats.rec,
+            )
+        )
+    }
+    lost = defaultdict(float)
+    for team, player, year, week in db.session.execute(
+        select(MatchupPlayer.team, MatchupPlayer.player, Season.year, Matchup.week)
+        .join(Matchup, Matchup.id == MatchupPlayer.matchup)
+        .join(Team, Team.id == MatchupPlayer.team)
+        .join(Season, Season.id == Team.season)
+        .where(MatchupPlayer.starter, Matchup.matchup_type == "regular")
+    ):
+        rec = receptions.get((player, year, week), 0)
+        lost[team] += rec * (1.5 if positions.get(player) == "TE" else 1.0)
+
+    standard = rescored_standings(league, "standard")
+    assert standard["weights"]["pts_rec"] == 0.0
+    for row in standard["standings"]:
+        assert row["points_for"] == pytest.approx(
+            row["actual_points_for"] - lost[row["team"]], abs=0.05
+        )
+    with pytest.raises(ValueError):
+        rescored_standings(league, "no_such_profile")
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from fantasyApp.sleeper_data.cache import ResponseCache, stats_are_final
+
+
+def test_past_seasons_stats_never_expire(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttl=300)
+    year = datetime.now().year
+    assert cache.ttl_for(f"stats/nfl/regular/{year - 2}/5", {}) is None
+    assert cache.ttl_for(f"stats/nfl/regular/{year}/5", {}) == 300
+    assert cache.ttl_for("players/nfl", {}) == cache.players_ttl
+
+
+def test_stats_are_final_after_stat_corrections():
+    # The regular season ends in early January and stat corrections follow
+    assert not stats_are_final(2024, datetime(2024, 12, 30))
+    assert not stats_are_final(2024, datetime(2025, 1, 20))
+    assert stats_are_final(2024, datetime(2025, 2, 1))
+    assert stats_are_final(2023, datetime(2025, 1, 20))
@@ -0,0 +1,203 @@
+from sqlalchemy import delete, select, update
+
+from fantasyApp import db
+from fantasyApp.models import (
+    Claim,
+    Draft,
+    DraftPick,
+    Matchup,
+    MatchupPlayer,
+    MatchupTeam,
+    PlayerWeekStats,
+    RawPayload,
+    Season,
+    SeasonSync,
+    Team,
+    TeamPlayer,
+    TradedItem,
+    Transaction,
+    User,
+)
+from fantasyApp.analytics.rescoring import rescored_standings
+from fantasyApp.sleeper_data.cache import stats_are_final
+from fantasyApp.sleeper_data.leagues import check_for_new_leagues
+from fantasyApp.sleeper_data.transform import rebuild_seasons
+from fantasyApp.sleeper_data.writers import BulkWriter
+from tests import sleeper_league
+from tests.conftest import SEASONS, TEAMS, USER_ID
+
+# Bookkeeping that changes on every run, everything else must come out the same
+VOLATILE = {"raw_payload", "ingestion_report", "season_sync", "league"}
+
+
+def table_contents() -> dict:
+    """
+    Read every table that ingestion writes.
+    :return: A dictionary mapping each table name to its rows, sorted.
+    """
+    return {
+        table.name: sorted(
+            db.session.execute(select(table)).all(), key=lambda row: repr(row)
+        )
+        for table in db.metadata.sorted_tables
+        if table.name not in VOLATILE
+    }
+
+
+def test_ingest_league(league):
+    seasons = len(SEASONS)
+    # Three regular season weeks and a postseason week of two matchups each
+    assert db.session.query(Season).count() == seasons
+    assert db.session.query(Team).count() == seasons * TEAMS
+    assert db.session.query(Matchup).count() == seasons * 4 * 2
+    assert db.session.query(MatchupTeam).count() == seasons * 4 * TEAMS
+    # Six players and a team defense on each roster
+    assert db.session.query(MatchupPlayer).count() == seasons * 4 * TEAMS * 7
+    assert db.session.query(TeamPlayer).count() == seasons * TEAMS * 7
+    assert db.session.query(DraftPick).count() == seasons * 2 * TEAMS
+    # A claim, a failed claim, a defense and a trade each week, commissioner moves and failed trades aren't kept
+    assert db.session.query(Transaction).count() == seasons * 4 * 4
+    assert db.session.query(Claim).count() == seasons * 4 * 3
+    assert db.session.query(TradedItem).count() == seasons * 4 * 4
+    assert db.session.query(SeasonSync).count() == seasons
+    # Every user in the league and the former member who made the trades
+    assert db.session.query(User).count() == TEAMS + 1
+    assert db.session.query(PlayerWeekStats).count() > 0
+    types = db.session.execute(
+        select(Matchup.week, Matchup.matchup_type).distinct().order_by(Matchup.week)
+    ).all()
+    assert sorted(set(types)) == [
+        (1, "regular"),
+        (2, "regular"),
+        (3, "regular"),
+        (4, "consolation"),
+        (4, "playoff"),
+    ]
+
+
+def test_long_ids_are_kept_whole(league):
+    # Every row points at the rows of its own season, nothing was built by appending to a 19 digit ID
+    assert sorted(db.session.scalars(select(Season.id))) == sorted(
+        league_id for league_id, _ in SEASONS
+    )
+    assert sorted(db.session.scalars(select(Draft.id))) == sorted(
+        league_id + 1 for league_id, _ in SEASONS
+    )
+    mismatched = db.session.execute(
+        select(MatchupTeam.matchup)
+        .join(Matchup, Matchup.id == MatchupTeam.matchup)
+        .join(Team, Team.id == MatchupTeam.team)
+        .where(Team.season != Matchup.season)
+    ).all()
+    assert mismatched == []
+    pick_seasons = db.session.execute(
+        select(Draft.season, Team.season)
+        .join(DraftPick, DraftPick.draft == Draft.id)
+        .join(Team, Team.id == DraftPick.team)
+        .distinct()
+    ).all()
+    assert sorted(pick_seasons) == sorted((season, season) for season, _ in SEASONS)
+
+
+def test_ingest_again_changes_nothing(league):
+    before = table_contents()
+    check_for_new_leagues(USER_ID)
+    assert table_contents() == before
+
+
+def test_rebuild_is_idempotent(league):
+    before = table_contents()
+    season_ids = list(db.session.scalars(select(Season.id)))
+    rows_written = rebuild_seasons(season_ids)
+    assert rows_written["matchup_player"] == len(before["matchup_player"])
+    assert table_contents() == before
+
+
+def test_stats_are_shared_by_every_league(app, league):
+    staged = db.session.scalars(
+        select(RawPayload).where(RawPayload.endpoint.like("stats/%"))
+    ).all()
+    # Each week added, the three regular season weeks and the postseason week, staged once without a league or season
+    assert sorted(row.endpoint for row in staged) == sorted(
+        f"stats/nfl/regular/{year}/{week}"
+        for _, year in SEASONS
+        for week in range(1, 5)
+    )
+    assert all(row.league is None and row.season is None for row in staged)
+    stats = db.session.query(PlayerWeekStats).count()
+    db.session.execute(
+        update(PlayerWeekStats).where(PlayerWeekStats.week == 1).values(rec=-1)
+    )
+    db.session.commit()
+
+    # Another league playing the same years upserts the stats that can still be corrected, and skips the final ones
+    other = [(league_id + 1000, year) for league_id, year in SEASONS]
+    sleeper_league.build(
+        app.config["SLEEPER_FIXTURE_DIR"],
+        other,
+        "600",
+        TEAMS,
+        first_transaction=sleeper_league.TRANSACTION_BASE + 1_000_000,
+    )
+    check_for_new_leagues("600")
+    db.session.expire_all()
+    assert db.session.query(Season).count() == 2 * len(SEASONS)
+    assert db.session.query(PlayerWeekStats).count() == stats
+    for _, year in SEASONS:
+        recs = set(
+            db.session.scalars(
+                select(PlayerWeekStats.rec).where(
+                    PlayerWeekStats.year == year, PlayerWeekStats.week == 1
+                )
+            )
+        )
+        assert (recs == {-1}) == stats_are_final(year)
+    other_league = db.session.get(Season, other[0][0]).league
+    assert rescored_standings(other_league, {})["coverage"] > 0
+
+
+def test_rebuild_restores_stats_from_staging(league):
+    stats = db.session.query(PlayerWeekStats).count()
+    db.session.execute(delete(PlayerWeekStats))
+    db.session.commit()
+    rebuild_seasons(list(db.session.scalars(select(Season.id))))
+    assert db.session.query(PlayerWeekStats).count() == stats
+
+
+def test_upsert_updates_changed_rows(league):
+    team = db.session.scalars(select(Team).order_by(Team.id)).first()
+    team_id, season_id, roster_id = team.id, team.season, team.sleeper_roster_id
+    player = db.session.scalars(
+        select(TeamPlayer.player).where(TeamPlayer.team == team_id)
+    ).first()
+    db.session.execute(
+        TeamPlayer.__table__.update()
+        .where(TeamPlayer.team == team_id, TeamPlayer.player == player)
+        .values(nickname="The Franchise")
+    )
+    db.session.commit()
+
+    writer = BulkWriter()
+    # Ingestion never knows a team's ID, the row is matched on its season and roster ID
+    row = {
+        column.name: getattr(team, column.name)
+        for column in Team.__table__.columns
+        if column.name != "id"
+    }
+    writer.add(Team, {**row, "name": "Renamed"})
+    # Adding a rostered player again must not wipe the nickname someone gave them
+    writer.add(TeamPlayer, {"team": team_id, "player": player}, False)
+    writer.flush()
+    db.session.commit()
+    db.session.expire_all()
+
+    renamed = db.session.get(Team, team_id)
+    assert renamed.name == "Renamed"
+    assert (renamed.season, renamed.sleeper_roster_id) == (season_id, roster_id)
+    assert db.session.query(Team).count() == len(SEASONS) * TEAMS
+    nickname = db.session.scalars(
+        select(TeamPlayer.nickname).where(
+            TeamPlayer.team == team_id, TeamPlayer.player == player
+        )
+    ).one()
+    assert nickname == "The Franchise"
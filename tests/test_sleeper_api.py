@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+
+from fantasyApp.sleeper_data import staging
+from fantasyApp.sleeper_data.instrumentation import trace
+from fantasyApp.sleeper_data.utils import SleeperAPI, iter_json_object
+from fantasyApp.sleeper_data.writers import BulkWriter
+
+
+def test_coalesced_requests_are_staged_for_every_caller(app, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fetch(endpoint):
+        started.set()
+        release.wait(5)
+        return {"league_id": "1"}
+
+    monkeypatch.setattr(SleeperAPI, "_fetch_data", staticmethod(slow_fetch))
+    results = {}
+
+    def ingest(name):
+        # Two ingestions fetching the same endpoint, each in its own capture and trace
+        with app.app_context():
+            writer = BulkWriter()
+            with trace("test", name) as tracer:
+                with staging.capture(writer) as store:
+                    data = SleeperAPI.fetch_data("league/1")
+            results[name] = (data, store.staged, tracer.requests["league/{id}"])
+
+    shared = SleeperAPI.coalesced_requests()
+    leader = threading.Thread(target=ingest, args=("leader",))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=ingest, args=("follower",))
+    follower.start()
+    while SleeperAPI.coalesced_requests() == shared:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    data, staged, requests = results["follower"]
+    assert data == {"league_id": "1"}
+    assert staged == 1
+    assert (requests["calls"], requests["failures"]) == (1, 0)
+    assert results["leader"][1] == 1
+
+
+def test_iter_json_object_split_at_every_offset():
+    payload = json.dumps(
+        {
+            "a": 1.5,
+            "b": -12e-3,
+            "c": {"d": [1, 2.25, None]},
+            "é": "x, y}",
+            "f": True,
+            "g": 10,
+        },
+        ensure_ascii=False,
+    ).encode()
+    expected = list(json.loads(payload).items())
+    for offset in range(len(payload) + 1):
+        assert list(iter_json_object([payload[:offset], payload[offset:]])) == expected
@@ -0,0 +1,63 @@
+import json
+
+from fantasyApp.sleeper_data.transport import SleeperTransport
+
+
+class FakeResponse:
+    """
+    Just enough of a requests.Response for the transport.
+    """
+
+    def __init__(self, status_code: int, body: str) -> None:
+        self.status_code = status_code
+        self.text = body
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self) -> None:
+        pass
+
+
+def transport_returning(monkeypatch, *responses) -> SleeperTransport:
+    """
+    Build a transport whose session returns the given responses in order, without sleeping between retries.
+    """
+    transport = SleeperTransport(max_retries=2)
+    queue = list(responses)
+    monkeypatch.setattr(transport.session, "get", lambda url, **kwargs: queue.pop(0))
+    monkeypatch.setattr(transport, "backoff", lambda *args: None)
+    return transport
+
+
+def test_get_json(monkeypatch):
+    transport = transport_returning(monkeypatch, FakeResponse(200, '{"week": 3}'))
+    assert transport.get_json("https://sleeper/state/nfl", "state/nfl") == {"week": 3}
+    assert transport.stats()["state/nfl"]["failures"] == 0
+
+
+def test_get_json_retries_server_errors(monkeypatch):
+    transport = transport_returning(
+        monkeypatch, FakeResponse(503, ""), FakeResponse(200, "[]")
+    )
+    assert (
+        transport.get_json("https://sleeper/league/1/users", "league/{id}/users") == []
+    )
+    stats = transport.stats()["league/{id}/users"]
+    assert (stats["calls"], stats["failures"]) == (2, 1)
+
+
+def test_get_json_body_is_not_json(monkeypatch):
+    transport = transport_returning(
+        monkeypatch, FakeResponse(200, "<html>Bad gateway</html>")
+    )
+    assert transport.get_json("https://sleeper/league/1", "league/{id}") is None
+    stats = transport.stats()["league/{id}"]
+    assert (stats["calls"], stats["failures"]) == (1, 1)
+
+
+def test_get_json_gives_up(monkeypatch):
+    transport = transport_returning(monkeypatch, *[FakeResponse(500, "")] * 3)
+    assert transport.get_json("https://sleeper/league/1", "league/{id}") is None
+    assert transport.stats()["league/{id}"]["failures"] == 3
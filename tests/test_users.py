@@ -0,0 +1,63 @@
+from sqlalchemy import select
+
+from fantasyApp import bcrypt, db
+from fantasyApp.models import OnboardingJob, SeasonSync, User
+from fantasyApp.sleeper_data.fixtures import FixtureStore
+from tests.conftest import SEASONS, USER_ID
+
+
+def log_in(client, email: str) -> None:
+    client.get("/logout")
+    response = client.post("/login", data={"email": email, "password": "hunter2"})
+    assert response.status_code == 302
+
+
+def test_register_builds_profile(app, fixtures):
+    FixtureStore(app.config["SLEEPER_FIXTURE_DIR"]).save(
+        "user/owner", {"user_id": USER_ID, "username": "owner", "display_name": "Owner"}
+    )
+    client = app.test_client()
+    response = client.post(
+        "/register",
+        data={
+            "username": "owner",
+            "email": "owner@example.com",
+            "password": "hunter2",
+            "confirm_password": "hunter2",
+        },
+    )
+    job = db.session.scalars(select(OnboardingJob)).one()
+    assert response.headers["Location"].endswith(f"/register/{job.id}")
+    # Celery runs eagerly here, so the whole league is in by the time registration returns
+    status = client.get(f"/register/{job.id}/status").get_json()
+    assert status["status"] == "complete"
+    assert status["seasons_done"] == len(SEASONS)
+    assert db.session.query(SeasonSync).count() == len(SEASONS)
+    assert client.get(f"/register/{job.id}").status_code == 200
+
+
+def test_onboarding_status_is_private(app):
+    password = bcrypt.generate_password_hash("hunter2").decode("utf-8")
+    db.session.add_all(
+        [
+            User(id=1, username="owner", email="owner@example.com", password=password),
+            User(id=2, username="other", email="other@example.com", password=password),
+        ]
+    )
+    job = OnboardingJob(user=1)
+    db.session.add(job)
+    db.session.commit()
+    client = app.test_client()
+
+    # Logged out, sent to log in
+    assert client.get(f"/register/{job.id}/status").status_code == 302
+    # Someone else's job
+    log_in(client, "other@example.com")
+    assert client.get(f"/register/{job.id}/status").status_code == 403
+    assert client.get(f"/register/{job.id}").status_code == 403
+    # Their own job
+    log_in(client, "owner@example.com")
+    response = client.get(f"/register/{job.id}/status")
+    assert response.status_code == 200
+    assert response.get_json()["id"] == job.id
+    assert client.get(f"/register/{job.id + 1}/status").status_code == 404